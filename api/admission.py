@@ -0,0 +1,114 @@
+"""Admission control for /sync based on in-flight work."""
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from api.db import per_worker
+
+
+class AdmissionTicket:
+    """Work admitted for one request; returned to the controller when done."""
+
+    __slots__ = ('nbytes', 'samples')
+
+    def __init__(self, nbytes: int):
+        self.nbytes = nbytes
+        self.samples = 0
+
+
+class AdmissionController:
+    """
+    Bound concurrent syncs, queued samples and request bytes per instance.
+
+    Requests above a watermark are rejected with 503 and Retry-After so the
+    client (or Cloud Run) retries elsewhere instead of the instance running
+    out of memory or threads.
+    """
+
+    def __init__(self, max_inflight: int = 32, max_samples: int = 500_000,
+                 max_bytes: int = 128 * 1024 * 1024, retry_after: int = 5):
+        """
+        Initialize admission controller.
+
+        Args:
+            max_inflight: Max concurrent /sync requests
+            max_samples: Max samples across in-flight requests
+            max_bytes: Max request body bytes across in-flight requests
+            retry_after: Seconds suggested to rejected clients
+        """
+        self.max_inflight = max_inflight
+        self.max_samples = max_samples
+        self.max_bytes = max_bytes
+        self.retry_after = retry_after
+        self.inflight = 0
+        self.inflight_bytes = 0
+        self.queued_samples = 0
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {'inflight': 0, 'bytes': 0, 'samples': 0}
+        self._lock = threading.Lock()
+
+    def admit(self, nbytes: int = 0) -> Optional[AdmissionTicket]:
+        """
+        Admit a request of `nbytes` body bytes, or return None if overloaded.
+
+        A request is always admitted when nothing else is in flight, so one
+        oversized payload cannot be rejected forever.
+        """
+        with self._lock:
+            if self.inflight:
+                if self.inflight >= self.max_inflight:
+                    self.rejected['inflight'] += 1
+                    return None
+                if self.inflight_bytes + nbytes > self.max_bytes:
+                    self.rejected['bytes'] += 1
+                    return None
+            self.inflight += 1
+            self.inflight_bytes += nbytes
+            self.admitted += 1
+            return AdmissionTicket(nbytes)
+
+    def add_samples(self, ticket: AdmissionTicket, samples: int) -> bool:
+        """
+        Account for a request's parsed sample count.
+
+        Returns:
+            False if the samples push the instance over its watermark (the
+            caller should give up; the ticket must still be released)
+        """
+        with self._lock:
+            if self.queued_samples and self.queued_samples + samples > self.max_samples:
+                self.rejected['samples'] += 1
+                return False
+            ticket.samples = samples
+            self.queued_samples += samples
+            return True
+
+    def release(self, ticket: AdmissionTicket):
+        """Return a ticket's work to the pool."""
+        with self._lock:
+            self.inflight -= 1
+            self.inflight_bytes -= ticket.nbytes
+            self.queued_samples -= ticket.samples
+
+    def stats(self) -> Dict[str, Any]:
+        """Gauges for the metrics endpoint."""
+        with self._lock:
+            return {
+                'inflight': self.inflight,
+                'inflight_bytes': self.inflight_bytes,
+                'queued_samples': self.queued_samples,
+                'admitted': self.admitted,
+                'rejected': dict(self.rejected),
+                'max_inflight': self.max_inflight,
+                'max_samples': self.max_samples,
+                'max_bytes': self.max_bytes,
+            }
+
+
+# Global admission controller instance; watermarks are per instance, split between workers
+admission = AdmissionController(
+    max_inflight=per_worker(os.getenv('ADMISSION_MAX_INFLIGHT', '32')),
+    max_samples=per_worker(os.getenv('ADMISSION_MAX_SAMPLES', '500000')),
+    max_bytes=per_worker(os.getenv('ADMISSION_MAX_BYTES', str(128 * 1024 * 1024))),
+    retry_after=int(os.getenv('ADMISSION_RETRY_AFTER', '5'))
+)
@@ -0,0 +1,133 @@
+"""Persistent map of calendar names to IDs, shared by every worker process."""
+import json
+import threading
+import time
+
+from api.db import connect
+
+
+def user_calendar_name(email):
+    """Name of a user's calendar."""
+    return f'Sleep Data - {email}'
+
+
+class CalendarDirectory:
+    """
+    SQLite-backed (service account, calendar name) -> calendar ID map.
+
+    A returning user's sync looks its calendar up here instead of paging
+    through calendarList, and every worker process on the instance sees a
+    calendar as soon as one of them has found or created it.
+    """
+
+    def __init__(self, path=None):
+        """
+        Initialize calendar directory.
+
+        Args:
+            path: SQLite database path (default: api.db.default_path())
+        """
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _db(self):
+        """Open the database and create the table on first use."""
+        if self._conn is None:
+            self._conn = connect(self.path)
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS calendar_ids ('
+                ' account TEXT NOT NULL,'
+                ' name TEXT NOT NULL,'
+                ' calendar_id TEXT NOT NULL,'
+                ' updated_at REAL NOT NULL,'
+                ' PRIMARY KEY (account, name))')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS calendar_ids_name ON calendar_ids (name)')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS calendar_misses ('
+                ' account TEXT NOT NULL,'
+                ' name TEXT NOT NULL,'
+                ' checked_at REAL NOT NULL,'
+                ' PRIMARY KEY (account, name))')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS rings ('
+                ' accounts TEXT PRIMARY KEY,'
+                ' first_seen REAL NOT NULL)')
+            self._conn.commit()
+        return self._conn
+
+    def get(self, account, name):
+        """Calendar ID recorded for this account and name, or None."""
+        with self._lock:
+            row = self._db().execute(
+                'SELECT calendar_id FROM calendar_ids WHERE account = ? AND name = ?',
+                (account, name)).fetchone()
+        return row[0] if row else None
+
+    def accounts(self, name):
+        """Accounts holding a calendar with this name."""
+        with self._lock:
+            rows = self._db().execute('SELECT account FROM calendar_ids WHERE name = ?', (name,)).fetchall()
+        return [row[0] for row in rows]
+
+    def put(self, account, name, calendar_id):
+        """Record a calendar found or created for this account and name."""
+        with self._lock:
+            db = self._db()
+            db.execute('INSERT OR REPLACE INTO calendar_ids VALUES (?, ?, ?, ?)',
+                       (account, name, calendar_id, time.time()))
+            db.execute('DELETE FROM calendar_misses WHERE account = ? AND name = ?', (account, name))
+            db.commit()
+
+    def missing(self, account, name):
+        """True if this account was already searched for this name without a match."""
+        with self._lock:
+            row = self._db().execute(
+                'SELECT 1 FROM calendar_misses WHERE account = ? AND name = ?', (account, name)).fetchone()
+        return row is not None
+
+    def miss(self, account, name):
+        """Record that this account holds no calendar with this name."""
+        with self._lock:
+            db = self._db()
+            db.execute('INSERT OR REPLACE INTO calendar_misses VALUES (?, ?, ?)', (account, name, time.time()))
+            db.commit()
+
+    def rings(self, account_ids):
+        """
+        Record the pool's current accounts and return the earlier sets.
+
+        Users only need looking for under other accounts when the pool has
+        changed since their calendar was created; with no earlier sets the
+        ring never moved anyone.
+
+        Args:
+            account_ids: Accounts the credential pool is built from now
+
+        Returns:
+            Account ID lists recorded before, oldest first
+        """
+        current = json.dumps(sorted(account_ids))
+        with self._lock:
+            db = self._db()
+            db.execute('INSERT OR IGNORE INTO rings VALUES (?, ?)', (current, time.time()))
+            db.commit()
+            rows = db.execute('SELECT accounts FROM rings WHERE accounts != ? ORDER BY first_seen',
+                              (current,)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def entries(self):
+        """Every recorded (account, name, calendar ID)."""
+        with self._lock:
+            return self._db().execute('SELECT account, name, calendar_id FROM calendar_ids').fetchall()
+
+    def forget(self, calendar_id):
+        """Drop a calendar ID, e.g. after the API reports it no longer exists."""
+        with self._lock:
+            db = self._db()
+            db.execute('DELETE FROM calendar_ids WHERE calendar_id = ?', (calendar_id,))
+            db.commit()
+
+
+# Global calendar directory instance
+calendar_directory = CalendarDirectory()
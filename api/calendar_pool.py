@@ -0,0 +1,241 @@
+"""
+Warm pool of pre-created public calendars for first-time users.
+
+Creating a user's calendar costs calendars.insert plus two acl.insert calls,
+serially and before any events are written. A background provisioner keeps
+a few calendars per service account already created and publicly readable;
+a first sync claims one and renames and shares it in a single batch request.
+
+Unclaimed calendars carry the time they were provisioned or adopted in their
+summary, which acts as a lease: an instance only hands out calendars whose
+lease is younger than the TTL, refills by first adopting expired ones (e.g.
+left behind by a stopped instance) before creating new ones, and the
+inventory treats every unexpired one as held by some instance.
+"""
+import os
+import random
+import secrets
+import sys
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+# Summary of a provisioned, unclaimed calendar (followed by "<epoch>-<random>")
+POOL_PREFIX = 'Sleep Data - unclaimed '
+
+# Seconds an unclaimed calendar stays leased to the instance that stamped it
+DEFAULT_TTL = 24 * 3600
+
+# Calendars are handed out only within this fraction of the TTL, so one is
+# never claimed while the inventory may already consider it an orphan
+LEASE_MARGIN = 0.9
+
+
+def pool_summary(stamp=None):
+    """Summary for an unclaimed calendar leased from stamp (default: now)."""
+    return f'{POOL_PREFIX}{int(stamp if stamp is not None else time.time())}-{secrets.token_hex(4)}'
+
+
+def pool_stamp(summary):
+    """
+    Epoch seconds an unclaimed calendar was provisioned or adopted, from its
+    summary.
+
+    Returns:
+        int, or None for other calendars and unclaimed ones named before
+        summaries carried the time
+    """
+    if not summary.startswith(POOL_PREFIX):
+        return None
+    stamp, separator, _ = summary[len(POOL_PREFIX):].partition('-')
+    return int(stamp) if separator and stamp.isdigit() else None
+
+
+def pool_expired(summary, ttl=DEFAULT_TTL, now=None):
+    """Whether an unclaimed calendar's lease has run out (always, without a stamp)."""
+    stamp = pool_stamp(summary)
+    return stamp is None or (now or time.time()) - stamp >= ttl
+
+
+class CalendarPool:
+    """Pre-provisioned calendars per service account, refilled in the background."""
+
+    def __init__(self, size: int = 0, ttl: float = DEFAULT_TTL):
+        """
+        Initialize calendar pool.
+
+        Args:
+            size: Calendars kept ready per service account (0 disables the pool)
+            ttl: Seconds an unclaimed calendar stays leased to this instance
+        """
+        self.size = size
+        self.ttl = ttl
+        self._ready: Dict[str, Deque[Tuple[str, float]]] = {}
+        self._refilling = set()
+        # Accounts whose expired calendars were already looked for
+        self._scanned = set()
+        self._lock = threading.Lock()
+        self.claimed = 0
+        self.misses = 0
+        self.provisioned = 0
+        self.adopted = 0
+        self.expired = 0
+        self.failures = 0
+
+    def take(self, cal) -> Optional[str]:
+        """
+        Claim a ready calendar for cal's service account and start a refill.
+
+        Args:
+            cal: SleepCalendar of the claiming user (its credentials are
+                reused to provision replacements)
+
+        Returns:
+            Calendar ID, or None if the pool is empty or disabled
+        """
+        if self.size <= 0:
+            return None
+        account = cal.account or 'default'
+        with self._lock:
+            ready = self._ready.get(account)
+            calendar_id = None
+            while ready and calendar_id is None:
+                candidate, stamp = ready.popleft()
+                if time.time() - stamp < self.ttl * LEASE_MARGIN:
+                    calendar_id = candidate
+                else:
+                    # Left for the next refill (here or elsewhere) to adopt
+                    self.expired += 1
+                    self._scanned.discard(account)
+            if calendar_id is None:
+                self.misses += 1
+            else:
+                self.claimed += 1
+        self.refill(cal)
+        return calendar_id
+
+    def refill(self, cal, wait=False):
+        """
+        Top up cal's service account to `size` calendars in a background
+        thread (one per account at a time).
+
+        Args:
+            cal: SleepCalendar whose credentials and endpoint are used
+            wait: Provision in the calling thread instead (e.g. at startup)
+        """
+        account = cal.account or 'default'
+        with self._lock:
+            if self.size <= 0 or account in self._refilling:
+                return
+            self._refilling.add(account)
+        if wait:
+            self._refill(cal, account)
+        else:
+            threading.Thread(target=self._refill, args=(cal, account), daemon=True,
+                             name=f"calendar-pool-{account}").start()
+
+    def _refill(self, cal, account):
+        from api.sleep_calendar import SleepCalendar
+        try:
+            # Own client: googleapiclient services are not thread-safe
+            provisioner = SleepCalendar(credentials=cal.creds, api_endpoint=cal.api_endpoint, pacer=cal.pacer)
+            provisioner.account = cal.account
+            with self._lock:
+                missing = self.size - len(self._ready.get(account, ()))
+                scan = account not in self._scanned
+            # Expired calendars only appear at startup or when one of ours expired
+            if missing > 0 and scan:
+                adopted = self.adopt(provisioner, missing)
+                with self._lock:
+                    self._scanned.add(account)
+                    self._ready.setdefault(account, deque()).extend(adopted)
+                    self.adopted += len(adopted)
+            while True:
+                with self._lock:
+                    if len(self._ready.get(account, ())) >= self.size:
+                        return
+                stamp = time.time()
+                calendar_id = self.provision(provisioner, stamp)
+                with self._lock:
+                    self._ready.setdefault(account, deque()).append((calendar_id, stamp))
+                    self.provisioned += 1
+        except Exception as e:
+            # Claims fall back to creating calendars until the next refill
+            with self._lock:
+                self.failures += 1
+            print(f"Warning: calendar pool refill failed for {account}: {e}", file=sys.stderr)
+        finally:
+            with self._lock:
+                self._refilling.discard(account)
+
+    @staticmethod
+    def provision(cal, stamp=None) -> str:
+        """Create one unclaimed, publicly readable calendar and return its ID."""
+        calendar = {'summary': pool_summary(stamp), 'timeZone': 'America/Los_Angeles'}
+        calendar_id = cal._execute(cal.service.calendars().insert(body=calendar))['id']
+        acl = {'scope': {'type': 'default'}, 'role': 'reader'}
+        cal._execute(cal.service.acl().insert(calendarId=calendar_id, body=acl))
+        return calendar_id
+
+    def adopt(self, cal, limit):
+        """
+        Take over up to `limit` unclaimed calendars of cal's account whose
+        lease has expired, renewing each lease by renaming it.
+
+        Two instances may race for the same calendar: each re-reads the name
+        right before renaming, skipping calendars adopted since the listing,
+        and reads it back afterwards, keeping the calendar only if its own
+        name won.
+
+        Returns:
+            List of (calendar ID, lease stamp)
+        """
+        from api.inventory import list_calendars
+        held = self.held()
+        expired = [item['id'] for item in list_calendars(cal)
+                   if item.get('summary', '').startswith(POOL_PREFIX) and item['id'] not in held
+                   and pool_expired(item['summary'], self.ttl)]
+        # Instances starting together try different calendars first
+        random.shuffle(expired)
+        adopted = []
+        for calendar_id in expired:
+            if len(adopted) >= limit:
+                break
+            stamp = time.time()
+            summary = pool_summary(stamp)
+            try:
+                current = cal._execute(cal.service.calendars().get(calendarId=calendar_id)).get('summary', '')
+                if not pool_expired(current, self.ttl):
+                    continue
+                cal._execute(cal.service.calendars().patch(calendarId=calendar_id, body={'summary': summary}))
+                if cal._execute(cal.service.calendars().get(calendarId=calendar_id)).get('summary') == summary:
+                    adopted.append((calendar_id, stamp))
+            except Exception as e:
+                # Deleted or taken meanwhile; provision a new one instead
+                print(f"Warning: could not adopt pool calendar {calendar_id}: {e}", file=sys.stderr)
+        return adopted
+
+    def held(self):
+        """IDs of every calendar ready to be claimed from this pool."""
+        with self._lock:
+            return {calendar_id for ready in self._ready.values() for calendar_id, _ in ready}
+
+    def stats(self):
+        """Counters for the metrics endpoint."""
+        with self._lock:
+            return {
+                'size': self.size,
+                'ready': {account: len(ready) for account, ready in self._ready.items()},
+                'claimed': self.claimed,
+                'misses': self.misses,
+                'provisioned': self.provisioned,
+                'adopted': self.adopted,
+                'expired': self.expired,
+                'failures': self.failures,
+            }
+
+
+# Shared pool (CALENDAR_POOL_SIZE calendars per service account, off by default)
+calendar_pool = CalendarPool(size=int(os.getenv('CALENDAR_POOL_SIZE', '0')),
+                             ttl=float(os.getenv('CALENDAR_POOL_TTL', str(DEFAULT_TTL))))
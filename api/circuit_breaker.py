@@ -0,0 +1,254 @@
+"""Circuit breakers, bulkhead and timeouts around the Google Calendar API."""
+import os
+import sys
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Callable, Dict, Tuple
+from urllib.parse import urlparse
+
+from googleapiclient.errors import HttpError
+
+from api.db import per_worker
+
+
+class CalendarUnavailable(Exception):
+    """The Calendar API is not being called right now; retry after `retry_after` seconds."""
+
+    def __init__(self, message, retry_after=1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(CalendarUnavailable):
+    """The circuit for this account and endpoint is open."""
+
+
+class BulkheadFullError(CalendarUnavailable):
+    """Too many Calendar calls are already in flight on this instance."""
+
+
+def is_failure(error):
+    """Whether an error means the dependency is unhealthy (vs. a bad request)."""
+    if isinstance(error, HttpError):
+        return error.resp.status >= 500 or error.resp.status == 429
+    if isinstance(error, OSError):
+        return True
+    # Loaded by any request that got this far; checked lazily for cold starts
+    httplib2 = sys.modules.get('httplib2')
+    return httplib2 is not None and isinstance(error, httplib2.HttpLib2Error)
+
+
+class CircuitBreaker:
+    """
+    Closed → open after `failure_threshold` consecutive failures; open → half
+    open after `recovery_timeout` seconds, when up to `half_open_max` probe
+    calls go through. A successful probe closes the circuit, a failed one
+    reopens it.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0, half_open_max: int = 1):
+        """
+        Initialize circuit breaker.
+
+        Args:
+            failure_threshold: Consecutive failures that open the circuit
+            recovery_timeout: Seconds the circuit stays open before probing
+            half_open_max: Concurrent probe calls while half open
+        """
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max = half_open_max
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    def _before(self):
+        """Admit a call or raise CircuitOpenError; returns whether it is a probe."""
+        with self._lock:
+            if self.state == self.OPEN:
+                remaining = self.opened_at + self.recovery_timeout - time.monotonic()
+                if remaining > 0:
+                    self.rejected += 1
+                    raise CircuitOpenError("Calendar API circuit open", retry_after=remaining)
+                self.state = self.HALF_OPEN
+                self._probes = 0
+            if self.state == self.HALF_OPEN:
+                if self._probes >= self.half_open_max:
+                    self.rejected += 1
+                    raise CircuitOpenError("Calendar API circuit half open", retry_after=1.0)
+                self._probes += 1
+                return True
+            return False
+
+    def _after(self, probe, failed):
+        """Record an outcome; failed=None (call never reached the API) records nothing."""
+        with self._lock:
+            if probe:
+                self._probes -= 1
+            if failed is None:
+                return
+            if not failed:
+                self.failures = 0
+                self.state = self.CLOSED
+                return
+            self.failures += 1
+            if probe or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def call(self, fn: Callable[[], Any]):
+        """Run fn through the breaker, recording its outcome."""
+        probe = self._before()
+        try:
+            result = fn()
+        except CalendarUnavailable:
+            self._after(probe, None)
+            raise
+        except Exception as e:
+            self._after(probe, is_failure(e))
+            raise
+        self._after(probe, False)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """State for the metrics endpoint."""
+        with self._lock:
+            return {'state': self.state, 'failures': self.failures,
+                    'times_opened': self.times_opened, 'rejected': self.rejected}
+
+
+class BreakerRegistry:
+    """One CircuitBreaker per (service account, API method)."""
+
+    def __init__(self, **breaker_options):
+        """
+        Initialize breaker registry.
+
+        Args:
+            breaker_options: Passed to every CircuitBreaker
+        """
+        self.breaker_options = breaker_options
+        self._breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, account: str, endpoint: str) -> CircuitBreaker:
+        """Return the breaker for an account and endpoint (e.g. calendar.events.insert)."""
+        key = (account, endpoint)
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                breaker = self._breakers[key] = CircuitBreaker(**self.breaker_options)
+        return breaker
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-breaker state for the metrics endpoint."""
+        with self._lock:
+            breakers = list(self._breakers.items())
+        return {f'{account} {endpoint}': breaker.stats() for (account, endpoint), breaker in breakers}
+
+
+class Bulkhead:
+    """Caps concurrent Calendar calls so a slow API cannot absorb every thread."""
+
+    def __init__(self, max_concurrent: int = 16, max_wait: float = 10.0):
+        """
+        Initialize bulkhead.
+
+        Args:
+            max_concurrent: Calendar calls allowed in flight per instance
+            max_wait: Seconds to wait for a slot before giving up
+        """
+        self.max_concurrent = max_concurrent
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self.rejected = 0
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+
+    def call(self, fn: Callable[[], Any]):
+        """Run fn once a slot is free, or raise BulkheadFullError."""
+        if not self._semaphore.acquire(timeout=self.max_wait):
+            with self._lock:
+                self.rejected += 1
+            raise BulkheadFullError("Too many concurrent Calendar API calls", retry_after=self.max_wait)
+        with self._lock:
+            self.in_flight += 1
+        try:
+            return fn()
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, int]:
+        """Gauges for the metrics endpoint."""
+        with self._lock:
+            return {'in_flight': self.in_flight, 'max_concurrent': self.max_concurrent, 'rejected': self.rejected}
+
+
+def _with_read_timeout(connection_class, read_timeout):
+    """Connection class whose socket switches to `read_timeout` once connected."""
+    class Connection(connection_class):
+        def connect(self):
+            super().connect()
+            self.sock.settimeout(read_timeout)
+    return Connection
+
+
+@lru_cache(maxsize=1)
+def _timeout_http_class():
+    import httplib2
+
+    class TimeoutHttp(httplib2.Http):
+        def __init__(self, connect_timeout, read_timeout):
+            super().__init__(timeout=connect_timeout)
+            self.read_timeout = read_timeout
+            self._connection_types = {
+                scheme: _with_read_timeout(connection_class, read_timeout)
+                for scheme, connection_class in httplib2.SCHEME_TO_CONNECTION.items()
+            }
+
+        def request(self, uri, method='GET', body=None, headers=None,
+                    redirections=httplib2.DEFAULT_MAX_REDIRECTS, connection_type=None):
+            if connection_type is None:
+                connection_type = self._connection_types.get(urlparse(uri).scheme)
+            return super().request(uri, method, body=body, headers=headers,
+                                   redirections=redirections, connection_type=connection_type)
+    return TimeoutHttp
+
+
+def timeout_http(connect_timeout=None, read_timeout=None):
+    """
+    httplib2.Http with separate connect and read timeouts.
+
+    httplib2 applies its single ``timeout`` to the whole socket; this uses
+    it for connecting and switches the socket to the read timeout after.
+
+    Args:
+        connect_timeout: Seconds to establish a connection (default: CALENDAR_CONNECT_TIMEOUT)
+        read_timeout: Seconds to wait on each read (default: CALENDAR_READ_TIMEOUT)
+    """
+    return _timeout_http_class()(connect_timeout or CONNECT_TIMEOUT, read_timeout or READ_TIMEOUT)
+
+
+# Per-process guards shared by every SleepCalendar; the bulkhead's instance-wide
+# limit is split between workers
+calendar_breakers = BreakerRegistry(
+    failure_threshold=int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5')),
+    recovery_timeout=float(os.getenv('CIRCUIT_RECOVERY_SECONDS', '30')),
+)
+calendar_bulkhead = Bulkhead(
+    max_concurrent=per_worker(os.getenv('CALENDAR_MAX_CONCURRENCY', '16')),
+    max_wait=float(os.getenv('CALENDAR_BULKHEAD_WAIT', '10')),
+)
+CONNECT_TIMEOUT = float(os.getenv('CALENDAR_CONNECT_TIMEOUT', '5'))
+READ_TIMEOUT = float(os.getenv('CALENDAR_READ_TIMEOUT', '20'))
@@ -0,0 +1,205 @@
+"""
+Fast JSON codec for /sync payloads.
+
+Uses msgspec or orjson when installed and the stdlib json module otherwise.
+Samples are decoded into slotted Sample objects instead of dicts; they keep
+a dict-style get() so the pipeline stages accept either.
+"""
+import json
+from typing import Any, List, Union
+
+from fastapi.responses import JSONResponse
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+BACKEND = 'msgspec' if msgspec is not None else 'orjson' if orjson is not None else 'json'
+
+# Sample keys the pipeline reads; anything else in a payload is dropped
+FIELDS = ('startDate', 'endDate', 'start', 'end', 'value', 'sourceName', 'source')
+
+
+def loads(data):
+    """Decode JSON bytes or str with the fastest available backend."""
+    if msgspec is not None:
+        return msgspec.json.decode(data)
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj) -> bytes:
+    """Encode to compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    if msgspec is not None:
+        return msgspec.json.encode(obj)
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+class _SampleMethods:
+    """Dict-style access shared by both Sample implementations."""
+
+    __slots__ = ()
+
+    def get(self, key, default=None):
+        """Like dict.get: default only when the key was absent (not when null)."""
+        value = getattr(self, key, _MISSING) if key in FIELDS else _MISSING
+        return default if value is _MISSING else value
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def to_dict(self):
+        """The sample as a dict of the keys it was decoded with."""
+        return {key: value for key in FIELDS if (value := getattr(self, key)) is not _MISSING}
+
+
+if msgspec is not None:
+    _MISSING = msgspec.UNSET
+
+    class Sample(msgspec.Struct, _SampleMethods, omit_defaults=True):
+        """One sleep sample (decoded directly by msgspec)."""
+        startDate: Any = msgspec.UNSET
+        endDate: Any = msgspec.UNSET
+        start: Any = msgspec.UNSET
+        end: Any = msgspec.UNSET
+        value: Any = msgspec.UNSET
+        sourceName: Any = msgspec.UNSET
+        source: Any = msgspec.UNSET
+
+    class _SyncBody(msgspec.Struct):
+        email: Any = None
+        samples: Union[List[Sample], str, None] = None
+        mode: Any = 'calendar'
+        continuation_token: Any = None
+
+    _body_decoder = msgspec.json.Decoder(_SyncBody)
+    _samples_decoder = msgspec.json.Decoder(List[Sample])
+else:
+    _MISSING = object()
+
+    class Sample(_SampleMethods):
+        """One sleep sample."""
+
+        __slots__ = FIELDS
+
+        def __init__(self, startDate=_MISSING, endDate=_MISSING, start=_MISSING, end=_MISSING,
+                     value=_MISSING, sourceName=_MISSING, source=_MISSING):
+            self.startDate = startDate
+            self.endDate = endDate
+            self.start = start
+            self.end = end
+            self.value = value
+            self.sourceName = sourceName
+            self.source = source
+
+        def __eq__(self, other):
+            return isinstance(other, Sample) and self.to_dict() == other.to_dict()
+
+        def __reduce__(self):
+            # The missing sentinel does not survive pickling; send present keys only
+            return (to_sample, (self.to_dict(),))
+
+
+def to_sample(item) -> Sample:
+    """Sample from a decoded dict (unknown keys dropped)."""
+    if isinstance(item, Sample):
+        return item
+    if not isinstance(item, dict):
+        raise ValueError('Each sample must be a JSON object')
+    return Sample(**{key: value for key, value in item.items() if key in FIELDS})
+
+
+def _ndjson_array(text) -> str:
+    """Turn NDJSON into one JSON array so it decodes in a single call."""
+    return '[' + ','.join(line for line in (raw.strip() for raw in text.split('\n')) if line) + ']'
+
+
+def decode_ndjson(text) -> list:
+    """Decode newline-delimited JSON into a list of plain values."""
+    return loads(_ndjson_array(text))
+
+
+def decode_samples(samples) -> List[Sample]:
+    """
+    Decode samples given as a list of dicts or an NDJSON string.
+
+    Raises:
+        ValueError: if the NDJSON is invalid or an entry is not an object
+    """
+    if isinstance(samples, str):
+        array = _ndjson_array(samples)
+        if msgspec is not None:
+            try:
+                return _samples_decoder.decode(array)
+            except msgspec.DecodeError as e:
+                raise ValueError(str(e)) from e
+        samples = loads(array)
+    if not isinstance(samples, list):
+        raise ValueError('samples must be a list or newline-delimited JSON')
+    return [to_sample(item) for item in samples]
+
+
+def decode_sync_body(body) -> dict:
+    """
+    Decode a /sync request body with samples as Sample objects.
+
+    Returns:
+        dict with email, samples, mode and continuation_token; other fields
+        are left for the pydantic model to validate
+
+    Raises:
+        ValueError: if the body or its samples are not valid JSON of the
+            expected shape
+    """
+    if msgspec is not None:
+        try:
+            decoded = _body_decoder.decode(body)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e)) from e
+        data = {'email': decoded.email, 'samples': decoded.samples, 'mode': decoded.mode,
+                'continuation_token': decoded.continuation_token}
+    else:
+        try:
+            data = loads(body)
+        except ValueError as e:
+            raise ValueError(f'Invalid JSON: {e}') from e
+        if not isinstance(data, dict):
+            raise ValueError('Request body must be a JSON object')
+        data = {key: data.get(key) for key in ('email', 'samples', 'mode', 'continuation_token')}
+    # An explicit "mode": null means the default, with either backend
+    data['mode'] = data['mode'] or 'calendar'
+    if data['samples'] is not None:
+        data['samples'] = decode_samples(data['samples'])
+    return data
+
+
+def canonical(sample) -> bytes:
+    """Key-order independent encoding of one sample, for fingerprints."""
+    if isinstance(sample, Sample):
+        sample = sample.to_dict()
+    if orjson is not None:
+        return orjson.dumps(sample, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(sample, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with the fastest available encoder."""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -0,0 +1,176 @@
+"""Sharded pool of service accounts for per-user calendar ownership."""
+import base64
+import bisect
+import glob
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+from api.calendar_directory import user_calendar_name
+from api.lazy import lazy_import
+
+service_account = lazy_import('google.oauth2.service_account')
+
+
+SCOPES = ['https://www.googleapis.com/auth/calendar']
+
+
+def load_credentials_info(value):
+    """Parse service account info from a JSON string or base64-encoded JSON."""
+    if isinstance(value, dict):
+        return value
+    try:
+        return json.loads(value)
+    except json.JSONDecodeError:
+        try:
+            return json.loads(base64.b64decode(value).decode('utf-8'))
+        except Exception:
+            raise ValueError("Invalid service account credentials format")
+
+
+def _hash(key: str) -> int:
+    """Stable 64-bit hash used for ring positions."""
+    return int.from_bytes(hashlib.sha1(key.encode('utf-8')).digest()[:8], 'big')
+
+
+def _ring(account_ids: List[str], virtual_nodes: int):
+    """Sorted ring positions and the account index at each."""
+    ring = sorted(
+        (_hash(f"{account_id}#{node}"), index)
+        for index, account_id in enumerate(account_ids)
+        for node in range(virtual_nodes)
+    )
+    return [position for position, _ in ring], [index for _, index in ring]
+
+
+def _owner(ring_keys: List[int], ring_shards: List[int], email: str) -> int:
+    """Index of the account the ring assigns this email to."""
+    position = _hash(email.strip().lower())
+    return ring_shards[bisect.bisect(ring_keys, position) % len(ring_keys)]
+
+
+class CredentialPool:
+    """
+    Consistent-hash ring of service accounts.
+
+    Each user email is deterministically mapped to one service account, so
+    that account owns the user's calendar and absorbs the user's Calendar API
+    quota. Ring positions are derived from each account's ``client_email``,
+    so adding or removing an account only moves ~1/N of the users. Users
+    whose calendar is recorded in a CalendarDirectory stay with the account
+    that owns it, so only new users are placed by the ring.
+    """
+
+    VIRTUAL_NODES = 100
+
+    def __init__(self, accounts: List[Dict[str, Any]], virtual_nodes: int = VIRTUAL_NODES):
+        """
+        Initialize credential pool.
+
+        Args:
+            accounts: List of service account info dicts
+            virtual_nodes: Ring positions per account (smooths the distribution)
+        """
+        if not accounts:
+            raise ValueError("CredentialPool requires at least one service account")
+        self.accounts = accounts
+        self.account_ids = [
+            info.get('client_email') or f"account-{index}"
+            for index, info in enumerate(accounts)
+        ]
+        if len(set(self.account_ids)) != len(self.account_ids):
+            raise ValueError("Duplicate service accounts in CredentialPool")
+
+        self.virtual_nodes = virtual_nodes
+        self._ring_keys, self._ring_shards = _ring(self.account_ids, virtual_nodes)
+        self._credentials: Dict[int, Any] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.accounts)
+
+    @classmethod
+    def from_directory(cls, path: str) -> 'CredentialPool':
+        """Load every ``*.json`` service account file in a directory."""
+        accounts = []
+        for file_path in sorted(glob.glob(os.path.join(path, '*.json'))):
+            with open(file_path, 'r') as f:
+                accounts.append(json.load(f))
+        return cls(accounts)
+
+    @classmethod
+    def from_env(cls) -> Optional['CredentialPool']:
+        """
+        Build a pool from the environment, or return None if not configured.
+
+        Reads ``GOOGLE_CALENDAR_CREDENTIALS_DIR`` (directory of JSON key files)
+        or ``GOOGLE_CALENDAR_CREDENTIALS_LIST`` (comma-separated base64 keys).
+        """
+        creds_dir = os.getenv('GOOGLE_CALENDAR_CREDENTIALS_DIR')
+        if creds_dir:
+            return cls.from_directory(creds_dir)
+        creds_list = os.getenv('GOOGLE_CALENDAR_CREDENTIALS_LIST')
+        if creds_list:
+            return cls([load_credentials_info(item.strip()) for item in creds_list.split(',') if item.strip()])
+        return None
+
+    def shard_for(self, email: str, directory=None) -> int:
+        """
+        Return the index of the account that owns this email.
+
+        Args:
+            email: User email
+            directory: CalendarDirectory; an account recorded there as
+                holding the user's calendar wins over the ring (optional)
+        """
+        if directory is not None:
+            for account in directory.accounts(user_calendar_name(email)):
+                if account in self.account_ids:
+                    return self.account_ids.index(account)
+        return _owner(self._ring_keys, self._ring_shards, email)
+
+    def previous_owners(self, email: str, rings: List[List[str]]) -> List[int]:
+        """
+        Return the indexes of accounts that owned this email on earlier rings.
+
+        Args:
+            email: User email
+            rings: Account ID lists the pool was built from before, e.g.
+                CalendarDirectory.rings()
+
+        Returns:
+            Shards of this pool, other than the email's ring shard, that an
+            earlier ring placed the email on (usually none)
+        """
+        current = _owner(self._ring_keys, self._ring_shards, email)
+        owners = []
+        for account_ids in rings:
+            if not account_ids:
+                continue
+            keys, shards = _ring(account_ids, self.virtual_nodes)
+            account = account_ids[_owner(keys, shards, email)]
+            if account in self.account_ids:
+                shard = self.account_ids.index(account)
+                if shard != current and shard not in owners:
+                    owners.append(shard)
+        return owners
+
+    def account_for(self, email: str, directory=None) -> str:
+        """Return the ``client_email`` of the account that owns this email."""
+        return self.account_ids[self.shard_for(email, directory)]
+
+    def credentials_for(self, email: str, directory=None):
+        """Return (cached) service account credentials for this email's shard."""
+        return self.credentials_at(self.shard_for(email, directory))
+
+    def credentials_at(self, shard: int):
+        """Return (cached) service account credentials for a shard index."""
+        with self._lock:
+            creds = self._credentials.get(shard)
+            if creds is None:
+                creds = service_account.Credentials.from_service_account_info(
+                    self.accounts[shard], scopes=SCOPES)
+                self._credentials[shard] = creds
+        return creds
@@ -0,0 +1,49 @@
+"""Shared local SQLite database for caches and stores."""
+import os
+import sqlite3
+import tempfile
+
+
+def default_path():
+    """Database path from SLEEP_CALENDAR_DB (default: a file in the temp dir)."""
+    return os.getenv('SLEEP_CALENDAR_DB') or os.path.join(tempfile.gettempdir(), 'sleep-calendar.db')
+
+
+def connect(path=None):
+    """
+    Open a connection usable from any thread (callers serialize access).
+
+    WAL mode lets readers proceed while another connection writes.
+    """
+    conn = sqlite3.connect(path or default_path(), check_same_thread=False, timeout=30)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+
+def shared_state():
+    """
+    Whether per-process state must be shared through this database: set
+    when several worker processes serve the instance (WEB_CONCURRENCY above
+    1) or forced with SHARED_STATE=1/0.
+    """
+    setting = os.getenv('SHARED_STATE', '').strip().lower()
+    if setting:
+        return setting in ('1', 'true', 'on')
+    workers = os.getenv('WEB_CONCURRENCY', '1').strip()
+    return not workers.isdigit() or int(workers) > 1
+
+
+def web_workers():
+    """Server worker processes sharing this instance (WEB_CONCURRENCY, default 1)."""
+    workers = os.getenv('WEB_CONCURRENCY', '1').strip()
+    return int(workers) if workers.isdigit() and int(workers) > 0 else 1
+
+
+def per_worker(limit):
+    """
+    This process's share of an instance-wide limit, e.g. admission
+    watermarks and the Calendar bulkhead, which each worker enforces on its
+    own (at least 1).
+    """
+    return max(1, int(limit) // web_workers())
@@ -0,0 +1,82 @@
+"""Time budgets and continuation tokens for deadline-aware syncs."""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from api.session_store import token_secret
+
+
+# Seconds kept back from every budget to finish the response
+MARGIN = float(os.getenv('SYNC_DEADLINE_MARGIN', '2'))
+
+
+def parse_deadline(value=None, default=None):
+    """
+    Turn a deadline into a time.monotonic() value to stop by, or None.
+
+    Args:
+        value: Seconds remaining ("25", "25s", "1500ms") or an absolute Unix
+            timestamp, e.g. from the X-Request-Deadline header
+        default: Budget in seconds when value is empty (default:
+            SYNC_TIME_BUDGET, unset meaning no deadline)
+
+    Raises:
+        ValueError: if value is not a number of seconds or milliseconds
+    """
+    value = (value or '').strip().lower()
+    if not value:
+        default = default if default is not None else os.getenv('SYNC_TIME_BUDGET')
+        if not default:
+            return None
+        budget = float(default)
+    elif value.endswith('ms'):
+        budget = float(value[:-2]) / 1000
+    else:
+        budget = float(value.rstrip('s'))
+        if budget > 1e9:
+            # Absolute Unix timestamp
+            budget -= time.time()
+    return time.monotonic() + budget - MARGIN
+
+
+def _sign(data: bytes) -> str:
+    return hmac.new(token_secret(), data, hashlib.sha256).hexdigest()[:32]
+
+
+def encode_continuation(email: str, fingerprint: Optional[str], before: datetime) -> str:
+    """
+    Token telling a later request which nights of a payload are already done.
+
+    Nights are synced newest first, so everything from `before` onwards is
+    written; the token is only honoured for the same user and payload.
+    """
+    data = json.dumps({'e': email.lower(), 'f': fingerprint, 'b': before.timestamp()},
+                      separators=(',', ':')).encode('utf-8')
+    encoded = base64.urlsafe_b64encode(data).rstrip(b'=')
+    return f"{encoded.decode('ascii')}.{_sign(encoded)}"
+
+
+def decode_continuation(token: Optional[str], email: str, fingerprint: Optional[str]) -> Optional[datetime]:
+    """
+    Return the `before` bound from a valid token for this user and payload.
+
+    Tokens that are malformed, forged, or were issued for another user or
+    payload return None, which means a full (still idempotent) sync.
+    """
+    if not token or '.' not in token:
+        return None
+    encoded, signature = token.rsplit('.', 1)
+    if not hmac.compare_digest(signature, _sign(encoded.encode('ascii', 'replace'))):
+        return None
+    try:
+        data = json.loads(base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4)))
+    except ValueError:
+        return None
+    if data.get('e') != email.lower() or data.get('f') != fingerprint:
+        return None
+    return datetime.fromtimestamp(data['b'], timezone.utc)
@@ -0,0 +1,156 @@
+"""Render stored sleep sessions as an iCalendar (ICS) feed."""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from api.session_cache import RENDER_VERSION
+from api.sleep_calendar import render_session_events
+
+
+# Sessions older than this are left out of the feed
+FEED_DAYS = int(os.getenv('ICS_FEED_DAYS', '90'))
+
+
+def _escape(text):
+    """Escape a TEXT value (RFC 5545 section 3.3.11)."""
+    return (text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def _fold(line):
+    """Fold a content line at 75 octets without splitting UTF-8 characters."""
+    data = line.encode('utf-8')
+    if len(data) <= 75:
+        return data + b'\r\n'
+    parts = []
+    limit = 75
+    while len(data) > limit:
+        cut = limit
+        while cut and (data[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(data[:cut])
+        data = data[cut:]
+        limit = 74  # continuation lines start with a space
+    parts.append(data)
+    return b'\r\n '.join(parts) + b'\r\n'
+
+
+def _utc(value):
+    """Format an aware datetime (or ISO string) as an ICS UTC timestamp."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _vevent(uid, stamp, event):
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:{uid}',
+        f'DTSTAMP:{stamp}',
+        f"DTSTART:{_utc(event['start']['dateTime'])}",
+        f"DTEND:{_utc(event['end']['dateTime'])}",
+        f"SUMMARY:{_escape(event['summary'])}",
+        f"DESCRIPTION:{_escape(event['description'])}",
+        'TRANSP:TRANSPARENT',
+        'END:VEVENT',
+    ]
+    return b''.join(_fold(line) for line in lines)
+
+
+def feed_cutoff(now=None):
+    """Start of the feed window, truncated to the day so validators stay stable."""
+    now = now or datetime.now(timezone.utc)
+    return (now - timedelta(days=FEED_DAYS)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def feed_etag(email, count, updated_at, cutoff):
+    """Strong validator for a feed; changes whenever its bytes would."""
+    key = f'{email.lower()}|{count}|{updated_at}|{cutoff.isoformat()}|v{RENDER_VERSION}'
+    return '"' + hashlib.sha1(key.encode('utf-8')).hexdigest() + '"'
+
+
+def render_feed(email, summaries, updated_at):
+    """
+    Yield the ICS document for a user's sessions in chunks (one per night).
+
+    Events match what sync writes to Google Calendar: the aggregated sleep
+    event plus one event per stage interval.
+    """
+    stamp = _utc(datetime.fromtimestamp(updated_at or 0, timezone.utc))
+    yield b''.join(_fold(line) for line in [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//Sleep Calendar//Sleep Data//EN',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{_escape(f"Sleep Data - {email}")}',
+        'X-WR-TIMEZONE:America/Los_Angeles',
+        'REFRESH-INTERVAL;VALUE=DURATION:PT1H',
+        'X-PUBLISHED-TTL:PT1H',
+    ])
+    for summary in summaries:
+        event, stage_events = render_session_events(summary)
+        night = hashlib.sha1(f"{email.lower()}|{summary['start'].isoformat()}".encode('utf-8')).hexdigest()[:20]
+        chunk = [_vevent(f'{night}-sleep@sleep-calendar', stamp, event)]
+        for index, (_, _, stage_event) in enumerate(stage_events):
+            chunk.append(_vevent(f'{night}-{index}@sleep-calendar', stamp, stage_event))
+        yield b''.join(chunk)
+    yield _fold('END:VCALENDAR')
+
+
+class FeedCache:
+    """
+    Bounded in-memory cache of rendered feeds, keyed by email.
+
+    Entries carry the ETag they were rendered for and are only served while
+    it still matches the store, so a sync on another instance also
+    invalidates them; ``invalidate`` drops an entry eagerly after a local sync.
+    """
+
+    def __init__(self, max_entries=256):
+        """
+        Initialize feed cache.
+
+        Args:
+            max_entries: Max feeds kept (least recently used evicted first)
+        """
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, email, etag):
+        """Return the cached feed bytes for this ETag, or None."""
+        with self._lock:
+            entry = self._entries.get(email.lower())
+            if entry is None or entry[0] != etag:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(email.lower())
+            self.hits += 1
+            return entry[1]
+
+    def put(self, email, etag, body):
+        """Store a rendered feed."""
+        with self._lock:
+            self._entries[email.lower()] = (etag, body)
+            self._entries.move_to_end(email.lower())
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, email):
+        """Drop a user's rendered feed."""
+        with self._lock:
+            self._entries.pop(email.lower(), None)
+
+    def stats(self):
+        """Counters for the metrics endpoint."""
+        with self._lock:
+            return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+# Global feed cache instance
+feed_cache = FeedCache(max_entries=int(os.getenv('ICS_CACHE_SIZE', '256')))
@@ -0,0 +1,365 @@
+"""
+Inventory of every calendar the service accounts own, with duplicate and
+orphan detection and batched clean-up.
+
+Each account's calendarList is read in full, events are counted per
+calendar in a bounded thread pool, and the result is a report (JSON or
+CSV) that can also drive merging duplicates and deleting orphans.
+"""
+import csv
+import io
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from api.calendar_pool import DEFAULT_TTL, POOL_PREFIX, pool_expired
+
+CALENDAR_NAME = 'Sleep Data'
+USER_PREFIX = CALENDAR_NAME + ' - '
+
+# Columns of the CSV report, one row per calendar
+CSV_FIELDS = ('account', 'calendar_id', 'summary', 'kind', 'email', 'access_role', 'events', 'events_delta',
+              'status', 'keeper', 'keeper_account', 'error')
+
+# Fields of an event copied into a keeper owned by another account
+COPIED_FIELDS = ('summary', 'description', 'start', 'end', 'extendedProperties')
+
+
+def classify(summary):
+    """
+    Kind of calendar from its summary.
+
+    Returns:
+        (kind, email): kind is 'user' ("Sleep Data - {email}"), 'default'
+        ("Sleep Data"), 'pool' (unclaimed, see api.calendar_pool) or 'other'
+    """
+    if summary.startswith(POOL_PREFIX):
+        return 'pool', None
+    if summary.startswith(USER_PREFIX):
+        return 'user', summary[len(USER_PREFIX):]
+    if summary == CALENDAR_NAME:
+        return 'default', None
+    return 'other', None
+
+
+class Fleet:
+    """Calendar clients for a set of service accounts, one per thread."""
+
+    def __init__(self, accounts, api_endpoint=None, pacer=None):
+        """
+        Initialize fleet.
+
+        Args:
+            accounts: List of (account ID, google.auth credentials); None
+                credentials use the default service account
+            api_endpoint: Calendar API base URL (optional)
+            pacer: QuotaPacer shared by every client (optional)
+        """
+        self.accounts = list(accounts)
+        self.api_endpoint = api_endpoint
+        self.pacer = pacer
+        self._credentials = dict(self.accounts)
+        self._local = threading.local()
+
+    @classmethod
+    def from_pool(cls, credential_pool, api_endpoint=None, pacer=None):
+        """Every account of a CredentialPool, or the default account for None."""
+        if credential_pool is None:
+            return cls([('default', None)], api_endpoint=api_endpoint, pacer=pacer)
+        accounts = [(credential_pool.account_ids[i], credential_pool.credentials_at(i))
+                    for i in range(len(credential_pool))]
+        return cls(accounts, api_endpoint=api_endpoint, pacer=pacer)
+
+    def client(self, account):
+        """This thread's SleepCalendar for an account (googleapiclient is not thread-safe)."""
+        from api.sleep_calendar import SleepCalendar
+        clients = self._local.__dict__.setdefault('clients', {})
+        if account not in clients:
+            cal = SleepCalendar(credentials=self._credentials[account], api_endpoint=self.api_endpoint,
+                                pacer=self.pacer)
+            # Same key as the calendar directory and breakers use
+            cal.account = None if account == 'default' else account
+            clients[account] = cal
+        return clients[account]
+
+
+def list_calendars(cal):
+    """Every calendar in cal's calendarList, following all pages."""
+    calendars = []
+    page_token = None
+    while True:
+        page = cal._execute(cal.service.calendarList().list(
+            pageToken=page_token, maxResults=250, fields='items(id,summary,accessRole),nextPageToken'))
+        calendars.extend(page.get('items', []))
+        page_token = page.get('nextPageToken')
+        if not page_token:
+            return calendars
+
+
+def list_events(cal, calendar_id):
+    """
+    Every event in a calendar as a list of ((summary, start), event ID).
+
+    Used both to count events and to tell which events of a duplicate the
+    kept calendar already has.
+    """
+    events = []
+    page_token = None
+    while True:
+        page = cal._execute(cal.service.events().list(
+            calendarId=calendar_id, pageToken=page_token, maxResults=2500,
+            fields='items(id,summary,start),nextPageToken'))
+        for event in page.get('items', []):
+            start = event.get('start', {})
+            events.append(((event.get('summary', ''), start.get('dateTime') or start.get('date')), event['id']))
+        page_token = page.get('nextPageToken')
+        if not page_token:
+            return events
+
+
+def list_event_bodies(cal, calendar_id):
+    """Every event in a calendar as {event ID: body with COPIED_FIELDS}."""
+    bodies = {}
+    page_token = None
+    while True:
+        page = cal._execute(cal.service.events().list(
+            calendarId=calendar_id, pageToken=page_token, maxResults=2500,
+            fields=f"items(id,{','.join(COPIED_FIELDS)}),nextPageToken"))
+        for event in page.get('items', []):
+            bodies[event['id']] = {field: event[field] for field in COPIED_FIELDS if field in event}
+        page_token = page.get('nextPageToken')
+        if not page_token:
+            return bodies
+
+
+def take_inventory(fleet, workers=8, directory=None, live_pool=(), previous=None, pool_ttl=DEFAULT_TTL):
+    """
+    List every calendar of every account and count its events.
+
+    Calendars sharing a "Sleep Data" name within an account are duplicates,
+    and so are a user's calendars under several accounts (e.g. a pooled
+    calendar claimed before the one under the account the ring moved the
+    user from was found); the one the calendar directory points at is kept
+    (else the one with the most events). Unclaimed pool calendars whose lease ran out (see
+    api.calendar_pool) and that this instance does not hold are orphans, as
+    are directory entries whose calendar no longer exists.
+    Empty user calendars are reported but never collected, since deleting
+    one would break the user's subscription URL.
+
+    Args:
+        fleet: Fleet of service accounts
+        workers: Concurrent Calendar API calls
+        directory: CalendarDirectory to check and prefer keepers from (optional)
+        live_pool: Pool calendar IDs held by this instance
+        previous: Earlier report, to add each calendar's events_delta (optional)
+        pool_ttl: Seconds an unclaimed calendar stays leased to the instance that stamped it
+
+    Returns:
+        Report dict; 'items' has one row per calendar
+    """
+    started = time.monotonic()
+    now = time.time()
+    live_pool = set(live_pool)
+    failures = []
+
+    def list_account(account):
+        try:
+            return account, list_calendars(fleet.client(account))
+        except Exception as e:
+            failures.append({'account': account, 'calendar_id': None, 'error': str(e)})
+            return account, None
+
+    def count(row):
+        try:
+            row['events'] = len(list_events(fleet.client(row['account']), row['calendar_id']))
+        except Exception as e:
+            row['error'] = str(e)
+            failures.append({'account': row['account'], 'calendar_id': row['calendar_id'], 'error': str(e)})
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        listed = dict(pool.map(list_account, [account for account, _ in fleet.accounts]))
+        rows = []
+        for account, calendars in listed.items():
+            for item in calendars or ():
+                kind, email = classify(item.get('summary', ''))
+                rows.append({'account': account, 'calendar_id': item['id'], 'summary': item.get('summary', ''),
+                             'kind': kind, 'email': email, 'access_role': item.get('accessRole'),
+                             'events': None, 'events_delta': None, 'status': 'ok', 'keeper': None,
+                             'keeper_account': None, 'error': None})
+        list(pool.map(count, rows))
+
+    # Duplicates: same name within one account, or a user's name in any account
+    groups = {}
+    for row in rows:
+        if row['kind'] == 'user':
+            groups.setdefault(row['summary'], []).append(row)
+        elif row['kind'] == 'default':
+            groups.setdefault((row['account'], row['summary']), []).append(row)
+    for group in groups.values():
+        if len(group) < 2:
+            continue
+        known = [row for row in group if directory is not None and
+                 directory.get(row['account'], row['summary']) == row['calendar_id']]
+        keeper = max(known or group, key=lambda row: row['events'] or 0)
+        for row in group:
+            if row is not keeper:
+                row['status'] = 'duplicate'
+                row['keeper'] = keeper['calendar_id']
+                row['keeper_account'] = keeper['account']
+
+    for row in rows:
+        if row['kind'] == 'pool' and row['calendar_id'] not in live_pool and \
+                pool_expired(row['summary'], pool_ttl, now):
+            row['status'] = 'orphan'
+        elif row['status'] == 'ok' and row['kind'] == 'user' and row['events'] == 0:
+            row['status'] = 'empty'
+
+    stale = []
+    if directory is not None:
+        existing = {(row['account'], row['calendar_id']) for row in rows}
+        stale = [{'account': account, 'name': name, 'calendar_id': calendar_id}
+                 for account, name, calendar_id in directory.entries()
+                 if listed.get(account) is not None and (account, calendar_id) not in existing]
+
+    if previous is not None:
+        before = {(row['account'], row['calendar_id']): row.get('events') for row in previous.get('items', [])}
+        for row in rows:
+            if row['events'] is not None and before.get((row['account'], row['calendar_id'])) is not None:
+                row['events_delta'] = row['events'] - before[(row['account'], row['calendar_id'])]
+
+    by_kind = {}
+    for row in rows:
+        by_kind[row['kind']] = by_kind.get(row['kind'], 0) + 1
+    return {
+        'accounts': len(fleet.accounts),
+        'calendars': len(rows),
+        'events': sum(row['events'] or 0 for row in rows),
+        'by_kind': by_kind,
+        'duplicates': sum(row['status'] == 'duplicate' for row in rows),
+        'orphans': sum(row['status'] == 'orphan' for row in rows),
+        'empty': sum(row['status'] == 'empty' for row in rows),
+        'stale_directory': stale,
+        'failures': failures,
+        'elapsed_seconds': round(time.monotonic() - started, 3),
+        'items': rows,
+    }
+
+
+def collect(fleet, report, merge=False, delete_orphans=False, workers=8, directory=None):
+    """
+    Act on an inventory report with batched calls.
+
+    Merging moves each duplicate's events that its keeper lacks (same
+    summary and start) into the keeper, then deletes the duplicate; a
+    duplicate is only deleted if every move succeeded. Events of a duplicate
+    under another account than its keeper are copied with the keeper's
+    account instead, since neither account can write to the other's
+    calendar. Stale directory
+    entries are always dropped.
+
+    Args:
+        fleet: Fleet the report was taken with
+        report: Report from take_inventory
+        merge: Merge duplicates into their keepers
+        delete_orphans: Delete orphaned pool calendars
+        workers: Concurrent accounts (event listings for merges share the pool)
+        directory: CalendarDirectory to repoint and prune (optional)
+
+    Returns:
+        Actions dict (also stored as report['actions'])
+    """
+    actions = {'events_moved': 0, 'calendars_deleted': 0, 'directory_forgotten': 0, 'failures': []}
+    duplicates = [row for row in report['items'] if merge and row['status'] == 'duplicate']
+    orphans = [row for row in report['items'] if delete_orphans and row['status'] == 'orphan']
+    lock = threading.Lock()
+
+    def failed(row, request_id, error):
+        with lock:
+            actions['failures'].append({'account': row['account'], 'calendar_id': row['calendar_id'],
+                                        'request': request_id, 'error': str(error)})
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Event keys of every calendar taking part in a merge
+        involved = sorted({key for row in duplicates
+                           for key in ((row['account'], row['calendar_id']), (row['keeper_account'], row['keeper']))})
+
+        def events_of(key):
+            try:
+                return key, list_events(fleet.client(key[0]), key[1])
+            except Exception as e:
+                print(f"Warning: could not list events of {key[1]}: {e}", file=sys.stderr)
+                return key, None
+        events = dict(pool.map(events_of, involved))
+
+        def copy_events(row, event_ids):
+            try:
+                bodies = list_event_bodies(fleet.client(row['account']), row['calendar_id'])
+            except Exception as e:
+                return 0, [('events.list', e)]
+            keeper = fleet.client(row['keeper_account'])
+            return keeper.execute_batched(
+                (f"{row['calendar_id']}/{event_id}",
+                 keeper.service.events().insert(calendarId=row['keeper'], body=bodies[event_id]))
+                for event_id in event_ids if event_id in bodies)
+
+        def collect_account(account):
+            cal = fleet.client(account)
+            deletions = []
+            for row in duplicates:
+                if row['account'] != account:
+                    continue
+                have = events[(row['keeper_account'], row['keeper'])]
+                extra = events[(account, row['calendar_id'])]
+                if have is None or extra is None:
+                    failed(row, 'events.list', 'could not list events')
+                    continue
+                have = {key for key, _ in have}
+                missing = [event_id for key, event_id in extra if key not in have]
+                if row['keeper_account'] == account:
+                    moves = [(f"{row['calendar_id']}/{event_id}",
+                              cal.service.events().move(calendarId=row['calendar_id'], eventId=event_id,
+                                                        destination=row['keeper']))
+                             for event_id in missing]
+                    moved, errors = cal.execute_batched(moves)
+                else:
+                    moved, errors = copy_events(row, missing) if missing else (0, [])
+                with lock:
+                    actions['events_moved'] += moved
+                for request_id, error in errors:
+                    failed(row, request_id, error)
+                if not errors:
+                    deletions.append(row)
+            deletions += [row for row in orphans if row['account'] == account]
+            deleted, errors = cal.execute_batched(
+                (row['calendar_id'], cal.service.calendars().delete(calendarId=row['calendar_id']))
+                for row in deletions)
+            with lock:
+                actions['calendars_deleted'] += deleted
+            failed_ids = {request_id for request_id, _ in errors}
+            for row in deletions:
+                if row['calendar_id'] in failed_ids:
+                    failed(row, 'calendars.delete', dict(errors)[row['calendar_id']])
+                else:
+                    row['status'] = 'deleted'
+        list(pool.map(collect_account, sorted({row['account'] for row in duplicates + orphans})))
+
+    if directory is not None:
+        for row in duplicates:
+            if row['status'] == 'deleted':
+                directory.forget(row['calendar_id'])
+                directory.put(row['keeper_account'], row['summary'], row['keeper'])
+        for entry in report['stale_directory']:
+            directory.forget(entry['calendar_id'])
+            actions['directory_forgotten'] += 1
+    report['actions'] = actions
+    return actions
+
+
+def to_csv(report):
+    """The report's calendars as CSV text, one row per calendar."""
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=CSV_FIELDS, extrasaction='ignore')
+    writer.writeheader()
+    writer.writerows(report['items'])
+    return out.getvalue()
@@ -0,0 +1,21 @@
+"""Deferred imports for heavy dependencies, to keep cold starts fast."""
+import importlib.util
+import sys
+
+
+def lazy_import(name):
+    """
+    Return module `name`, running its code only on first attribute access.
+
+    The module is registered in sys.modules, so a later regular import (or
+    unittest.mock.patch on one of its attributes) sees the same object.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -1,7 +1,7 @@
 """Pydantic models for API requests and responses."""
 from pydantic import BaseModel, EmailStr, Field, field_validator
-from typing import List, Dict, Any, Optional, Union
-import json
+from typing import List, Dict, Any, Literal, Optional, Union
+from api import codec
 
 
 class SleepSample(BaseModel):
@@ -19,6 +19,8 @@ class SyncRequest(BaseModel):
     """Request to sync sleep data."""
     email: EmailStr = Field(..., description="User email for calendar identification")
     samples: Union[List[Dict[str, Any]], str] = Field(..., description="List of sleep samples or newline-delimited JSON string")
+    mode: Literal["calendar", "ics"] = Field("calendar", description="'ics' only updates the ICS feed and makes no Calendar API calls (refused unless the server keeps feeds on persistent shared storage)")
+    continuation_token: Optional[str] = Field(None, description="Token from a previous partial sync of the same samples")
     
     @field_validator('samples', mode='before')
     @classmethod
@@ -27,8 +29,8 @@ class SyncRequest(BaseModel):
         if isinstance(v, str):
             # Try parsing as newline-delimited JSON
             try:
-                return [json.loads(line) for line in v.strip().split('\n') if line.strip()]
-            except (json.JSONDecodeError, AttributeError):
+                return codec.decode_ndjson(v)
+            except ValueError:
                 # If parsing fails, return as-is (will be handled in server)
                 return v
         return v
@@ -40,4 +42,8 @@ class SyncResponse(BaseModel):
     events_synced: Optional[int] = None
     calendar_id: Optional[str] = None
     calendar_url: Optional[str] = None
+    ics_url: Optional[str] = None
+    stats_url: Optional[str] = None
+    remaining_nights: int = 0
+    continuation_token: Optional[str] = None
     error: Optional[str] = None
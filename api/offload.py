@@ -0,0 +1,99 @@
+"""Optional process pool for the CPU-heavy parse and grouping stages."""
+import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from api.db import per_worker
+from api.sleep_calendar import build_session_summaries, load_samples
+
+
+def _pool_size():
+    """
+    Worker count from SYNC_PROCESS_POOL ('auto'/'1' = CPU count, split
+    between WEB_CONCURRENCY server processes; N = N; unset/'0' = off).
+    """
+    setting = os.getenv('SYNC_PROCESS_POOL', '0').strip().lower()
+    if setting in ('', '0', 'false', 'off'):
+        return 0
+    if setting in ('1', 'true', 'on', 'auto'):
+        return per_worker(os.cpu_count() or 1)
+    return int(setting)
+
+
+# Payloads smaller than this are cheaper to summarize in-process than to ship
+MIN_SAMPLES = int(os.getenv('SYNC_PROCESS_MIN_SAMPLES', '2000'))
+
+_executor = None
+_lock = threading.Lock()
+
+
+def summarize_payload(samples, days=30, known_hashes=None, archive_email=None):
+    """
+    Parse, group and summarize raw samples (runs in a worker process).
+
+    Args:
+        samples: List of sample dicts, or raw JSON / newline-delimited JSON
+            as bytes or str
+        days: Number of days to look back for cutoff
+        known_hashes: Session hashes already synced (skipped)
+        archive_email: Also append the parsed samples to this user's
+            sample archive (optional)
+    """
+    if isinstance(samples, bytes):
+        samples = samples.decode('utf-8')
+    if isinstance(samples, str):
+        try:
+            decoded = json.loads(samples)
+        except json.JSONDecodeError:
+            # Newline-delimited JSON, split by load_samples
+            decoded = samples
+        if isinstance(decoded, dict) and 'samples' not in decoded:
+            # A single NDJSON line
+            decoded = [decoded]
+        samples = decoded
+    data = samples if isinstance(samples, dict) else {'samples': samples}
+    archive = archived = None
+    if archive_email:
+        from api.sample_archive import sample_archive
+        if sample_archive is not None:
+            archive = partial(sample_archive.append_intervals, archive_email)
+            archived = sample_archive.span(archive_email)
+    return build_session_summaries(load_samples(data), days=days, known_hashes=known_hashes, archive=archive,
+                                   archived=archived)
+
+
+def get_executor():
+    """Return the shared process pool, or None when offloading is disabled."""
+    global _executor
+    size = _pool_size()
+    if size <= 0:
+        return None
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=size)
+    return _executor
+
+
+def should_offload(samples):
+    """Whether this payload is large enough to be worth a worker process."""
+    if _pool_size() <= 0:
+        return False
+    if isinstance(samples, (bytes, str)):
+        return samples.count('\n' if isinstance(samples, str) else b'\n') + 1 >= MIN_SAMPLES
+    return len(samples) >= MIN_SAMPLES
+
+
+def summarize(samples, days=30, known_hashes=None, archive_email=None):
+    """Summarize samples in the process pool and wait for the compact result."""
+    return get_executor().submit(summarize_payload, samples, days, known_hashes, archive_email).result()
+
+
+def shutdown():
+    """Stop the worker processes (called on server shutdown)."""
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
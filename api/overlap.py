@@ -0,0 +1,117 @@
+"""Resolve overlapping intervals from several HealthKit sources into one timeline."""
+import heapq
+import os
+
+# Source name fragments, most trusted first; "*" stands for every source
+# not listed. Matching is case-insensitive on substrings, so "Watch" covers
+# "Conner's Apple Watch".
+DEFAULT_PRIORITY = ('Watch', '*', 'iPhone')
+
+# Values that name a sleep stage beat generic ones ("Asleep", "InBed") from
+# a source of equal priority
+STAGES = ('Core', 'Deep', 'REM', 'Awake')
+
+
+class SourcePolicy:
+    """
+    Ranks intervals by source priority, then stage specificity.
+
+    Where intervals overlap, the best-ranked one owns the overlap; among
+    equals the one that started first keeps it.
+    """
+
+    def __init__(self, priority=DEFAULT_PRIORITY):
+        """
+        Initialize source policy.
+
+        Args:
+            priority: Source name fragments, most trusted first ("*" for the rest)
+        """
+        self.priority = tuple(p.strip() for p in priority if p.strip())
+        if '*' not in self.priority:
+            self.priority += ('*',)
+        self._patterns = [p.lower() for p in self.priority]
+        self._others = self._patterns.index('*')
+        self._stages = {stage.lower() for stage in STAGES}
+        self._ranks = {}
+
+    @classmethod
+    def parse(cls, text):
+        """Build a policy from "Watch,*,iPhone"."""
+        return cls(text.split(','))
+
+    def source_rank(self, source):
+        """Position of a source in the priority list (lower wins)."""
+        rank = self._ranks.get(source)
+        if rank is None:
+            name = (source or '').lower()
+            rank = next((index for index, pattern in enumerate(self._patterns)
+                         if pattern != '*' and pattern in name), self._others)
+            self._ranks[source] = rank
+        return rank
+
+    def rank(self, interval):
+        """Sort key of an interval (lower wins)."""
+        specific = str(interval.get('value', '')).strip().lower() in self._stages
+        return (self.source_rank(interval.get('source')), 0 if specific else 1)
+
+
+def merge_intervals(intervals, policy=None):
+    """
+    Merge overlapping intervals into one non-overlapping timeline.
+
+    A sweep over the sorted interval boundaries keeps the active intervals
+    in a heap ordered by policy rank; each stretch between boundaries goes
+    to the best active interval, and consecutive stretches won by the same
+    interval become one piece. O(n log n).
+
+    Args:
+        intervals: Intervals sorted by start, as parse_intervals yields
+        policy: SourcePolicy (default: default_policy)
+
+    Returns:
+        List of intervals sorted by start. Input without overlaps is
+        returned unchanged; trimmed pieces are copies with new start/end.
+    """
+    intervals = list(intervals)
+    latest_end = None
+    for interval in intervals:
+        if latest_end is not None and interval['start'] < latest_end:
+            break
+        latest_end = interval['end'] if latest_end is None else max(latest_end, interval['end'])
+    else:
+        return intervals
+
+    policy = policy or default_policy
+    points = sorted({i['start'] for i in intervals} | {i['end'] for i in intervals})
+    active = []
+    added = 0
+    merged = []
+    winner = piece_start = None
+
+    def close(end):
+        interval = intervals[winner]
+        if piece_start == interval['start'] and end == interval['end']:
+            merged.append(interval)
+        else:
+            merged.append(dict(interval, start=piece_start, end=end))
+
+    for left, right in zip(points, points[1:]):
+        while added < len(intervals) and intervals[added]['start'] <= left:
+            heapq.heappush(active, (policy.rank(intervals[added]), added))
+            added += 1
+        while active and intervals[active[0][1]]['end'] <= left:
+            heapq.heappop(active)
+        best = active[0][1] if active else None
+        if best == winner:
+            continue
+        if winner is not None:
+            close(left)
+        winner, piece_start = best, left
+    if winner is not None:
+        close(points[-1])
+    return merged
+
+
+# Policy used by sync, feeds and reprocessing (SOURCE_PRIORITY overrides)
+default_policy = SourcePolicy.parse(os.getenv('SOURCE_PRIORITY')) if os.getenv('SOURCE_PRIORITY') else SourcePolicy()
@@ -0,0 +1,289 @@
+"""
+Streaming sync pipeline shared by the CLI, batch jobs and the API.
+
+    source → parse → group → summarize → render → sink
+
+Sources yield raw sample dicts; parsing, grouping and summarizing are the
+generator stages in api.sleep_calendar; sinks render and write summaries.
+"""
+import bisect
+import json
+import sys
+from datetime import datetime, timedelta
+
+from api.sleep_calendar import is_aggregated_event, iter_session_summaries, render_session_events
+
+
+# Sources
+
+def ndjson_source(lines):
+    """Yield samples from newline-delimited JSON (a file object or any iterable of lines)."""
+    for line in lines:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def body_source(data):
+    """
+    Yield samples from a request body or parsed export.
+
+    Args:
+        data: Dict with 'samples' key, list of samples, or either with
+            samples as a newline-delimited JSON string
+    """
+    samples = data.get('samples', []) if isinstance(data, dict) else data
+    if isinstance(samples, str):
+        yield from ndjson_source(samples.splitlines())
+    elif isinstance(samples, list):
+        yield from samples
+
+
+def file_source(path):
+    """
+    Yield samples from an export file.
+
+    ``.ndjson``/``.jsonl`` files (and ``-`` for stdin) are streamed line by
+    line; anything else is read as a JSON export.
+    """
+    if path == '-':
+        yield from ndjson_source(sys.stdin)
+        return
+    with open(path, 'r') as f:
+        if path.endswith(('.ndjson', '.jsonl')):
+            yield from ndjson_source(f)
+        else:
+            yield from body_source(json.load(f))
+
+
+# Sinks
+
+class CalendarSink:
+    """Write nights one at a time, newest first, honouring a deadline (the /sync path)."""
+
+    def __init__(self, cal, deadline=None, before=None):
+        """
+        Initialize calendar sink.
+
+        Args:
+            cal: SleepCalendar with calendar_id set
+            deadline: time.monotonic() value to stop by (see SleepCalendar.sync_sessions)
+            before: Resume bound from an earlier partial sync (optional)
+        """
+        self.cal = cal
+        self.deadline = deadline
+        self.before = before
+
+    def write(self, summaries):
+        """Returns the number of events inserted."""
+        return self.cal.sync_sessions(summaries, deadline=self.deadline, before=self.before)
+
+
+class BatchSink:
+    """
+    Write all nights with one paginated listing and batched inserts.
+
+    Far fewer round trips than CalendarSink for backfills, but all or
+    nothing with respect to deadlines. With update, nights already on the
+    calendar are re-rendered and events whose title, description or
+    private properties changed are patched in batches too.
+    """
+
+    def __init__(self, cal, batch_size=50, update=False):
+        """
+        Initialize batch sink.
+
+        Args:
+            cal: SleepCalendar with calendar_id set
+            batch_size: Inserts (and patches) per batch request
+            update: Patch existing events that differ from the rendered ones
+        """
+        self.cal = cal
+        self.batch_size = batch_size
+        self.update = update
+
+    def _existing(self, time_min, time_max):
+        """(start, end, summary, event ID, description, private properties) of timed events in the window, sorted by start."""
+        events = []
+        page_token = None
+        while True:
+            page = self.cal._execute(self.cal.service.events().list(
+                calendarId=self.cal.calendar_id, timeMin=time_min.isoformat(), timeMax=time_max.isoformat(),
+                singleEvents=True, pageToken=page_token, maxResults=2500,
+                fields='items(id,summary,description,start,end,extendedProperties),nextPageToken'))
+            for event in page.get('items', []):
+                start = event.get('start', {}).get('dateTime')
+                end = event.get('end', {}).get('dateTime')
+                if start and end:
+                    events.append((datetime.fromisoformat(start), datetime.fromisoformat(end), event.get('summary', ''),
+                                   event.get('id'), event.get('description', ''),
+                                   event.get('extendedProperties', {}).get('private', {})))
+            page_token = page.get('nextPageToken')
+            if not page_token:
+                break
+        events.sort(key=lambda event: event[0])
+        return events
+
+    def write(self, summaries):
+        """Returns the number of events inserted (and patched, with update)."""
+        # Newest first, like CalendarSink, so the same nights win overlaps
+        summaries = sorted(summaries, key=lambda s: s['start'], reverse=True)
+        if not summaries:
+            return 0
+        cal = self.cal
+        if cal.session_store is not None and cal.user_email:
+            cal.session_store.save(cal.user_email, summaries)
+
+        existing = self._existing(min(s['aggregated_start'] for s in summaries) - timedelta(minutes=5),
+                                  max(s['aggregated_end'] for s in summaries) + timedelta(minutes=5))
+        starts = [event[0] for event in existing]
+        longest = max((event[1] - event[0] for event in existing), default=timedelta(0))
+
+        def overlapping(time_min, time_max):
+            # Same window semantics as events.list(timeMin, timeMax)
+            first = bisect.bisect_left(starts, time_min - longest)
+            last = bisect.bisect_left(starts, time_max)
+            return [event for event in existing[first:last] if event[1] > time_min]
+
+        def add(request_id, body, start, end):
+            # Later checks see queued inserts, as if they were already written
+            nonlocal longest
+            position = bisect.bisect_right(starts, start)
+            starts.insert(position, start)
+            existing.insert(position, (start, end, body['summary'], None, body['description'],
+                                       body.get('extendedProperties', {}).get('private', {})))
+            longest = max(longest, end - start)
+            inserts.append((request_id, body))
+
+        def update(index, found, body, start, end):
+            # The windows also catch neighbouring events; only the one at the same times is this event
+            same = [event for event in found if event[0] == start and event[1] == end and event[3]]
+            if not self.update or not same:
+                return
+            _, _, title, event_id, description, private = same[0]
+            changed = {field: body[field] for field, value in (('summary', title), ('description', description))
+                       if body[field] != value}
+            rendered = body.get('extendedProperties', {}).get('private', {})
+            if any(private.get(key) != value for key, value in rendered.items()):
+                changed['extendedProperties'] = body['extendedProperties']
+            if changed:
+                patches.append((event_id, changed))
+                patched_night[event_id] = index
+
+        inserts = []
+        patches = []
+        patched_night = {}
+        for index, summary in enumerate(summaries):
+            event, stage_events = render_session_events(summary)
+            window = (summary['aggregated_start'] - timedelta(minutes=5), summary['aggregated_end'] + timedelta(minutes=5))
+            found = [e for e in overlapping(*window) if is_aggregated_event(e[2])]
+            if not found:
+                add(f'{index}-a', event, summary['aggregated_start'], summary['aggregated_end'])
+            else:
+                update(index, found, event, summary['aggregated_start'], summary['aggregated_end'])
+            for position, (interval, stage_emoji, stage_event) in enumerate(stage_events):
+                stage = interval['value']
+                window = (interval['start'] - timedelta(minutes=1), interval['end'] + timedelta(minutes=1))
+                found = [e for e in overlapping(*window) if e[2].startswith(stage_emoji) and stage in e[2]]
+                if not found:
+                    add(f'{index}-{position}', stage_event, interval['start'], interval['end'])
+                else:
+                    update(index, found, stage_event, interval['start'], interval['end'])
+
+        inserted, errors = cal.insert_events(inserts, batch_size=self.batch_size)
+        for request_id, error in errors:
+            print(f"Error inserting event: {error}", file=sys.stderr)
+        patched, patch_errors = cal.patch_events(patches, batch_size=self.batch_size) if patches else (0, [])
+        for event_id, error in patch_errors:
+            print(f"Error patching event {event_id}: {error}", file=sys.stderr)
+
+        failed = {int(request_id.split('-')[0]) for request_id, _ in errors}
+        failed.update(patched_night[event_id] for event_id, _ in patch_errors)
+        synced = [(s['start'], s['hash']) for index, s in enumerate(summaries)
+                  if index not in failed and s.get('hash')]
+        if cal.session_cache is not None and cal.user_email and synced:
+            cal.session_cache.mark_synced(cal.user_email, synced)
+        return inserted + patched
+
+
+class DryRunSink:
+    """Render events without calling the Calendar API."""
+
+    def __init__(self, out=None):
+        """
+        Initialize dry-run sink.
+
+        Args:
+            out: Text stream for one line per event (default: stdout)
+        """
+        self.out = out or sys.stdout
+
+    def write(self, summaries):
+        """Returns the number of events rendered, before de-duplication against a calendar."""
+        count = 0
+        for summary in summaries:
+            event, stage_events = render_session_events(summary)
+            for body in [event] + [stage_event for _, _, stage_event in stage_events]:
+                print(f"{body['start']['dateTime']}  {body['summary']}", file=self.out)
+                count += 1
+        return count
+
+
+class IcsSink:
+    """Store summaries for a user's ICS feed; no Calendar API calls."""
+
+    def __init__(self, email, store, feed_cache=None):
+        """
+        Initialize ICS sink.
+
+        Args:
+            email: User email the feed belongs to
+            store: SessionStore
+            feed_cache: FeedCache to invalidate for the user (optional)
+        """
+        self.email = email
+        self.store = store
+        self.feed_cache = feed_cache
+
+    def write(self, summaries):
+        """Returns 0; feeds have no events to write."""
+        self.store.save(self.email, list(summaries))
+        if self.feed_cache is not None:
+            self.feed_cache.invalidate(self.email)
+        return 0
+
+
+def run_pipeline(source, sink, days=30, now=None, known_hashes=None, archive=None, archived=None, before=None):
+    """
+    Stream samples from a source through the shared stages into a sink.
+
+    Args:
+        source: Iterable of raw sample dicts (e.g. file_source(path))
+        sink: Object with write(summaries) -> int
+        days: Number of days to look back for cutoff
+        now: Reference time (defaults to current UTC time)
+        known_hashes: Session hashes already synced, skipped before summarizing
+        archive: Called with all parsed intervals, e.g. SampleArchive.append_intervals
+            bound to a user (optional)
+        archived: Span the archive already holds, see iter_session_summaries (optional)
+        before: Only sessions starting before this datetime (optional)
+
+    Returns:
+        Whatever sink.write returns (events written)
+    """
+    return sink.write(iter_session_summaries(source, days=days, now=now, known_hashes=known_hashes,
+                                             archive=archive, archived=archived, before=before))
+
+
+def run_archived(archive, email, sink, days=None, now=None):
+    """
+    Reprocess a user's archived samples into a sink, skipping the parse stage.
+
+    Args:
+        archive: SampleArchive
+        email: User email
+        sink: Object with write(summaries) -> int
+        days: Look-back window (default: all archived history)
+        now: Reference time (defaults to current UTC time)
+    """
+    return sink.write(archive.summaries(email, days=days, now=now))
@@ -0,0 +1,223 @@
+"""
+Opt-in sampling profiler for individual /sync requests.
+
+A profiled request's thread is sampled from a background thread via
+sys._current_frames(); stacks are stored in collapsed form (one
+"frame;frame;frame count" line per stack, the input format of
+flamegraph.pl and speedscope) next to a timeline of the request's
+Calendar API calls. When no profile is active the only cost on the
+request path is a ContextVar lookup per Calendar call.
+"""
+import hmac
+import json
+import os
+import random
+import re
+import secrets
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+# Profile of the request running in this context, if any
+_active: ContextVar[Optional['Profile']] = ContextVar('active_profile', default=None)
+
+PROFILE_ID = re.compile(r'^[0-9a-f]{16}$')
+
+
+def default_root():
+    """Profile directory from PROFILE_DIR (default: a directory in the temp dir)."""
+    return os.getenv('PROFILE_DIR') or os.path.join(tempfile.gettempdir(), 'sleep-calendar-profiles')
+
+
+def _frame_name(code, lineno):
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}:{lineno}"
+
+
+class Profile:
+    """Stack samples and Calendar call timeline of one request."""
+
+    def __init__(self, thread_id, interval=0.005, label=None):
+        """
+        Initialize profile.
+
+        Args:
+            thread_id: threading.get_ident() of the thread to sample
+            interval: Seconds between samples
+            label: Free-form description stored with the profile
+        """
+        self.id = secrets.token_hex(8)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.label = label
+        self.stacks = Counter()
+        self.calls = []
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.duration = None
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name=f"profiler-{self.id}", daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            # Keep raw (code, line) pairs; names are formatted once, when saved
+            stack = []
+            while frame is not None:
+                stack.append((frame.f_code, frame.f_lineno))
+                frame = frame.f_back
+            self.stacks[tuple(stack)] += 1
+
+    def start(self):
+        self._sampler.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._sampler.join()
+        self.duration = time.perf_counter() - self._started
+
+    @contextmanager
+    def calendar_call(self, endpoint):
+        """Record one Calendar API call on the timeline."""
+        started = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            self.calls.append({
+                'endpoint': endpoint,
+                'start_ms': round((started - self._started) * 1000, 2),
+                'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+                'error': error,
+            })
+
+    def collapsed(self) -> str:
+        """Stacks in collapsed format, heaviest first."""
+        lines = []
+        for stack, count in self.stacks.most_common():
+            lines.append(';'.join(_frame_name(code, lineno) for code, lineno in reversed(stack)) + f" {count}\n")
+        return ''.join(lines)
+
+    def metadata(self):
+        return {
+            'id': self.id,
+            'label': self.label,
+            'started_at': self.started_at,
+            'duration_ms': round((self.duration or 0) * 1000, 2),
+            'interval_ms': self.interval * 1000,
+            'samples': sum(self.stacks.values()),
+            'calendar_calls': self.calls,
+        }
+
+
+class Profiler:
+    """Decides which requests to profile and stores their profiles."""
+
+    def __init__(self, root=None, admin_token=None, sample_rate=0.0, interval=0.005, max_profiles=100):
+        """
+        Initialize profiler.
+
+        Args:
+            root: Directory profiles are written to (default: default_root())
+            admin_token: Secret that requests send in X-Profile to be
+                profiled and that GET /debug/profiles requires; None disables both
+            sample_rate: Fraction of other requests to profile (0 disables)
+            interval: Seconds between stack samples
+            max_profiles: Profiles kept on disk; the oldest are deleted first
+        """
+        self.root = root or default_root()
+        self.admin_token = admin_token
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.max_profiles = max_profiles
+        self.profiled = 0
+
+    def is_admin(self, token) -> bool:
+        """Whether a presented token matches the admin token."""
+        return bool(self.admin_token and token) and hmac.compare_digest(token, self.admin_token)
+
+    def should_profile(self, token=None) -> bool:
+        """Profile this request: admin header present, or picked by the sample rate."""
+        if token is not None and self.is_admin(token):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    @contextmanager
+    def profile(self, label=None):
+        """
+        Profile the calling thread for the duration of the block.
+
+        Yields:
+            The Profile, saved to disk when the block exits
+        """
+        profile = Profile(threading.get_ident(), self.interval, label).start()
+        reset = _active.set(profile)
+        try:
+            yield profile
+        finally:
+            _active.reset(reset)
+            profile.stop()
+            self.save(profile)
+
+    def save(self, profile):
+        """Write <id>.collapsed and <id>.json, then prune old profiles."""
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, f"{profile.id}.collapsed"), 'w') as f:
+            f.write(profile.collapsed())
+        path = os.path.join(self.root, f"{profile.id}.json")
+        with open(path + '.tmp', 'w') as f:
+            json.dump(profile.metadata(), f)
+        os.replace(path + '.tmp', path)
+        self.profiled += 1
+        self._prune()
+
+    def _prune(self):
+        saved = sorted((entry for entry in os.scandir(self.root) if entry.name.endswith('.json')),
+                       key=lambda entry: entry.stat().st_mtime)
+        for entry in saved[:max(0, len(saved) - self.max_profiles)]:
+            for suffix in ('.json', '.collapsed'):
+                try:
+                    os.remove(os.path.join(self.root, entry.name[:-len('.json')] + suffix))
+                except FileNotFoundError:
+                    pass
+
+    def load(self, profile_id):
+        """
+        A stored profile as (metadata dict, collapsed stacks), or None.
+
+        Args:
+            profile_id: Id from the X-Profile-Id response header
+        """
+        if not PROFILE_ID.match(profile_id or ''):
+            return None
+        try:
+            with open(os.path.join(self.root, f"{profile_id}.json"), 'r') as f:
+                metadata = json.load(f)
+            with open(os.path.join(self.root, f"{profile_id}.collapsed"), 'r') as f:
+                return metadata, f.read()
+        except FileNotFoundError:
+            return None
+
+
+def active() -> Optional[Profile]:
+    """The profile of the current request, or None when not profiling."""
+    return _active.get()
+
+
+# Shared profiler, configured from the environment
+profiler = Profiler(
+    admin_token=os.getenv('ADMIN_TOKEN') or None,
+    sample_rate=float(os.getenv('PROFILE_SAMPLE_RATE', '0')),
+    interval=float(os.getenv('PROFILE_INTERVAL_MS', '5')) / 1000,
+    max_profiles=int(os.getenv('PROFILE_MAX_FILES', '100'))
+)
@@ -0,0 +1,39 @@
+"""Per-account pacing of Google Calendar API calls."""
+import threading
+import time
+from typing import Dict, Tuple
+
+
+class QuotaPacer:
+    """Thread-safe token bucket per service account."""
+
+    def __init__(self, requests_per_second: float = 5.0, burst: int = 10):
+        """
+        Initialize quota pacer.
+
+        Args:
+            requests_per_second: Sustained Calendar calls per second per account
+            burst: Calls allowed back-to-back before pacing kicks in
+        """
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def _reserve(self, key: str) -> float:
+        """Take one token for key and return how long the caller must wait."""
+        with self._lock:
+            now = time.monotonic()
+            tokens, updated = self._buckets.get(key, (float(self.burst), now))
+            tokens = min(float(self.burst), tokens + (now - updated) * self.requests_per_second)
+            tokens -= 1
+            self._buckets[key] = (tokens, now)
+        if tokens >= 0:
+            return 0.0
+        return -tokens / self.requests_per_second
+
+    def acquire(self, key: str = 'default'):
+        """Block until a call for this account fits its quota."""
+        wait = self._reserve(key)
+        if wait > 0:
+            time.sleep(wait)
@@ -1,9 +1,11 @@
 """Rate limiting middleware for API."""
 from fastapi import Request, HTTPException
 from fastapi.responses import JSONResponse
+import threading
 import time
 from collections import defaultdict
 from typing import Dict, Tuple
+from api.db import connect, shared_state
 
 
 class RateLimiter:
@@ -67,10 +69,100 @@ class RateLimiter:
         self.hour_requests[client_id].append(now)
         
         return True, ""
+    
+    def clear(self):
+        """Forget all recorded requests."""
+        self.minute_requests.clear()
+        self.hour_requests.clear()
+
+
+class SharedRateLimiter(RateLimiter):
+    """
+    Rate limiter whose request log lives in the local SQLite database, so
+    every worker process on the instance enforces the same limits.
+    """
+    
+    # Checks between sweeps of other clients' expired rows
+    PURGE_EVERY = 1000
+    
+    def __init__(self, requests_per_minute: int = 60, requests_per_hour: int = 1000, path=None):
+        """
+        Initialize shared rate limiter.
+        
+        Args:
+            requests_per_minute: Max requests per minute per IP
+            requests_per_hour: Max requests per hour per IP
+            path: SQLite database path (default: api.db.default_path())
+        """
+        super().__init__(requests_per_minute, requests_per_hour)
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+        self._checks = 0
+    
+    def _db(self):
+        """Open the database and create the table on first use."""
+        if self._conn is None:
+            self._conn = connect(self.path)
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS rate_limit_requests ('
+                ' client_id TEXT NOT NULL,'
+                ' ts REAL NOT NULL)')
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS rate_limit_requests_client'
+                ' ON rate_limit_requests (client_id, ts)')
+            self._conn.commit()
+        return self._conn
+    
+    def check_rate_limit(self, request: Request) -> Tuple[bool, str]:
+        """
+        Check if request is within rate limits (atomically across processes).
+        
+        Returns:
+            (allowed, error_message)
+        """
+        client_id = self._get_client_id(request)
+        now = time.time()
+        cutoff_hour = now - 3600
+        cutoff_minute = now - 60
+        
+        with self._lock:
+            db = self._db()
+            self._checks += 1
+            # Take the write lock up front: count and insert must not interleave
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                if self._checks % self.PURGE_EVERY == 0:
+                    db.execute('DELETE FROM rate_limit_requests WHERE ts <= ?', (cutoff_hour,))
+                else:
+                    db.execute('DELETE FROM rate_limit_requests WHERE client_id = ? AND ts <= ?',
+                               (client_id, cutoff_hour))
+                minute_count, hour_count = db.execute(
+                    'SELECT COALESCE(SUM(ts > ?), 0), COUNT(*) FROM rate_limit_requests WHERE client_id = ?',
+                    (cutoff_minute, client_id)).fetchone()
+                if minute_count >= self.requests_per_minute:
+                    error = f"Rate limit exceeded: {self.requests_per_minute} requests per minute"
+                elif hour_count >= self.requests_per_hour:
+                    error = f"Rate limit exceeded: {self.requests_per_hour} requests per hour"
+                else:
+                    error = ""
+                    db.execute('INSERT INTO rate_limit_requests VALUES (?, ?)', (client_id, now))
+                db.commit()
+            except BaseException:
+                db.rollback()
+                raise
+        return not error, error
+    
+    def clear(self):
+        """Forget all recorded requests."""
+        with self._lock:
+            db = self._db()
+            db.execute('DELETE FROM rate_limit_requests')
+            db.commit()
 
 
-# Global rate limiter instance
-rate_limiter = RateLimiter(
+# Global rate limiter instance (shared across worker processes when there are several)
+rate_limiter = (SharedRateLimiter if shared_state() else RateLimiter)(
     requests_per_minute=30,  # 30 requests per minute
     requests_per_hour=500     # 500 requests per hour
 )
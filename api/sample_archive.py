@@ -0,0 +1,431 @@
+"""
+Append-only, per-user archive of raw sleep samples in a columnar layout.
+
+Each user's directory holds one little-endian column file per field:
+
+    start.i64   epoch seconds (int64)
+    end.i64     epoch seconds (int64)
+    stage.u8    index into names.json "stages"
+    source.u16  index into names.json "sources"
+
+Rows are kept sorted by start, so lookups by time binary-search the start
+column with or without NumPy. An append that would break the order, or that
+takes the archive past its retention or size cap, rewrites the user's
+directory as a new generation swapped in with two renames.
+
+Columns are memory-mapped for reading (zero-copy NumPy arrays when NumPy is
+installed), so years of history can be re-grouped and re-summarized without
+waiting for clients to upload it again.
+"""
+import bisect
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from api.sleep_calendar import parse_intervals, pytz, summarize_intervals
+
+
+# (file name, NumPy dtype, struct/memoryview format)
+COLUMNS = (
+    ('start.i64', '<i8', 'q'),
+    ('end.i64', '<i8', 'q'),
+    ('stage.u8', '<u1', 'B'),
+    ('source.u16', '<u2', 'H'),
+)
+LIMITS = {'stages': 0xFF, 'sources': 0xFFFF}
+
+# Caps are enforced in batches: trimming starts once an archive is this
+# much past a cap, so a full archive is not rewritten on every append
+CAP_SLACK = 1.1
+
+
+def default_root():
+    """Archive directory from SAMPLE_ARCHIVE_DIR (default: a directory in the temp dir)."""
+    return os.getenv('SAMPLE_ARCHIVE_DIR') or os.path.join(tempfile.gettempdir(), 'sleep-calendar-samples')
+
+
+def _write_columns(directory, encoded):
+    """Append encoded (start, end, stage id, source id) rows to every column file."""
+    for position, (name, dtype, fmt) in enumerate(COLUMNS):
+        values = [row[position] for row in encoded]
+        with open(os.path.join(directory, name), 'ab') as f:
+            if np is not None:
+                f.write(np.asarray(values, dtype=dtype).tobytes())
+            else:
+                import array
+                column = array.array(fmt, values)
+                if sys.byteorder != 'little':
+                    column.byteswap()
+                f.write(column.tobytes())
+
+
+def _map_column(path, dtype, fmt, count):
+    """Read-only view of the first `count` values of a column file."""
+    if not count:
+        return np.empty(0, dtype=dtype) if np is not None else memoryview(b'').cast(fmt)
+    if np is not None:
+        return np.memmap(path, dtype=dtype, mode='r', shape=(count,))
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    data = memoryview(mapped)[:count * int(dtype[-1])]
+    if sys.byteorder == 'little':
+        return data.cast(fmt)
+    import array
+    values = array.array(fmt, data)
+    values.byteswap()
+    return values
+
+
+def _local_times(timestamps, tz):
+    """
+    datetimes in a pytz zone for epoch seconds, equal to
+    datetime.fromtimestamp(ts, tz) but with the zone looked up once per UTC
+    day; days containing an offset change fall back to the exact lookup.
+    """
+    zones = {}
+    epoch = datetime(1970, 1, 1)
+    times = []
+    for ts in timestamps:
+        day = ts // 86400
+        zone = zones.get(day)
+        if zone is None:
+            first = datetime.fromtimestamp(day * 86400, tz)
+            last = datetime.fromtimestamp(day * 86400 + 86399, tz)
+            zone = zones[day] = (first.utcoffset(), first.tzinfo) if first.tzinfo is last.tzinfo else False
+        if zone:
+            times.append((epoch + timedelta(seconds=ts) + zone[0]).replace(tzinfo=zone[1]))
+        else:
+            times.append(datetime.fromtimestamp(ts, tz))
+    return times
+
+
+class ArchivedSamples:
+    """Columns of one user's archive (NumPy arrays or memoryviews)."""
+
+    def __init__(self, start, end, stage, source, stages, sources, in_order=False):
+        self.start = start
+        self.end = end
+        self.stage = stage
+        self.source = source
+        self.stages = stages
+        self.sources = sources
+        self.in_order = in_order
+
+    def __len__(self):
+        return len(self.start)
+
+    def order(self):
+        """Row indices sorted by start."""
+        if np is not None:
+            return np.arange(len(self.start)) if self.in_order else np.argsort(self.start, kind='stable')
+        if self.in_order:
+            return range(len(self.start))
+        return sorted(range(len(self.start)), key=self.start.__getitem__)
+
+    def first_at_or_after(self, timestamp):
+        """Index of the first row starting at or after timestamp (rows must be in order)."""
+        if np is not None:
+            return int(np.searchsorted(self.start, timestamp, side='left'))
+        return bisect.bisect_left(self.start, timestamp)
+
+    def first_after(self, timestamp):
+        """Index of the first row starting after timestamp (rows must be in order)."""
+        if np is not None:
+            return int(np.searchsorted(self.start, timestamp, side='right'))
+        return bisect.bisect_right(self.start, timestamp)
+
+    def rows(self, indices):
+        """(start, end, stage id, source id) of the given rows."""
+        columns = (self.start, self.end, self.stage, self.source)
+        return [tuple(int(column[i]) for column in columns) for i in indices]
+
+
+class SampleArchive:
+    """Per-user columnar archive of parsed samples, deduplicated on append."""
+
+    def __init__(self, root=None, max_days=None, max_rows=None):
+        """
+        Initialize sample archive.
+
+        Args:
+            root: Directory holding one subdirectory per user (default: default_root())
+            max_days: Drop rows starting more than this many days ago (default: keep all)
+            max_rows: Keep at most this many rows per user, newest first (default: no cap)
+        """
+        self.root = root or default_root()
+        self.max_days = max_days
+        self.max_rows = max_rows
+
+    @classmethod
+    def from_env(cls):
+        """
+        Archive configured by SAMPLE_ARCHIVE_DIR, or None when it is unset
+        (or "off"): archiving is opt-in.
+
+        SAMPLE_ARCHIVE_MAX_DAYS and SAMPLE_ARCHIVE_MAX_ROWS cap each user's
+        archive (default 730 days and 50000 rows, about 1 MB; 0 for no cap).
+        """
+        root = os.getenv('SAMPLE_ARCHIVE_DIR', '')
+        if not root or root.lower() == 'off':
+            return None
+        max_days = int(os.getenv('SAMPLE_ARCHIVE_MAX_DAYS', '730'))
+        max_rows = int(os.getenv('SAMPLE_ARCHIVE_MAX_ROWS', '50000'))
+        return cls(root, max_days=max_days or None, max_rows=max_rows or None)
+
+    def _user_dir(self, email):
+        digest = hashlib.sha256(email.lower().encode('utf-8')).hexdigest()[:32]
+        return os.path.join(self.root, digest)
+
+    @contextmanager
+    def _locked(self, directory):
+        """
+        Exclusive lock on a user's archive, across threads and processes.
+
+        The lock file sits next to the directory, which a rewrite replaces;
+        a rewrite interrupted between its two renames is completed here.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        with open(directory + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                if not os.path.isdir(directory) and os.path.isdir(directory + '.new'):
+                    os.rename(directory + '.new', directory)
+                shutil.rmtree(directory + '.old', ignore_errors=True)
+                os.makedirs(directory, exist_ok=True)
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _names(self, directory, email=None):
+        """Interned names, plus whether rows are sorted by start ('in_order', absent in old archives)."""
+        path = os.path.join(directory, 'names.json')
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                return json.load(f)
+        return {'email': email, 'stages': [], 'sources': [], 'in_order': True}
+
+    @staticmethod
+    def _save_names(directory, names):
+        path = os.path.join(directory, 'names.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(names, f)
+        os.replace(path + '.tmp', path)
+
+    def _rows(self, directory):
+        """Complete rows: the shortest column, so a torn append is ignored."""
+        counts = []
+        for name, dtype, _ in COLUMNS:
+            path = os.path.join(directory, name)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            counts.append(size // int(dtype[-1]))
+        return min(counts)
+
+    def append(self, email, samples):
+        """
+        Archive raw sample dicts (as sent to /sync or found in an export).
+
+        Returns:
+            Number of new rows written
+        """
+        return self.append_intervals(email, parse_intervals(samples, pytz.timezone('America/Los_Angeles')))
+
+    def append_intervals(self, email, intervals):
+        """
+        Archive parsed intervals (see api.sleep_calendar.parse_intervals),
+        skipping any already archived.
+
+        Returns:
+            Number of new rows written
+        """
+        rows = {(int(i['start'].timestamp()), int(i['end'].timestamp()), i['value'], i['source'])
+                for i in intervals}
+        if not rows:
+            return 0
+        directory = self._user_dir(email)
+        with self._locked(directory):
+            names = self._names(directory, email.lower())
+            count = self._rows(directory)
+            # Drop a torn tail so columns stay aligned
+            for name, dtype, _ in COLUMNS:
+                path = os.path.join(directory, name)
+                if os.path.exists(path) and os.path.getsize(path) != count * int(dtype[-1]):
+                    os.truncate(path, count * int(dtype[-1]))
+
+            archived = self.read(email) if count else None
+            if count:
+                rows -= self._existing(archived, min(r[0] for r in rows), max(r[0] for r in rows))
+            if not rows:
+                return 0
+
+            interned = {key: {name: index for index, name in enumerate(names[key])} for key in LIMITS}
+
+            def intern(key, name):
+                index = interned[key].get(name)
+                if index is None:
+                    if len(names[key]) > LIMITS[key]:
+                        raise ValueError(f"Too many distinct {key} for {email}")
+                    index = interned[key][name] = len(names[key])
+                    names[key].append(name)
+                return index
+
+            rows = sorted(rows)
+            encoded = [(start, end, intern('stages', stage), intern('sources', source))
+                       for start, end, stage, source in rows]
+            in_order = not count or (names.get('in_order', False) and encoded[0][0] >= int(archived.start[-1]))
+            oldest = encoded[0][0]
+            if count:
+                oldest = min(oldest, int(archived.start[0]) if archived.in_order else int(min(archived.start)))
+            if in_order and not self._over_cap(count + len(encoded), oldest):
+                # Names first: a crash after this leaves unused names, never unknown ids
+                self._save_names(directory, names)
+                _write_columns(directory, encoded)
+            else:
+                existing = archived.rows(archived.order()) if count else []
+                self._rewrite(directory, names, self._trim(sorted(existing + encoded, key=lambda row: row[0])))
+        return len(rows)
+
+    def _over_cap(self, count, oldest):
+        """Whether count rows, the oldest starting at oldest, are past a cap by more than CAP_SLACK."""
+        if self.max_rows and count > self.max_rows * CAP_SLACK:
+            return True
+        return bool(self.max_days) and oldest < time.time() - self.max_days * CAP_SLACK * 86400
+
+    def _trim(self, rows):
+        """Sorted encoded rows within the retention and size caps."""
+        if self.max_days:
+            rows = rows[bisect.bisect_left([row[0] for row in rows], time.time() - self.max_days * 86400):]
+        if self.max_rows:
+            rows = rows[-self.max_rows:]
+        return rows
+
+    def _rewrite(self, directory, names, rows):
+        """Replace a user's archive with sorted rows, as a new directory swapped in by renames."""
+        new = directory + '.new'
+        shutil.rmtree(new, ignore_errors=True)
+        os.makedirs(new)
+        self._save_names(new, dict(names, in_order=True))
+        _write_columns(new, rows)
+        os.rename(directory, directory + '.old')
+        os.rename(new, directory)
+        shutil.rmtree(directory + '.old', ignore_errors=True)
+
+    @staticmethod
+    def _existing(archived, first_start, last_start):
+        """Archived rows starting in [first_start, last_start] as (start, end, stage, source)."""
+        if archived.in_order:
+            indices = range(archived.first_at_or_after(first_start), archived.first_after(last_start))
+        elif np is not None:
+            indices = np.nonzero((archived.start >= first_start) & (archived.start <= last_start))[0].tolist()
+        else:
+            indices = [i for i, start in enumerate(archived.start) if first_start <= start <= last_start]
+        return {(int(archived.start[i]), int(archived.end[i]), archived.stages[archived.stage[i]],
+                 archived.sources[archived.source[i]]) for i in indices}
+
+    def read(self, email):
+        """Memory-mapped columns of a user's archive (empty if none)."""
+        directory = self._user_dir(email)
+        names = self._names(directory)
+        count = self._rows(directory) if os.path.isdir(directory) else 0
+        columns = [_map_column(os.path.join(directory, name), dtype, fmt, count)
+                   for name, dtype, fmt in COLUMNS]
+        return ArchivedSamples(*columns, names['stages'], names['sources'], in_order=names.get('in_order', False))
+
+    def span(self, email):
+        """(first, last) archived start as UTC datetimes, or None if nothing is archived."""
+        archived = self.read(email)
+        if not len(archived):
+            return None
+        start = archived.start
+        if archived.in_order:
+            first, last = start[0], start[-1]
+        else:
+            first, last = (start.min(), start.max()) if np is not None else (min(start), max(start))
+        return datetime.fromtimestamp(int(first), timezone.utc), datetime.fromtimestamp(int(last), timezone.utc)
+
+    def intervals(self, email, since=None):
+        """
+        Yield a user's archived intervals sorted by start, in the shape
+        parse_intervals produces.
+
+        Args:
+            since: Only intervals starting at or after this datetime (optional)
+        """
+        la_tz = pytz.timezone('America/Los_Angeles')
+        archived = self.read(email)
+        columns = (archived.start, archived.end, archived.stage, archived.source)
+        if archived.in_order:
+            first = archived.first_at_or_after(since.timestamp()) if since is not None else 0
+            starts, ends, stages, sources = (column[first:].tolist() for column in columns)
+        else:
+            order = archived.order()
+            if np is not None:
+                starts, ends, stages, sources = (column[order].tolist() for column in columns)
+            else:
+                starts, ends, stages, sources = ([column[i] for i in order] for column in columns)
+            if since is not None:
+                first = since.timestamp()
+                keep = [i for i, start in enumerate(starts) if start >= first]
+                starts, ends, stages, sources = ([column[i] for i in keep]
+                                                 for column in (starts, ends, stages, sources))
+        for start, end, stage, source in zip(_local_times(starts, la_tz), _local_times(ends, la_tz), stages, sources):
+            yield {
+                'start': start,
+                'end': end,
+                'value': archived.stages[stage],
+                'source': archived.sources[source],
+            }
+
+    def summaries(self, email, days=None, now=None):
+        """
+        Re-group and re-summarize a user's archived history.
+
+        Args:
+            days: Look-back window (default: everything archived)
+            now: Reference time (defaults to current UTC time)
+        """
+        now = now or datetime.now(timezone.utc)
+        if days is None:
+            days = (now - datetime(1970, 1, 1, tzinfo=timezone.utc)).days + 1
+        return list(summarize_intervals(self.intervals(email), days=days, now=now))
+
+    def emails(self):
+        """Every archived user."""
+        if not os.path.isdir(self.root):
+            return []
+        emails = []
+        for entry in sorted(os.listdir(self.root)):
+            if '.' in entry:
+                # Lock files and rewrites in progress
+                continue
+            names = self._names(os.path.join(self.root, entry))
+            if names.get('email'):
+                emails.append(names['email'])
+        return emails
+
+    def forget(self, email):
+        """Delete a user's archive."""
+        directory = self._user_dir(email)
+        if not os.path.isdir(directory):
+            return
+        with self._locked(directory):
+            for name in [column[0] for column in COLUMNS] + ['names.json']:
+                path = os.path.join(directory, name)
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+# Shared archive, only when SAMPLE_ARCHIVE_DIR is set
+sample_archive = SampleArchive.from_env()
@@ -0,0 +1,126 @@
+"""Sleep score curve: scalar and vectorized (NumPy) implementations."""
+import bisect
+import os
+
+try:
+    import numpy as np
+except ImportError:  # optional; score_many falls back to the scalar path
+    np = None
+
+
+# Piecewise-linear segments ((x0, score0), (x1, score1)) over hours asleep.
+# Each applies on (x0, x1]; the first also covers shorter nights and the
+# last extends past x1. Scores are clamped to [0, 100] and truncated.
+# The jump at 10h (90 -> 100) and the last segment's 1-hour span (-20/h,
+# reaching 0 at 15h) reproduce the original branch chain bit for bit for
+# every non-negative duration, so re-scoring history changes nothing by default.
+DEFAULT_CURVE = (
+    ((0, 0), (6, 50)),
+    ((6, 50), (8, 100)),
+    ((8, 100), (10, 90)),
+    ((10, 100), (11, 80)),
+)
+
+# Emoji codes: index into EMOJIS. A score >= threshold earns that code.
+EMOJIS = ('🔴', '😴', '🟢')
+EMOJI_THRESHOLDS = (50, 70)
+SCORE_DESCRIPTIONS = ('Poor (<6 hours or >10 hours)', 'Fair (6-7 hours)', 'Good (ideal 7-8 hours)')
+
+
+class ScoringCurve:
+    """
+    Piecewise-linear mapping from hours asleep to a 0-100 score.
+
+    ``score`` is the scalar path used while rendering single events;
+    ``score_many`` scores whole arrays of durations at once for re-scoring
+    years of history.
+    """
+
+    def __init__(self, segments=DEFAULT_CURVE, thresholds=EMOJI_THRESHOLDS):
+        """
+        Initialize scoring curve.
+
+        Args:
+            segments: Sequence of ((x0, score0), (x1, score1)) with increasing x1
+            thresholds: Ascending scores at which emoji codes 1, 2, ... start
+        """
+        if not segments:
+            raise ValueError("ScoringCurve needs at least one segment")
+        self.segments = tuple((tuple(map(float, a)), tuple(map(float, b))) for a, b in segments)
+        self.upper = [b[0] for _, b in self.segments[:-1]]
+        if self.upper != sorted(self.upper) or any(b[0] <= a[0] for a, b in self.segments):
+            raise ValueError("ScoringCurve segments must be increasing")
+        self.thresholds = tuple(thresholds)
+
+    @classmethod
+    def parse(cls, text):
+        """
+        Build a curve from "x0:s0-x1:s1,..." (e.g. "0:0-6:50,6:50-8:100").
+        """
+        segments = []
+        for item in text.split(','):
+            a, b = item.strip().split('-')
+            segments.append((tuple(map(float, a.split(':'))), tuple(map(float, b.split(':')))))
+        return cls(segments)
+
+    def raw(self, duration_hours):
+        """Unclamped, untruncated score for one duration."""
+        (x0, s0), (x1, s1) = self.segments[bisect.bisect_left(self.upper, duration_hours)]
+        return s0 + (duration_hours - x0) / (x1 - x0) * (s1 - s0)
+
+    def emoji_code(self, score):
+        """Emoji code for one score."""
+        return bisect.bisect_right(self.thresholds, score)
+
+    def score(self, duration_hours):
+        """Score (0-100) and emoji for one duration in hours."""
+        score = int(min(100.0, max(0.0, self.raw(duration_hours))))
+        return score, EMOJIS[self.emoji_code(score)]
+
+    def score_many(self, duration_hours):
+        """
+        Score many durations at once.
+
+        Args:
+            duration_hours: Sequence or NumPy array of hours asleep
+
+        Returns:
+            (scores, emoji_codes): int arrays (lists without NumPy); map codes
+            to characters with EMOJIS
+        """
+        if np is None:
+            scores = [self.score(h)[0] for h in duration_hours]
+            return scores, [self.emoji_code(s) for s in scores]
+
+        hours = np.asarray(duration_hours, dtype=np.float64)
+        index = np.searchsorted(np.asarray(self.upper), hours, side='left')
+        x0, s0, x1, s1 = (np.array(column)[index] for column in (
+            [a[0] for a, _ in self.segments], [a[1] for a, _ in self.segments],
+            [b[0] for _, b in self.segments], [b[1] for _, b in self.segments]))
+        raw = s0 + (hours - x0) / (x1 - x0) * (s1 - s0)
+        scores = np.clip(raw, 0.0, 100.0).astype(np.int64)
+        codes = np.searchsorted(np.asarray(self.thresholds), scores, side='right').astype(np.uint8)
+        return scores, codes
+
+
+def curve_from_env():
+    """
+    Curve from SCORING_CURVE: segments as "x0:s0-x1:s1,..." or the path of a
+    file holding them (default: DEFAULT_CURVE).
+    """
+    setting = os.getenv('SCORING_CURVE', '').strip()
+    if not setting:
+        return ScoringCurve()
+    if os.path.isfile(setting):
+        with open(setting, 'r') as f:
+            setting = f.read().strip()
+    return ScoringCurve.parse(setting)
+
+
+# Curve used by sync, feeds, stats and rescore.py; one setting for all of them
+default_curve = curve_from_env()
+
+
+def calculate_score(duration_hours):
+    """Calculate sleep score (0-100) and emoji."""
+    return default_curve.score(duration_hours)
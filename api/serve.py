@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Run the API under uvicorn with one worker process per available CPU.
+
+    python -m api.serve                    # WEB_CONCURRENCY workers (default: CPU limit)
+    WEB_CONCURRENCY=1 python -m api.serve  # single process, in-memory state
+
+With more than one worker, state that must be instance-wide (rate limits,
+the calendar ID map, single-flight locks) lives in the local SQLite
+database and lock files; see api.db.shared_state.
+"""
+import os
+
+
+def cpu_limit():
+    """CPUs this process may use: the cgroup quota if set, else the affinity mask."""
+    try:
+        with open('/sys/fs/cgroup/cpu.max', 'r') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            return max(1, int(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def worker_count():
+    """Worker processes from WEB_CONCURRENCY ('auto' or unset = cpu_limit())."""
+    setting = os.getenv('WEB_CONCURRENCY', '').strip().lower()
+    if setting.isdigit() and int(setting) > 0:
+        return int(setting)
+    return cpu_limit()
+
+
+def main():
+    """Main entry point."""
+    import uvicorn
+
+    workers = worker_count()
+    # Inherited by the workers, which pick shared state from it
+    os.environ['WEB_CONCURRENCY'] = str(workers)
+    uvicorn.run('api.server:app', host=os.getenv('HOST', '0.0.0.0'), port=int(os.getenv('PORT', '8080')),
+                workers=workers)
+
+
+if __name__ == '__main__':
+    main()
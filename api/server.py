@@ -1,26 +1,134 @@
 #!/usr/bin/env python3
 """FastAPI server for sleep calendar sync."""
 
+import math
 import os
 import sys
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse
+import threading
+from contextlib import asynccontextmanager
+from datetime import datetime
+from functools import partial
+from email.utils import formatdate, parsedate_to_datetime
+from anyio import to_thread
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from googleapiclient.errors import HttpError
+from pydantic import ValidationError
 from api.models import SyncRequest, SyncResponse
-from api.sleep_calendar import SleepCalendar
+from api import codec
+from api.sleep_calendar import SleepCalendar, build_session_summaries, pytz, warm_up
 from api.rate_limit import rate_limiter
+from api.credential_pool import CredentialPool
+from api import offload
+from api.sync_cache import payload_cache
+from api.session_cache import session_cache
+from api.admission import admission
+from api.calendar_directory import calendar_directory
+from api.calendar_pool import calendar_pool
+from api.circuit_breaker import CalendarUnavailable, calendar_breakers, calendar_bulkhead
+from api.singleflight import sync_flights
+from api.session_store import feed_token, feeds_durable, session_store
+from api.ics import feed_cache, feed_cutoff, feed_etag, render_feed
+from api.pipeline import IcsSink
+from api.profiler import profiler
+from api.inventory import Fleet, collect, take_inventory, to_csv
+from api.sample_archive import sample_archive
+from api.deadline import decode_continuation, encode_continuation, parse_deadline
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start up and tear down shared resources."""
+    # Pay deferred imports, discovery parsing and the token fetch before the
+    # first request instead of during it
+    warm_up()
+    if calendar_pool.size > 0 and (credential_pool is not None or os.getenv("GOOGLE_CALENDAR_CREDENTIALS")
+                                   or os.path.exists("service-account.json")):
+        threading.Thread(target=prefill_calendar_pool, daemon=True).start()
+    yield
+    offload.shutdown()
+
 
 app = FastAPI(
     title="Sleep Calendar API",
     description="Sync Apple Health sleep data to Google Calendar",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=codec.FastJSONResponse
 )
 
+# Optional pool of service accounts; None means the single default account
+credential_pool = CredentialPool.from_env()
+
+
+def prefill_calendar_pool():
+    """Provision the first-sync calendar pool for every service account."""
+    try:
+        if credential_pool is None:
+            calendar_pool.refill(SleepCalendar())
+            return
+        for shard, account in enumerate(credential_pool.account_ids):
+            cal = SleepCalendar(credentials=credential_pool.credentials_at(shard))
+            cal.account = account
+            calendar_pool.refill(cal)
+    except Exception as e:
+        print(f"Warning: could not prefill calendar pool: {e}", file=sys.stderr)
+
+
+@app.middleware("http")
+async def admission_middleware(request: Request, call_next):
+    """Shed /sync load with 503 + Retry-After when the instance is saturated."""
+    if request.url.path != "/sync":
+        return await call_next(request)
+    
+    try:
+        nbytes = int(request.headers.get("content-length") or 0)
+    except ValueError:
+        nbytes = 0
+    ticket = admission.admit(nbytes)
+    if ticket is None:
+        return overloaded_response()
+    
+    request.state.admission_ticket = ticket
+    try:
+        return await call_next(request)
+    finally:
+        admission.release(ticket)
+
+
+def overloaded_response():
+    """503 telling the client when to retry."""
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": str(admission.retry_after)},
+        content={
+            "success": False,
+            "error": "Server is busy, retry later",
+            "error_code": "OVERLOADED"
+        }
+    )
+
+
+def calendar_unavailable_response(error: CalendarUnavailable):
+    """503 while the Calendar API circuit is open or the bulkhead is full."""
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": str(max(1, math.ceil(error.retry_after)))},
+        content={
+            "success": False,
+            "error": f"Google Calendar is unavailable, retry later: {error}",
+            "error_code": "CALENDAR_UNAVAILABLE"
+        }
+    )
+
 
 @app.middleware("http")
 async def rate_limit_middleware(request: Request, call_next):
     """Rate limiting middleware."""
-    # Skip rate limiting for health checks
-    if request.url.path in ["/", "/health"]:
+    # Skip rate limiting for health checks, and for feeds: calendar apps
+    # poll them from a few shared IPs and 304s are cheap
+    if request.url.path in ["/", "/health", "/metrics"] or request.url.path.startswith("/ics/"):
         return await call_next(request)
     
     # Check rate limit
@@ -50,41 +158,254 @@ def health():
     return {"status": "healthy"}
 
 
-@app.post("/sync", response_model=SyncResponse)
-def sync_sleep_data(request: SyncRequest):
+@app.get("/metrics")
+async def metrics():
+    """Operational counters."""
+    # The limiter is only reachable from the event loop, hence async def
+    limiter = to_thread.current_default_thread_limiter()
+    return {
+        "sync_cache": payload_cache.stats(),
+        "admission": admission.stats(),
+        "single_flight": sync_flights.stats(),
+        "ics_cache": feed_cache.stats(),
+        "calendar": {"breakers": calendar_breakers.stats(), "bulkhead": calendar_bulkhead.stats()},
+        "calendar_pool": calendar_pool.stats(),
+        "profiles_saved": profiler.profiled,
+        "threadpool": {"busy": limiter.borrowed_tokens, "size": limiter.total_tokens},
+    }
+
+
+def count_samples(samples) -> int:
+    """Cheap sample count for a list or newline-delimited JSON payload."""
+    if isinstance(samples, str):
+        return samples.count('\n') + 1 if samples.strip() else 0
+    return len(samples) if samples else 0
+
+
+def parse_samples(samples) -> list:
+    """Normalize a list or newline-delimited JSON payload to a list of samples."""
+    if isinstance(samples, str):
+        # Parse newline-delimited JSON (from Shortcuts conversion)
+        return codec.decode_samples(samples)
+    if not isinstance(samples, list):
+        # Convert to list if it's not already
+        return list(samples) if samples else []
+    return samples
+
+
+def merge_samples(payloads) -> list:
+    """Union the samples of several payloads, dropping exact duplicates."""
+    merged = {}
+    for payload in payloads:
+        for sample in parse_samples(payload):
+            key = (sample.get('startDate'), sample.get('endDate'), sample.get('value'), sample.get('sourceName'))
+            merged.setdefault(key, sample)
+    return list(merged.values())
+
+
+def archive_for(email: str):
+    """Callback appending parsed samples to the user's archive, or None if disabled."""
+    if sample_archive is None:
+        return None
+    return partial(sample_archive.append_intervals, email)
+
+
+def run_sync(email: str, payloads, mode: str = "calendar", fingerprint=None,
+             deadline=None, before=None) -> SyncResponse:
+    """
+    Sync one or more payloads for a user (one single-flight run).
+    
+    Args:
+        email: User email
+        payloads: Sample payloads folded into this run
+        mode: "calendar" or "ics"
+        fingerprint: Payload fingerprint, bound into continuation tokens
+        deadline: time.monotonic() value to stop by (optional)
+        before: Resume bound decoded from a continuation token (optional)
+    """
+    # Overlapping requests folded into one run are merged; duplicates would
+    # otherwise double-count sleep time
+    if len(payloads) == 1:
+        samples = payloads[0]
+    else:
+        # A merged run is a different payload; tokens no longer apply
+        samples = merge_samples(payloads)
+        fingerprint = before = None
+    
+    if mode == "ics":
+        # Feed-only users: store the summaries and skip the Calendar API entirely
+        if offload.should_offload(samples):
+            summaries = offload.summarize(samples, archive_email=email)
+        else:
+            summaries = build_session_summaries(parse_samples(samples), archive=archive_for(email),
+                                                archived=sample_archive.span(email) if sample_archive else None)
+        IcsSink(email, session_store, feed_cache).write(summaries)
+        return SyncResponse(success=True, events_synced=0)
+    
+    # Initialize calendar with user email
+    cal = SleepCalendar(user_email=email, credential_pool=credential_pool,
+                        session_cache=session_cache, session_store=session_store,
+                        sample_archive=sample_archive, calendar_pool=calendar_pool,
+                        calendar_directory=calendar_directory)
+    
+    try:
+        if offload.should_offload(samples):
+            # Large payload: parse and group in a worker process so this
+            # thread only waits on the compact summaries
+            summaries = offload.summarize(
+                samples, known_hashes=session_cache.known_hashes(email), archive_email=email)
+            events_synced = cal.sync_summaries(summaries, user_email=email, deadline=deadline, before=before)
+        else:
+            # Sync data
+            data = {"samples": parse_samples(samples)}
+            events_synced = cal.sync_from_data(data, user_email=email, deadline=deadline, before=before)
+    except HttpError as e:
+        # A remembered calendar deleted outside the API: look it up again next time
+        if e.resp.status == 404 and cal.calendar_id:
+            calendar_directory.forget(cal.calendar_id)
+        raise
+    feed_cache.invalidate(email)
+    
+    # Build calendar URL
+    calendar_url = f"https://calendar.google.com/calendar/embed?src={cal.calendar_id}"
+    
+    # Stopped at the deadline: tell the client how to pick up the rest
+    remaining = list(cal.remaining_sessions)
+    continuation_token = None
+    if remaining and fingerprint:
+        continuation_token = encode_continuation(email, fingerprint, cal.resume_before)
+    
+    return SyncResponse(
+        success=True,
+        events_synced=events_synced,
+        calendar_id=cal.calendar_id,
+        calendar_url=calendar_url,
+        remaining_nights=len(remaining),
+        continuation_token=continuation_token
+    )
+
+
+def ics_url(http_request: Request, email: str) -> str:
+    """Public URL of a user's ICS feed (PUBLIC_BASE_URL overrides the request host)."""
+    base_url = os.getenv("PUBLIC_BASE_URL") or str(http_request.base_url)
+    return f"{base_url.rstrip('/')}/ics/{feed_token(email)}.ics"
+
+
+def stats_url(http_request: Request, email: str) -> str:
+    """Public URL of a user's sleep stats, keyed by the same token as the feed."""
+    base_url = os.getenv("PUBLIC_BASE_URL") or str(http_request.base_url)
+    return f"{base_url.rstrip('/')}/stats/{feed_token(email)}"
+
+
+# Bodies above this are decoded in a worker thread, off the event loop
+DECODE_IN_THREAD_BYTES = 1 << 20
+
+
+async def sync_request(http_request: Request) -> SyncRequest:
+    """
+    Decode a /sync body with the fast codec.
+    
+    Samples are decoded straight into slotted codec.Sample objects; only the
+    scalar fields go through pydantic validation.
+    """
+    body = await http_request.body()
+    try:
+        if len(body) > DECODE_IN_THREAD_BYTES:
+            data = await to_thread.run_sync(codec.decode_sync_body, body)
+        else:
+            data = codec.decode_sync_body(body)
+    except ValueError as e:
+        raise RequestValidationError([{"type": "json_invalid", "loc": ("body",), "msg": str(e), "input": None}])
+    
+    samples = data.pop("samples")
+    if samples is None:
+        raise RequestValidationError([{"type": "missing", "loc": ("body", "samples"),
+                                       "msg": "Field required", "input": None}])
+    try:
+        request = SyncRequest.model_validate({**data, "samples": []})
+    except ValidationError as e:
+        raise RequestValidationError([{**error, "loc": ("body", *error["loc"])} for error in e.errors()])
+    return request.model_copy(update={"samples": samples})
+
+
+@app.post("/sync", response_model=SyncResponse, openapi_extra={
+    "requestBody": {"required": True, "content": {"application/json": {"schema": SyncRequest.model_json_schema()}}}
+})
+def sync_sleep_data(http_request: Request, http_response: Response, deadline: str = Query(None),
+                    request: SyncRequest = Depends(sync_request)):
     """
     Sync sleep data to Google Calendar.
     
     Creates or updates a per-user calendar named "Sleep Data - {email}"
     and syncs sleep events from the provided samples.
+    
+    A time budget (X-Request-Deadline header or ?deadline=, in seconds or as
+    a Unix timestamp) makes the sync stop early, newest nights first, and
+    return remaining_nights with a continuation_token to send next time.
+    
+    Requests sending the admin token in X-Profile (and a PROFILE_SAMPLE_RATE
+    fraction of the rest) run under the sampling profiler; the response's
+    X-Profile-Id header names the profile under /debug/profiles/.
     """
+    if not profiler.should_profile(http_request.headers.get("x-profile")):
+        return sync_payload(request, http_request, deadline)
+    
+    with profiler.profile(label=f"/sync {request.email}") as profile:
+        http_response.headers["X-Profile-Id"] = profile.id
+        result = sync_payload(request, http_request, deadline)
+    if isinstance(result, Response):
+        result.headers["X-Profile-Id"] = profile.id
+    return result
+
+
+def sync_payload(request: SyncRequest, http_request: Request, deadline=None):
+    """Body of /sync: cache lookup, admission, single-flight run."""
     try:
-        # Initialize calendar with user email
-        cal = SleepCalendar(user_email=request.email)
-        
-        # Handle samples - can be list or newline-delimited JSON string
-        samples = request.samples
-        if isinstance(samples, str):
-            # Parse newline-delimited JSON (from Shortcuts conversion)
-            samples = [json.loads(line) for line in samples.strip().split('\n') if line.strip()]
-        elif not isinstance(samples, list):
-            # Convert to list if it's not already
-            samples = list(samples) if samples else []
-        
-        # Sync data
-        data = {"samples": samples}
-        events_synced = cal.sync_from_data(data, user_email=request.email)
+        stop_by = parse_deadline(http_request.headers.get("x-request-deadline") or deadline)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid deadline")
+    
+    # Feed-only syncs write nothing else; an instance-local store would lose them
+    if request.mode == "ics" and not feeds_durable():
+        raise HTTPException(
+            status_code=400,
+            detail="mode 'ics' is disabled on this server (no persistent feed storage); sync without it"
+        )
+    
+    try:
+        # Identical payloads (automation re-runs, iOS retries) reuse the last result
+        try:
+            fingerprint = payload_cache.fingerprint(request.samples)
+        except (TypeError, ValueError):
+            fingerprint = None
+        if fingerprint and request.mode != "calendar":
+            fingerprint = f"{fingerprint}:{request.mode}"
+        if fingerprint:
+            cached = payload_cache.get(request.email, fingerprint)
+            if cached is not None:
+                return cached
         
-        # Build calendar URL
-        calendar_url = f"https://calendar.google.com/calendar/embed?src={cal.calendar_id}"
+        # Count queued samples against the admission watermark before any work
+        ticket = getattr(http_request.state, "admission_ticket", None)
+        if ticket is not None and not admission.add_samples(ticket, count_samples(request.samples)):
+            return overloaded_response()
         
-        return SyncResponse(
-            success=True,
-            events_synced=events_synced,
-            calendar_id=cal.calendar_id,
-            calendar_url=calendar_url
-        )
+        # Concurrent syncs for the same user (automation + manual run) share
+        # one run: same payload joins it, different payloads merge into the next
+        before = decode_continuation(request.continuation_token, request.email, fingerprint)
+        response = sync_flights.do(
+            f"{request.email}|{request.mode}", fingerprint, request.samples,
+            lambda payloads: run_sync(request.email, payloads, request.mode, fingerprint, stop_by, before))
+        response = response.model_copy(update={"ics_url": ics_url(http_request, request.email),
+                                               "stats_url": stats_url(http_request, request.email)})
+        # Partial results must not answer the follow-up request
+        if fingerprint and not response.remaining_nights:
+            payload_cache.put(request.email, fingerprint, response)
+        return response
     
+    except CalendarUnavailable as e:
+        # Nothing was written; the client retries once the circuit half-opens
+        return calendar_unavailable_response(e)
     except Exception as e:
         error_msg = str(e)
         print(f"Error syncing sleep data: {error_msg}", file=sys.stderr)
@@ -94,6 +415,149 @@ def sync_sleep_data(request: SyncRequest):
         )
 
 
+def require_admin(request: Request):
+    """403 unless the request carries the admin token (X-Admin-Token header)."""
+    if not profiler.is_admin(request.headers.get("x-admin-token")):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+@app.get("/debug/profiles/{profile_id}")
+def debug_profile(profile_id: str, request: Request, format: str = Query("json", pattern="^(json|collapsed)$")):
+    """
+    A stored request profile (admin only, X-Admin-Token header).
+    
+    format=json returns the metadata, Calendar call timeline and collapsed
+    stacks; format=collapsed returns just the stacks, ready for
+    flamegraph.pl or speedscope.
+    """
+    require_admin(request)
+    stored = profiler.load(profile_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    metadata, collapsed = stored
+    if format == "collapsed":
+        return Response(collapsed, media_type="text/plain; charset=utf-8")
+    return {**metadata, "collapsed": collapsed}
+
+
+def inventory_fleet():
+    """Every service account this instance syncs with."""
+    return Fleet.from_pool(credential_pool)
+
+
+def inventory_response(report, format):
+    if format == "csv":
+        return Response(to_csv(report), media_type="text/csv; charset=utf-8")
+    return report
+
+
+@app.get("/admin/inventory")
+def admin_inventory(request: Request, format: str = Query("json", pattern="^(json|csv)$"),
+                    workers: int = Query(8, ge=1, le=32)):
+    """
+    Every calendar of every service account with its event count, plus
+    duplicate and orphaned calendars (admin only, X-Admin-Token header).
+    """
+    require_admin(request)
+    report = take_inventory(inventory_fleet(), workers=workers, directory=calendar_directory,
+                            live_pool=calendar_pool.held(), pool_ttl=calendar_pool.ttl)
+    return inventory_response(report, format)
+
+
+@app.post("/admin/inventory/collect")
+def admin_inventory_collect(request: Request, merge: bool = False, delete_orphans: bool = False,
+                            format: str = Query("json", pattern="^(json|csv)$"),
+                            workers: int = Query(8, ge=1, le=32)):
+    """
+    Take an inventory, then merge duplicates into the calendar each user
+    syncs to and/or delete orphaned pool calendars with batched calls
+    (admin only). The report's actions list what was done.
+    """
+    require_admin(request)
+    fleet = inventory_fleet()
+    report = take_inventory(fleet, workers=workers, directory=calendar_directory,
+                            live_pool=calendar_pool.held(), pool_ttl=calendar_pool.ttl)
+    collect(fleet, report, merge=merge, delete_orphans=delete_orphans, workers=workers,
+            directory=calendar_directory)
+    return inventory_response(report, format)
+
+
+def not_modified(request: Request, etag: str, updated_at) -> bool:
+    """Evaluate If-None-Match (preferred) or If-Modified-Since."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and updated_at is not None:
+        try:
+            return int(updated_at) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+@app.get("/ics/{user_token}.ics")
+def ics_feed(user_token: str, request: Request):
+    """
+    Serve a user's sleep sessions as an ICS feed.
+    
+    Rendered from stored session summaries, so subscribing costs no
+    Calendar API quota. Supports conditional GETs (ETag/Last-Modified).
+    """
+    email = session_store.email_for_token(user_token)
+    if email is None:
+        raise HTTPException(status_code=404, detail="Feed not found")
+    
+    cutoff = feed_cutoff()
+    count, updated_at = session_store.version(email, since=cutoff)
+    etag = feed_etag(email, count, updated_at, cutoff)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(updated_at or 0, usegmt=True),
+        "Cache-Control": "private, max-age=300",
+    }
+    if not_modified(request, etag, updated_at):
+        return Response(status_code=304, headers=headers)
+    
+    media_type = "text/calendar; charset=utf-8"
+    body = feed_cache.get(email, etag)
+    if body is not None:
+        return Response(body, media_type=media_type, headers=headers)
+    
+    def stream():
+        chunks = []
+        for chunk in render_feed(email, session_store.sessions(email, since=cutoff), updated_at):
+            chunks.append(chunk)
+            yield chunk
+        feed_cache.put(email, etag, b"".join(chunks))
+    
+    return StreamingResponse(stream(), media_type=media_type, headers=headers)
+
+
+RANGE_UNITS = {"d": 1, "w": 7, "y": 365}
+
+
+@app.get("/stats/{user_token}")
+def sleep_stats(user_token: str, range: str = Query("90d", pattern=r"^\d+[dwy]$")):
+    """
+    Rolling sleep averages for a user over a range such as 30d, 12w or 1y.
+    
+    Keyed by the user's feed token (the stats_url in sync responses), like
+    the ICS feed, so an email alone reads nothing. Served from the session
+    store's daily/weekly aggregates.
+    """
+    email = session_store.email_for_token(user_token)
+    if email is None:
+        raise HTTPException(status_code=404, detail="Stats not found")
+    
+    days = int(range[:-1]) * RANGE_UNITS[range[-1]]
+    if not 1 <= days <= 3660:
+        raise HTTPException(status_code=400, detail="range must be between 1d and 10y")
+    today = datetime.now(pytz.timezone("America/Los_Angeles")).date()
+    return {"range": range, **session_store.stats(email, days, today=today)}
+
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8080))
@@ -0,0 +1,99 @@
+"""Per-user record of sleep sessions already written to the calendar."""
+import hashlib
+import threading
+import time
+from datetime import timedelta
+
+from api.db import connect
+
+
+# Bump when event rendering changes so previously synced nights are rewritten
+RENDER_VERSION = 2
+
+
+def session_hash(session):
+    """Hash a grouped session's intervals (start, end, stage, source)."""
+    digest = hashlib.sha1(f'v{RENDER_VERSION}'.encode('utf-8'))
+    for interval in sorted(session['intervals'], key=lambda i: (i['start'], i['end'], i['value'])):
+        digest.update(
+            f"\n{interval['start'].isoformat()}|{interval['end'].isoformat()}|"
+            f"{interval['value']}|{interval.get('source', '')}".encode('utf-8'))
+    return digest.hexdigest()
+
+
+class SessionCache:
+    """
+    SQLite store of session hashes already synced per user.
+
+    Nights whose hash is present are skipped before summarizing, rendering
+    or any Calendar call. Rows older than the retention window are evicted.
+    """
+
+    def __init__(self, path=None, retention_days=45):
+        """
+        Initialize session cache.
+
+        Args:
+            path: SQLite database path (default: api.db.default_path())
+            retention_days: Sessions starting earlier than this are evicted
+        """
+        self.path = path
+        self.retention_days = retention_days
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _db(self):
+        """Open the database and create the table on first use."""
+        if self._conn is None:
+            self._conn = connect(self.path)
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS synced_sessions ('
+                ' email TEXT NOT NULL,'
+                ' session_hash TEXT NOT NULL,'
+                ' session_start REAL NOT NULL,'
+                ' synced_at REAL NOT NULL,'
+                ' PRIMARY KEY (email, session_hash))')
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS synced_sessions_start'
+                ' ON synced_sessions (email, session_start)')
+            self._conn.commit()
+        return self._conn
+
+    def known_hashes(self, email):
+        """Return the set of session hashes already synced for this user."""
+        with self._lock:
+            rows = self._db().execute(
+                'SELECT session_hash FROM synced_sessions WHERE email = ?',
+                (email.lower(),)).fetchall()
+        return {row[0] for row in rows}
+
+    def mark_synced(self, email, sessions):
+        """
+        Record synced sessions and evict ones outside the retention window.
+
+        Args:
+            email: User email
+            sessions: Iterable of (session_start datetime, session_hash)
+        """
+        now = time.time()
+        rows = [(email.lower(), h, start.timestamp(), now) for start, h in sessions]
+        cutoff = now - timedelta(days=self.retention_days).total_seconds()
+        with self._lock:
+            db = self._db()
+            db.executemany(
+                'INSERT OR REPLACE INTO synced_sessions VALUES (?, ?, ?, ?)', rows)
+            db.execute(
+                'DELETE FROM synced_sessions WHERE email = ? AND session_start < ?',
+                (email.lower(), cutoff))
+            db.commit()
+
+    def forget(self, email):
+        """Drop all records for a user (e.g. after their events are deleted)."""
+        with self._lock:
+            db = self._db()
+            db.execute('DELETE FROM synced_sessions WHERE email = ?', (email.lower(),))
+            db.commit()
+
+
+# Global session cache instance
+session_cache = SessionCache()
@@ -0,0 +1,360 @@
+"""Local store of computed sleep session summaries per user."""
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from api.db import connect
+from api.scoring import calculate_score, default_curve
+
+
+_generated_secrets = {}
+_generated_lock = threading.Lock()
+
+
+def feeds_durable():
+    """
+    Whether a feed can stand in for the user's calendar: feed URLs must
+    resolve on every instance and the stored sessions must outlive
+    scale-to-zero, so ICS_TOKEN_SECRET and a SLEEP_CALENDAR_DB on a
+    persistent volume every instance mounts are both required.
+    """
+    return bool(os.getenv('ICS_TOKEN_SECRET')) and bool(os.getenv('SLEEP_CALENDAR_DB'))
+
+
+def token_secret(path=None):
+    """
+    Key for tokens handed to clients (feed URLs and continuation tokens).
+
+    ICS_TOKEN_SECRET when set. Otherwise a random key is generated once and
+    kept in the shared database, so every worker process and restart using
+    the same database signs with the same key. Deployments running several
+    instances must set ICS_TOKEN_SECRET, since each instance has its own
+    database.
+
+    Args:
+        path: Database path for the generated key (default: api.db.default_path())
+    """
+    secret = os.getenv('ICS_TOKEN_SECRET')
+    if secret:
+        return secret.encode('utf-8')
+    with _generated_lock:
+        if path not in _generated_secrets:
+            conn = connect(path)
+            try:
+                with conn:
+                    conn.execute('CREATE TABLE IF NOT EXISTS secrets (name TEXT PRIMARY KEY, value TEXT NOT NULL)')
+                    # The first process to get here wins; the others read its key
+                    conn.execute('INSERT OR IGNORE INTO secrets (name, value) VALUES (?, ?)',
+                                 ('token', secrets.token_hex(32)))
+                    row = conn.execute('SELECT value FROM secrets WHERE name = ?', ('token',)).fetchone()
+            finally:
+                conn.close()
+            _generated_secrets[path] = row[0].encode('utf-8')
+        return _generated_secrets[path]
+
+
+def feed_token(email):
+    """Unguessable, stable token identifying a user's ICS feed (HMAC of the email)."""
+    return hmac.new(token_secret(), email.strip().lower().encode('utf-8'), hashlib.sha256).hexdigest()[:32]
+
+
+def _encode(summary):
+    """Serialize a session summary (datetimes as ISO strings)."""
+    return json.dumps({
+        'start': summary['start'].isoformat(),
+        'end': summary['end'].isoformat(),
+        'aggregated_start': summary['aggregated_start'].isoformat(),
+        'aggregated_end': summary['aggregated_end'].isoformat(),
+        'total_asleep_min': summary['total_asleep_min'],
+        'stage_durations': summary['stage_durations'],
+        'awake_total_min': summary['awake_total_min'],
+        'source': summary['source'],
+        'intervals': [
+            [i['start'].isoformat(), i['end'].isoformat(), i['value'], i.get('source', '')]
+            for i in summary['intervals']
+        ],
+    }, sort_keys=True, ensure_ascii=False)
+
+
+def _metrics(summary):
+    """Per-session columns the daily aggregates are built from."""
+    stages = summary['stage_durations']
+    return (
+        # Sessions count toward the (local) day they end on
+        summary['aggregated_end'].date().isoformat(),
+        summary['total_asleep_min'],
+        stages.get('Core', 0.0),
+        stages.get('Deep', 0.0),
+        stages.get('REM', 0.0),
+        summary['awake_total_min'],
+    )
+
+
+def _week(day):
+    """ISO date of the Monday starting the week that contains `day`."""
+    day = date.fromisoformat(day) if isinstance(day, str) else day
+    return (day - timedelta(days=day.weekday())).isoformat()
+
+
+def _decode(text):
+    """Inverse of _encode."""
+    summary = json.loads(text)
+    for key in ('start', 'end', 'aggregated_start', 'aggregated_end'):
+        summary[key] = datetime.fromisoformat(summary[key])
+    summary['intervals'] = [
+        {'start': datetime.fromisoformat(start), 'end': datetime.fromisoformat(end), 'value': value, 'source': source}
+        for start, end, value, source in summary['intervals']
+    ]
+    return summary
+
+
+class SessionStore:
+    """
+    SQLite store of session summaries, keyed by (email, session start).
+
+    Unlike SessionCache (which only remembers what reached the calendar),
+    this keeps the summaries themselves so feeds can be rendered without
+    any Calendar API call.
+
+    Daily and weekly aggregates are maintained on write: a save recomputes
+    only the days (and their weeks) it touched, so stats queries read a
+    handful of pre-summed rows however long the history grows.
+    """
+
+    def __init__(self, path=None):
+        """
+        Initialize session store.
+
+        Args:
+            path: SQLite database path (default: api.db.default_path())
+        """
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _db(self):
+        """Open the database and create the tables on first use."""
+        if self._conn is None:
+            self._conn = connect(self.path)
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS sleep_sessions ('
+                ' email TEXT NOT NULL,'
+                ' session_start REAL NOT NULL,'
+                ' session_end REAL NOT NULL,'
+                ' summary TEXT NOT NULL,'
+                ' updated_at REAL NOT NULL,'
+                ' day TEXT NOT NULL,'
+                ' asleep_min REAL NOT NULL,'
+                ' core_min REAL NOT NULL,'
+                ' deep_min REAL NOT NULL,'
+                ' rem_min REAL NOT NULL,'
+                ' awake_min REAL NOT NULL,'
+                ' PRIMARY KEY (email, session_start))')
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS sleep_sessions_day ON sleep_sessions (email, day)')
+            for table, key in (('sleep_daily', 'day'), ('sleep_weekly', 'week')):
+                self._conn.execute(
+                    f'CREATE TABLE IF NOT EXISTS {table} ('
+                    ' email TEXT NOT NULL,'
+                    f' {key} TEXT NOT NULL,'
+                    ' nights INTEGER NOT NULL,'
+                    ' asleep_min REAL NOT NULL,'
+                    ' score REAL NOT NULL,'
+                    ' core_min REAL NOT NULL,'
+                    ' deep_min REAL NOT NULL,'
+                    ' rem_min REAL NOT NULL,'
+                    ' awake_min REAL NOT NULL,'
+                    f' PRIMARY KEY (email, {key}))')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS feed_tokens ('
+                ' token TEXT PRIMARY KEY,'
+                ' email TEXT NOT NULL)')
+            self._conn.commit()
+        return self._conn
+
+    def save(self, email, summaries):
+        """
+        Insert or update session summaries for a user.
+
+        Rows whose summary is unchanged keep their updated_at, so feed
+        validators (ETag/Last-Modified) only move when content does.
+
+        Returns:
+            int: Number of sessions inserted or changed
+        """
+        email = email.lower()
+        now = time.time()
+        rows = [(email, s['start'].timestamp(), s['end'].timestamp(), _encode(s), now) + _metrics(s)
+                for s in summaries]
+        with self._lock:
+            db = self._db()
+            before = db.total_changes
+            # Days of rows about to be replaced lose their contribution too
+            days = {row[5] for row in rows}
+            for row in rows:
+                days.update(day for day, in db.execute(
+                    'SELECT day FROM sleep_sessions WHERE email = ? AND session_start < ? AND session_end > ?',
+                    (email, row[2], row[1])))
+            # A night whose start moved (e.g. an earlier sample arrived)
+            # replaces the stale row it overlaps
+            db.executemany(
+                'DELETE FROM sleep_sessions WHERE email = ? AND session_start != ?'
+                ' AND session_start < ? AND session_end > ?',
+                [(email, row[1], row[2], row[1]) for row in rows])
+            db.executemany(
+                'INSERT INTO sleep_sessions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+                ' ON CONFLICT (email, session_start) DO UPDATE SET'
+                ' session_end = excluded.session_end, summary = excluded.summary, updated_at = excluded.updated_at,'
+                ' day = excluded.day, asleep_min = excluded.asleep_min, core_min = excluded.core_min,'
+                ' deep_min = excluded.deep_min, rem_min = excluded.rem_min, awake_min = excluded.awake_min'
+                ' WHERE summary != excluded.summary', rows)
+            changed = db.total_changes - before
+            if changed:
+                self._refresh_aggregates(db, email, days)
+            db.execute('INSERT OR IGNORE INTO feed_tokens VALUES (?, ?)', (feed_token(email), email))
+            db.commit()
+        return changed
+
+    def _refresh_aggregates(self, db, email, days):
+        """Recompute the daily rows for `days` and the weekly rows containing them."""
+        for day in days:
+            nights, asleep, core, deep, rem, awake = db.execute(
+                'SELECT COUNT(*), SUM(asleep_min), SUM(core_min), SUM(deep_min), SUM(rem_min), SUM(awake_min)'
+                ' FROM sleep_sessions WHERE email = ? AND day = ?', (email, day)).fetchone()
+            if nights:
+                score, _ = calculate_score(asleep / 60)
+                db.execute('INSERT OR REPLACE INTO sleep_daily VALUES (?, ?, 1, ?, ?, ?, ?, ?, ?)',
+                           (email, day, asleep, score, core, deep, rem, awake))
+            else:
+                db.execute('DELETE FROM sleep_daily WHERE email = ? AND day = ?', (email, day))
+        for week in {_week(day) for day in days}:
+            last = (date.fromisoformat(week) + timedelta(days=6)).isoformat()
+            row = db.execute(
+                'SELECT COUNT(*), SUM(asleep_min), SUM(score), SUM(core_min), SUM(deep_min), SUM(rem_min), SUM(awake_min)'
+                ' FROM sleep_daily WHERE email = ? AND day BETWEEN ? AND ?', (email, week, last)).fetchone()
+            if row[0]:
+                db.execute('INSERT OR REPLACE INTO sleep_weekly VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                           (email, week) + tuple(row))
+            else:
+                db.execute('DELETE FROM sleep_weekly WHERE email = ? AND week = ?', (email, week))
+
+    def rescore(self, curve=None):
+        """
+        Recompute every stored daily score (and weekly sums) with `curve`.
+
+        Returns:
+            int: Number of days re-scored
+        """
+        curve = curve or default_curve
+        with self._lock:
+            db = self._db()
+            rows = db.execute('SELECT email, day, asleep_min FROM sleep_daily').fetchall()
+            if rows:
+                scores, _ = curve.score_many([asleep / 60 for _, _, asleep in rows])
+                db.executemany('UPDATE sleep_daily SET score = ? WHERE email = ? AND day = ?',
+                               [(int(score), email, day) for score, (email, day, _) in zip(scores, rows)])
+                db.execute(
+                    'UPDATE sleep_weekly SET score = (SELECT SUM(d.score) FROM sleep_daily d'
+                    " WHERE d.email = sleep_weekly.email AND d.day BETWEEN sleep_weekly.week AND date(sleep_weekly.week, '+6 days'))")
+            db.commit()
+        return len(rows)
+
+    def stats(self, email, days, today=None):
+        """
+        Averages over the `days` days ending `today`, from the aggregates.
+
+        Whole weeks are read from sleep_weekly and the ragged ends from
+        sleep_daily, so a query touches at most ~days/7 + 12 rows.
+
+        Returns:
+            dict with nights, averages, stage percentages and a weekly series
+        """
+        email = email.lower()
+        today = today or date.today()
+        first = today - timedelta(days=days - 1)
+        first_full = first + timedelta(days=(7 - first.weekday()) % 7)
+        last_full = today - timedelta(days=(today.weekday() + 1) % 7)
+        columns = 'SUM(nights), SUM(asleep_min), SUM(score), SUM(core_min), SUM(deep_min), SUM(rem_min), SUM(awake_min)'
+        with self._lock:
+            db = self._db()
+            if first_full < last_full:
+                parts = [
+                    db.execute(f'SELECT {columns} FROM sleep_weekly WHERE email = ? AND week BETWEEN ? AND ?',
+                               (email, first_full.isoformat(), _week(last_full))).fetchone(),
+                    db.execute(f'SELECT {columns} FROM sleep_daily WHERE email = ?'
+                               ' AND (day BETWEEN ? AND ? OR day BETWEEN ? AND ?)',
+                               (email, first.isoformat(), (first_full - timedelta(days=1)).isoformat(),
+                                (last_full + timedelta(days=1)).isoformat(), today.isoformat())).fetchone(),
+                ]
+            else:
+                parts = [db.execute(f'SELECT {columns} FROM sleep_daily WHERE email = ? AND day BETWEEN ? AND ?',
+                                    (email, first.isoformat(), today.isoformat())).fetchone()]
+            weekly = db.execute(
+                'SELECT week, nights, asleep_min, score FROM sleep_weekly'
+                ' WHERE email = ? AND week BETWEEN ? AND ? ORDER BY week',
+                (email, _week(first), today.isoformat())).fetchall()
+
+        nights, asleep, score, core, deep, rem, awake = (sum(part[i] or 0 for part in parts) for i in range(7))
+        staged = core + deep + rem
+
+        def pct(value, total):
+            return round(value / total * 100, 1) if total else None
+
+        return {
+            'from': first.isoformat(),
+            'to': today.isoformat(),
+            'nights': nights,
+            'avg_asleep_hours': round(asleep / nights / 60, 2) if nights else None,
+            'avg_score': round(score / nights, 1) if nights else None,
+            'stage_pct': {'Core': pct(core, staged), 'Deep': pct(deep, staged), 'REM': pct(rem, staged)},
+            'awake_pct': pct(awake, asleep + awake),
+            'weekly': [
+                {'week': week, 'nights': n, 'avg_asleep_hours': round(a / n / 60, 2), 'avg_score': round(sc / n, 1)}
+                for week, n, a, sc in weekly
+            ],
+        }
+
+    def email_for_token(self, token):
+        """Return the email a feed token belongs to, or None."""
+        with self._lock:
+            row = self._db().execute('SELECT email FROM feed_tokens WHERE token = ?', (token,)).fetchone()
+        return row[0] if row else None
+
+    def version(self, email, since=None):
+        """
+        Return (session count, last updated_at) for a user's sessions.
+
+        Cheap enough to run on every feed request to validate caches.
+        """
+        with self._lock:
+            count, updated = self._db().execute(
+                'SELECT COUNT(*), MAX(updated_at) FROM sleep_sessions'
+                ' WHERE email = ? AND session_start >= ?',
+                (email.lower(), since.timestamp() if since else 0)).fetchone()
+        return count, updated
+
+    def sessions(self, email, since=None):
+        """Return a user's session summaries ordered by start."""
+        with self._lock:
+            rows = self._db().execute(
+                'SELECT summary FROM sleep_sessions WHERE email = ? AND session_start >= ?'
+                ' ORDER BY session_start',
+                (email.lower(), since.timestamp() if since else 0)).fetchall()
+        return [_decode(row[0]) for row in rows]
+
+    def forget(self, email):
+        """Drop all sessions and aggregates for a user."""
+        with self._lock:
+            db = self._db()
+            for table in ('sleep_sessions', 'sleep_daily', 'sleep_weekly'):
+                db.execute(f'DELETE FROM {table} WHERE email = ?', (email.lower(),))
+            db.commit()
+
+
+# Global session store instance
+session_store = SessionStore()
@@ -0,0 +1,156 @@
+"""Per-key single-flight coordination of concurrent syncs."""
+import fcntl
+import hashlib
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+from anyio import to_thread
+
+from api.db import shared_state
+
+
+class _Flight:
+    """One run of the work function, shared by every request folded into it."""
+
+    def __init__(self):
+        self.tokens = set()
+        self.payloads: List[Any] = []
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+    def add(self, token, payload):
+        if token is None or token not in self.tokens:
+            self.tokens.add(token)
+            self.payloads.append(payload)
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key (a user email).
+
+    At most one flight runs per key. A caller that arrives while a flight is
+    running either joins it (same token, e.g. the same payload fingerprint)
+    and gets its result, or is folded into a single follow-up flight that
+    runs once the current one finishes, with every waiting payload merged.
+    The work itself is never repeated for a payload already in flight.
+
+    Coordination uses thread primitives only, so it is safe from the
+    threadpool; async callers use ``do_async`` to wait off the event loop.
+    """
+
+    def __init__(self, lock_dir: Optional[str] = None):
+        """
+        Initialize single-flight group.
+
+        Args:
+            lock_dir: Directory of per-key lock files; when set, flights for
+                the same key also run one at a time across worker processes
+        """
+        self.lock_dir = lock_dir
+        self._running: Dict[str, _Flight] = {}
+        self._pending: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key: str, token, payload, fn: Callable[[List[Any]], Any]):
+        """
+        Run `fn` for `payload` under `key`, coalescing with concurrent calls.
+
+        Args:
+            key: Coalescing key (user email)
+            token: Identity of the payload; equal tokens join the same flight
+            payload: This caller's input
+            fn: Called with the list of payloads of one flight; its return
+                value (or exception) is shared by every caller in that flight
+
+        Returns:
+            The result of the flight this call was folded into
+        """
+        wait_for = None
+        with self._lock:
+            running = self._running.get(key)
+            if running is None:
+                flight = _Flight()
+                self._running[key] = flight
+                lead = True
+            elif token is not None and token in running.tokens:
+                flight = running
+                lead = False
+            else:
+                flight = self._pending.get(key)
+                lead = flight is None
+                if lead:
+                    # Run after the current flight, which hands over when done
+                    flight = self._pending[key] = _Flight()
+                    wait_for = running
+            if not lead:
+                self.coalesced += 1
+            flight.add(token, payload)
+
+        if wait_for is not None:
+            wait_for.done.wait()
+        if lead:
+            self._run(key, flight, fn)
+        else:
+            flight.done.wait()
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    async def do_async(self, key: str, token, payload, fn: Callable[[List[Any]], Any]):
+        """Async variant of ``do``; blocking waits happen in a worker thread."""
+        return await to_thread.run_sync(self.do, key, token, payload, fn)
+
+    @contextmanager
+    def _process_lock(self, key):
+        """Exclusive lock on `key` shared with other processes (no-op without lock_dir)."""
+        if self.lock_dir is None:
+            yield
+            return
+        os.makedirs(self.lock_dir, exist_ok=True)
+        name = hashlib.sha256(key.encode('utf-8')).hexdigest()[:32] + '.lock'
+        with open(os.path.join(self.lock_dir, name), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _run(self, key, flight, fn):
+        try:
+            with self._process_lock(key):
+                flight.result = fn(flight.payloads)
+        except BaseException as e:
+            flight.error = e
+        finally:
+            with self._lock:
+                follow_up = self._pending.pop(key, None)
+                if follow_up is not None:
+                    self._running[key] = follow_up
+                else:
+                    del self._running[key]
+            flight.done.set()
+
+    def stats(self) -> Dict[str, int]:
+        """Gauges for the metrics endpoint."""
+        with self._lock:
+            return {
+                'running': len(self._running),
+                'pending': len(self._pending),
+                'coalesced': self.coalesced,
+            }
+
+
+def default_lock_dir():
+    """Lock directory from SINGLE_FLIGHT_LOCK_DIR (default: a directory in the temp dir)."""
+    return os.getenv('SINGLE_FLIGHT_LOCK_DIR') or os.path.join(tempfile.gettempdir(), 'sleep-calendar-locks')
+
+
+# Global single-flight group for /sync, keyed by email (and by lock file
+# across worker processes when there are several)
+sync_flights = SingleFlight(lock_dir=default_lock_dir() if shared_state() else None)
@@ -6,20 +6,139 @@ import os
 import base64
 import io
 import sys
+import threading
+import time
 from datetime import datetime, timedelta, timezone
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
+from functools import lru_cache, partial
+from itertools import islice
 from googleapiclient.errors import HttpError
-from dateutil import parser as date_parser
-import pytz
+
+from api.calendar_directory import user_calendar_name
+from api.circuit_breaker import CalendarUnavailable, calendar_breakers, calendar_bulkhead, timeout_http
+from api.lazy import lazy_import
+from api.overlap import merge_intervals
+from api.profiler import active as active_profile
+from api.scoring import EMOJIS, SCORE_DESCRIPTIONS, calculate_score, default_curve
+from api.session_cache import session_hash
+
+# Heavy dependencies load on first use (see warm_up) rather than at import
+service_account = lazy_import('google.oauth2.service_account')
+discovery = lazy_import('googleapiclient.discovery')
+googleapiclient_http = lazy_import('googleapiclient.http')
+date_parser = lazy_import('dateutil.parser')
+pytz = lazy_import('pytz')
+
+SCOPES = ['https://www.googleapis.com/auth/calendar']
+
+# Resources of the Calendar API this project calls
+DISCOVERY_RESOURCES = ('acl', 'calendarList', 'calendars', 'events')
+
+
+@lru_cache(maxsize=1)
+def discovery_document():
+    """
+    Calendar v3 discovery document, trimmed and serialized once per process.
+    
+    Starts from the copy bundled with googleapiclient (no network fetch),
+    drops unused resources and descriptions, and keeps the compact JSON so
+    each build only parses ~40KB instead of reading and parsing ~130KB.
+    """
+    path = os.path.join(os.path.dirname(discovery.__file__), 'discovery_cache', 'documents', 'calendar.v3.json')
+    with open(path, 'r') as f:
+        document = json.load(f)
+    
+    def strip(node):
+        if isinstance(node, dict):
+            return {k: strip(v) for k, v in node.items() if k != 'description'}
+        if isinstance(node, list):
+            return [strip(v) for v in node]
+        return node
+    
+    document = strip(document)
+    document['resources'] = {
+        name: resource for name, resource in document['resources'].items()
+        if name in DISCOVERY_RESOURCES
+    }
+    return json.dumps(document, separators=(',', ':'))
+
+
+def build(serviceName, version, credentials=None, client_options=None):
+    """
+    Build the Calendar client from the cached discovery document.
+    
+    Requests go over an Http with separate connect and read timeouts
+    (CALENDAR_CONNECT_TIMEOUT / CALENDAR_READ_TIMEOUT).
+    """
+    assert (serviceName, version) == ('calendar', 'v3')
+    if credentials is None:
+        return discovery.build_from_document(
+            discovery_document(), client_options=client_options)
+    import google_auth_httplib2
+    http = google_auth_httplib2.AuthorizedHttp(credentials, http=timeout_http())
+    return discovery.build_from_document(
+        discovery_document(), http=http, client_options=client_options)
+
+
+@lru_cache(maxsize=4)
+def _credentials_from_env(creds_env):
+    """Default service account credentials, shared so tokens are reused."""
+    if creds_env:
+        try:
+            # Try base64 decode first
+            decoded = base64.b64decode(creds_env).decode('utf-8')
+            creds_dict = json.loads(decoded)
+        except Exception:
+            # Fall back to direct JSON
+            creds_dict = json.loads(creds_env)
+        return service_account.Credentials.from_service_account_info(
+            creds_dict, scopes=SCOPES)
+    # Fall back to default file path
+    return service_account.Credentials.from_service_account_file(
+        'service-account.json', scopes=SCOPES)
+
+
+def default_credentials():
+    """Credentials from GOOGLE_CALENDAR_CREDENTIALS or service-account.json."""
+    return _credentials_from_env(os.getenv('GOOGLE_CALENDAR_CREDENTIALS'))
+
+
+def warm_up(refresh_token=True):
+    """
+    Load deferred modules and the discovery document ahead of traffic.
+    
+    Args:
+        refresh_token: Also fetch an access token for the default
+            credentials in a background thread, if credentials are configured
+    """
+    discovery_document()
+    for module in (service_account, discovery, googleapiclient_http, date_parser):
+        getattr(module, '__name__')
+    date_parser.parse('2026-01-01T00:00:00')
+    pytz.timezone('America/Los_Angeles')
+    
+    if refresh_token and (os.getenv('GOOGLE_CALENDAR_CREDENTIALS') or os.path.exists('service-account.json')):
+        def refresh():
+            try:
+                import google_auth_httplib2
+                import httplib2
+                default_credentials().refresh(google_auth_httplib2.Request(httplib2.Http(timeout=10)))
+            except Exception as e:
+                print(f"Warning: could not pre-fetch access token: {e}", file=sys.stderr)
+        threading.Thread(target=refresh, daemon=True).start()
 
 
 class SleepCalendar:
     """Sync sleep data to Google Calendar with per-user calendar support."""
     
-    SCOPES = ['https://www.googleapis.com/auth/calendar']
+    SCOPES = SCOPES
+    
+    # Assumed seconds to write one night before any has been timed
+    SESSION_COST_ESTIMATE = 1.0
     
-    def __init__(self, credentials_path=None, credentials_json=None, user_email=None):
+    def __init__(self, credentials_path=None, credentials_json=None, user_email=None,
+                 credential_pool=None, pacer=None, session_cache=None,
+                 credentials=None, api_endpoint=None, session_store=None, sample_archive=None,
+                 calendar_pool=None, calendar_directory=None):
         """
         Initialize SleepCalendar.
         
@@ -27,9 +146,28 @@ class SleepCalendar:
             credentials_path: Path to service account JSON file (optional)
             credentials_json: Service account JSON as dict or string (optional)
             user_email: User email for calendar identification (optional)
+            credential_pool: CredentialPool sharding users across service accounts (optional)
+            pacer: QuotaPacer throttling Calendar calls per service account (optional)
+            session_cache: SessionCache of nights already synced, skipped on later syncs (optional)
+            credentials: Ready-made google.auth credentials (optional)
+            api_endpoint: Calendar API base URL, e.g. a local fake server
+                (optional, defaults to GOOGLE_CALENDAR_API_ENDPOINT or Google)
+            session_store: SessionStore keeping computed summaries, e.g. for ICS feeds (optional)
+            sample_archive: SampleArchive keeping the user's raw samples for reprocessing (optional)
+            calendar_pool: CalendarPool of pre-created calendars claimed by first-time users (optional)
+            calendar_directory: CalendarDirectory remembering calendar IDs by name (optional)
         """
-        # Priority: credentials_json > credentials_path > env var
-        if credentials_json:
+        self.account = None
+        # Priority: credentials > credential_pool > credentials_json > credentials_path > env var
+        if credentials is not None:
+            self.creds = credentials
+        elif credential_pool is not None and user_email:
+            # The user's shard owns their calendar and all event calls; a
+            # recorded calendar pins existing users to their account
+            shard = credential_pool.shard_for(user_email, directory=calendar_directory)
+            self.creds = credential_pool.credentials_at(shard)
+            self.account = credential_pool.account_ids[shard]
+        elif credentials_json:
             if isinstance(credentials_json, str):
                 # Try parsing as JSON string
                 try:
@@ -47,26 +185,27 @@ class SleepCalendar:
             self.creds = service_account.Credentials.from_service_account_file(
                 credentials_path, scopes=self.SCOPES)
         else:
-            # Try env var (base64 or JSON string)
-            creds_env = os.getenv('GOOGLE_CALENDAR_CREDENTIALS')
-            if creds_env:
-                try:
-                    # Try base64 decode first
-                    decoded = base64.b64decode(creds_env).decode('utf-8')
-                    creds_dict = json.loads(decoded)
-                except Exception:
-                    # Fall back to direct JSON
-                    creds_dict = json.loads(creds_env)
-                self.creds = service_account.Credentials.from_service_account_info(
-                    creds_dict, scopes=self.SCOPES)
-            else:
-                # Fall back to default file path
-                self.creds = service_account.Credentials.from_service_account_file(
-                    'service-account.json', scopes=self.SCOPES)
+            # Env var (base64 or JSON string) or service-account.json,
+            # shared across instances so the access token is reused
+            self.creds = default_credentials()
         
-        self.service = build('calendar', 'v3', credentials=self.creds)
+        self.api_endpoint = api_endpoint or os.getenv('GOOGLE_CALENDAR_API_ENDPOINT')
+        if self.api_endpoint:
+            self.service = build('calendar', 'v3', credentials=self.creds,
+                                 client_options={'api_endpoint': self.api_endpoint})
+        else:
+            self.service = build('calendar', 'v3', credentials=self.creds)
         self.calendar_id = None
         self.user_email = user_email
+        self.credential_pool = credential_pool
+        self.pacer = pacer
+        self.session_cache = session_cache
+        self.session_store = session_store
+        self.sample_archive = sample_archive
+        self.calendar_pool = calendar_pool
+        self.calendar_directory = calendar_directory
+        self.remaining_sessions = []
+        self.resume_before = None
     
     def get_or_create_calendar(self, name=None, user_email=None):
         """
@@ -81,113 +220,415 @@ class SleepCalendar:
         # Determine calendar name
         if name is None:
             if user_email:
-                name = f"Sleep Data - {user_email}"
+                name = user_calendar_name(user_email)
             else:
                 name = "Sleep Data"
         
-        # List calendars
-        calendars = self.service.calendarList().list().execute()
-        for cal in calendars.get('items', []):
-            if cal.get('summary') == name:
-                self.calendar_id = cal['id']
-                return cal['id']
+        # Known calendar: no calendarList scan
+        if self.calendar_directory is not None:
+            cal_id = self.calendar_directory.get(self.account or 'default', name)
+            if cal_id:
+                self.calendar_id = cal_id
+                return cal_id
+        
+        cal_id = self._find_or_create_calendar(name, user_email)
+        if self.calendar_directory is not None:
+            # The calendar may have been found under another account
+            self.calendar_directory.put(self.account or 'default', name, cal_id)
+        return cal_id
+    
+    def lookup_calendar(self, name=None):
+        """
+        Find an existing calendar the way get_or_create_calendar does (the
+        directory, this account's calendarList, then accounts that owned the
+        user on an earlier ring), without creating one.
         
-        # Create new
+        Args:
+            name: Calendar name (default: the user's calendar)
+        
+        Returns:
+            Calendar ID, or None
+        """
+        name = name or user_calendar_name(self.user_email)
+        cal_id = None
+        if self.calendar_directory is not None:
+            cal_id = self.calendar_directory.get(self.account or 'default', name)
+        if not cal_id:
+            cal_id = self.find_calendar(name) or self._find_in_other_accounts(name)
+            if cal_id and self.calendar_directory is not None:
+                self.calendar_directory.put(self.account or 'default', name, cal_id)
+        if cal_id:
+            self.calendar_id = cal_id
+        return cal_id
+    
+    def _find_or_create_calendar(self, name, user_email):
+        """Find the named calendar, or claim or create it."""
+        # A pooled calendar is claimed before looking under earlier owners:
+        # first syncs stay fast, and a copy left under an account the ring
+        # moved the user from is merged later by the inventory
+        cal_id = (self.find_calendar(name) or self._claim_pooled(name, user_email)
+                  or self._find_in_other_accounts(name))
+        if cal_id:
+            self.calendar_id = cal_id
+            return cal_id
+        return self._new_calendar(name, user_email)
+    
+    def _claim_pooled(self, name, user_email):
+        """Claim a pre-created public calendar if the pool has one ready, else None."""
+        if self.calendar_pool is None:
+            return None
+        cal_id = self.calendar_pool.take(self)
+        if cal_id and self.claim_calendar(cal_id, name, user_email):
+            self.calendar_id = cal_id
+            return cal_id
+        return None
+    
+    def _create_calendar(self, name, user_email):
+        """Claim a pooled calendar or create a new public one, without looking for an existing one."""
+        # First sync: claim a pre-created public calendar if one is ready
+        return self._claim_pooled(name, user_email) or self._new_calendar(name, user_email)
+    
+    def _new_calendar(self, name, user_email):
+        """Create a new public calendar shared with the user."""
         calendar = {'summary': name, 'timeZone': 'America/Los_Angeles'}
-        created = self.service.calendars().insert(body=calendar).execute()
+        created = self._execute(self.service.calendars().insert(body=calendar))
         cal_id = created['id']
         self.calendar_id = cal_id
         
         # Make public read-only (for easy subscription in Google Calendar)
         acl = {'scope': {'type': 'default'}, 'role': 'reader'}
-        self.service.acl().insert(calendarId=cal_id, body=acl).execute()
+        self._execute(self.service.acl().insert(calendarId=cal_id, body=acl))
         
         # Share with user email (writer role) if provided
         if user_email:
             try:
                 user_acl = {'scope': {'type': 'user', 'value': user_email}, 'role': 'writer'}
-                self.service.acl().insert(calendarId=cal_id, body=user_acl).execute()
+                self._execute(self.service.acl().insert(calendarId=cal_id, body=user_acl))
             except HttpError as e:
                 # Log but don't fail if sharing fails
                 print(f"Warning: Could not share calendar with {user_email}: {e}", file=sys.stderr)
         
         return cal_id
     
-    def calculate_score(self, duration_hours):
-        """Calculate sleep score (0-100) and emoji."""
-        if duration_hours < 6:
-            score = (duration_hours / 6) * 50
-        elif duration_hours > 10:
-            score = max(0, 100 - (duration_hours - 10) * 20)
-        else:
-            if duration_hours <= 8:
-                score = 50 + (duration_hours - 6) / 2 * 50
-            else:
-                score = 100 - (duration_hours - 8) / 2 * 10
+    def _find_in_other_accounts(self, name):
+        """
+        Look for the calendar under accounts that owned this user on an
+        earlier ring, e.g. before an added account moved them, and switch
+        to the account that owns it. Accounts already searched without a
+        match are skipped.
         
-        if score >= 70:
-            emoji = '🟢'
-        elif score >= 50:
-            emoji = '😴'
-        else:
-            emoji = '🔴'
+        Returns:
+            Calendar ID, or None (also without a calendar directory or a
+            multi-account pool, or if the pool never changed)
+        """
+        if self.credential_pool is None or len(self.credential_pool) < 2 or self.calendar_directory is None:
+            return None
+        if not self.user_email or name != user_calendar_name(self.user_email):
+            return None
+        rings = self.calendar_directory.rings(self.credential_pool.account_ids)
+        for shard in self.credential_pool.previous_owners(self.user_email, rings):
+            account = self.credential_pool.account_ids[shard]
+            if account == self.account or self.calendar_directory.missing(account, name):
+                continue
+            owner = SleepCalendar(credentials=self.credential_pool.credentials_at(shard),
+                                  api_endpoint=self.api_endpoint, pacer=self.pacer)
+            owner.account = account
+            cal_id = owner.find_calendar(name)
+            if cal_id:
+                self.creds, self.service, self.account = owner.creds, owner.service, account
+                return cal_id
+            self.calendar_directory.miss(account, name)
+        return None
+    
+    def claim_calendar(self, cal_id, name, user_email=None):
+        """
+        Rename a pre-created calendar for a user and share it with them, in
+        one batch request.
         
-        return int(score), emoji
+        Returns:
+            True if the calendar was renamed (sharing failures only warn)
+        """
+        requests = [('rename', self.service.calendars().patch(calendarId=cal_id, body={'summary': name}))]
+        if user_email:
+            user_acl = {'scope': {'type': 'user', 'value': user_email}, 'role': 'writer'}
+            requests.append(('share', self.service.acl().insert(calendarId=cal_id, body=user_acl)))
+        _, errors = self.execute_batched(requests)
+        errors = dict(errors)
+        if 'rename' in errors:
+            print(f"Warning: Could not claim pooled calendar {cal_id}: {errors['rename']}", file=sys.stderr)
+            return False
+        if 'share' in errors:
+            print(f"Warning: Could not share calendar with {user_email}: {errors['share']}", file=sys.stderr)
+        return True
+    
+    def find_calendar(self, name):
+        """Return the ID of the calendar with this summary, or None."""
+        # Every page; a shared service account owns many calendars
+        page_token = None
+        while True:
+            calendars = self._execute(self.service.calendarList().list(pageToken=page_token))
+            for cal in calendars.get('items', []):
+                if cal.get('summary') == name:
+                    return cal['id']
+            page_token = calendars.get('nextPageToken')
+            if not page_token:
+                return None
+    
+    def patch_events(self, patches, batch_size=50):
+        """
+        Patch many events with batched requests.
+        
+        Args:
+            patches: Iterable of (event_id, body) for self.calendar_id
+            batch_size: Requests per batch (Calendar recommends at most 50)
+            
+        Returns:
+            (patched count, list of (event_id, error))
+        """
+        return self.execute_batched(
+            ((event_id, self.service.events().patch(calendarId=self.calendar_id, eventId=event_id, body=body))
+             for event_id, body in patches),
+            batch_size=batch_size)
+    
+    def insert_events(self, events, batch_size=50):
+        """
+        Insert many events with batched requests.
+        
+        Args:
+            events: Iterable of (request_id, event body) for self.calendar_id
+            batch_size: Requests per batch
+            
+        Returns:
+            (inserted count, list of (request_id, error))
+        """
+        return self.execute_batched(
+            ((request_id, self.service.events().insert(calendarId=self.calendar_id, body=body))
+             for request_id, body in events),
+            batch_size=batch_size)
+    
+    def delete_all_events(self, batch_size=50):
+        """
+        Delete every event in self.calendar_id with batched requests.
+        
+        Returns:
+            (deleted count, list of (event_id, error))
+        """
+        event_ids = []
+        page_token = None
+        while True:
+            page = self._execute(self.service.events().list(
+                calendarId=self.calendar_id, pageToken=page_token, maxResults=2500,
+                fields='items(id),nextPageToken'))
+            event_ids.extend(event['id'] for event in page.get('items', []))
+            page_token = page.get('nextPageToken')
+            if not page_token:
+                break
+        return self.execute_batched(
+            ((event_id, self.service.events().delete(calendarId=self.calendar_id, eventId=event_id))
+             for event_id in event_ids),
+            batch_size=batch_size)
+    
+    def execute_batched(self, requests, batch_size=50):
+        """
+        Execute Calendar requests in batches, pacing each one.
+        
+        Args:
+            requests: Iterable of (request_id, unexecuted request)
+            batch_size: Requests per batch (Calendar recommends at most 50)
+            
+        Returns:
+            (succeeded count, list of (request_id, error))
+        """
+        succeeded = 0
+        errors = []
+        
+        def callback(request_id, response, exception):
+            nonlocal succeeded
+            if exception is not None:
+                errors.append((request_id, exception))
+            else:
+                succeeded += 1
+        
+        batch = None
+        queued = 0
+        for request_id, request in requests:
+            if batch is None:
+                batch = self.new_batch(callback=callback)
+            # Each batched request counts against the quota individually
+            if self.pacer is not None:
+                self.pacer.acquire(self.account or 'default')
+            batch.add(request, request_id=request_id)
+            queued += 1
+            if queued == batch_size:
+                self._guarded('batch', batch.execute)
+                batch, queued = None, 0
+        if batch is not None:
+            self._guarded('batch', batch.execute)
+        return succeeded, errors
+    
+    def calculate_score(self, duration_hours):
+        """Calculate sleep score (0-100) and emoji."""
+        return calculate_score(duration_hours)
     
     def group_sleep_sessions(self, samples, la_tz):
         """Group sleep samples into sleep sessions (one per night)."""
-        parsed_samples = []
-        for sample in samples:
+        return group_sleep_sessions(samples, la_tz)
+    
+    def new_batch(self, callback=None):
+        """Create a batch request aimed at the same endpoint as self.service."""
+        if self.api_endpoint:
+            return googleapiclient_http.BatchHttpRequest(
+                callback=callback,
+                batch_uri=self.api_endpoint.rstrip('/') + '/batch/calendar/v3')
+        return self.service.new_batch_http_request(callback=callback)
+    
+    def _execute(self, request):
+        """Execute a Calendar API request, pacing it against the account quota."""
+        endpoint = getattr(request, 'methodId', None)
+        return self._guarded(endpoint if isinstance(endpoint, str) else 'calendar', request.execute,
+                             pace=True)
+    
+    def _guarded(self, endpoint, call, pace=False):
+        """
+        Run a Calendar call through its circuit breaker and the bulkhead.
+        
+        Raises:
+            CalendarUnavailable: if the circuit is open or the bulkhead is full
+        """
+        breaker = calendar_breakers.get(self.account or 'default', endpoint)
+        
+        def attempt():
+            if pace and self.pacer is not None:
+                self.pacer.acquire(self.account or 'default')
+            return calendar_bulkhead.call(call)
+        
+        profile = active_profile()
+        if profile is None:
+            return breaker.call(attempt)
+        with profile.calendar_call(endpoint):
+            return breaker.call(attempt)
+    
+    def sync_sessions(self, summaries, deadline=None, before=None):
+        """
+        Write session summaries (from build_session_summaries) to the calendar.
+        
+        Nights are written newest first. With a deadline, the sync stops
+        before starting a night it cannot finish in time (judged by the
+        slowest night so far) and leaves the rest in self.remaining_sessions;
+        self.resume_before is then the start of the oldest night written.
+        The same happens when the Calendar API becomes unavailable (circuit
+        open or bulkhead full) after at least one night was written.
+        
+        Args:
+            summaries: Iterable of session summary dicts
+            deadline: time.monotonic() value to stop by (optional)
+            before: Only sync sessions starting before this datetime, e.g.
+                to resume a sync that stopped at its deadline (optional)
+            
+        Returns:
+            int: Number of events synced
+        """
+        summaries = sorted(summaries, key=lambda s: s['start'], reverse=True)
+        if before is not None:
+            summaries = [s for s in summaries if s['start'] < before]
+        if self.session_store is not None and self.user_email and summaries:
+            self.session_store.save(self.user_email, summaries)
+        
+        count = 0
+        synced = []
+        self.remaining_sessions = []
+        self.resume_before = None
+        slowest = None
+        for index, summary in enumerate(summaries):
+            # Always make progress on at least one night
+            if deadline is not None and index and \
+                    time.monotonic() + (slowest or self.SESSION_COST_ESTIMATE) > deadline:
+                self.remaining_sessions = summaries[index:]
+                self.resume_before = summaries[index - 1]['start']
+                break
+            started = time.monotonic()
             try:
-                start_raw = sample.get('startDate') or sample.get('start')
-                end_raw = sample.get('endDate') or sample.get('end')
-                if not start_raw or not end_raw:
-                    continue
-                
-                start = date_parser.parse(start_raw)
-                end = date_parser.parse(end_raw)
-                
-                if start.tzinfo is None:
-                    start = la_tz.localize(start)
-                else:
-                    start = start.astimezone(la_tz)
-                if end.tzinfo is None:
-                    end = la_tz.localize(end)
-                else:
-                    end = end.astimezone(la_tz)
-                
-                parsed_samples.append({
-                    'start': start,
-                    'end': end,
-                    'value': str(sample.get('value', 'Unknown')).strip(),
-                    'source': sample.get('sourceName', sample.get('source', '')).strip() or 'Apple Health'
-                })
-            except Exception:
+                session_count, complete = self._sync_session(summary)
+                count += session_count
+            except CalendarUnavailable:
+                # Defer the rest to a continuation; nothing done yet is an error
+                if not index:
+                    raise
+                self.remaining_sessions = summaries[index:]
+                self.resume_before = summaries[index - 1]['start']
+                break
+            except Exception as e:
+                print(f"Skip session: {e}", file=sys.stderr)
                 continue
+            finally:
+                slowest = max(slowest or 0.0, time.monotonic() - started)
+            if complete and summary.get('hash'):
+                synced.append((summary['start'], summary['hash']))
         
-        parsed_samples.sort(key=lambda x: x['start'])
+        if self.session_cache is not None and self.user_email and synced:
+            self.session_cache.mark_synced(self.user_email, synced)
+        return count
+    
+    def _sync_session(self, summary):
+        """
+        Insert the aggregated and stage events for one session if missing.
         
-        sessions = []
-        current_session = None
+        Returns:
+            (events inserted, whether every insert succeeded)
+        """
+        count = 0
+        complete = True
+        event, stage_events = render_session_events(summary)
         
-        for sample in parsed_samples:
-            if current_session is None:
-                current_session = {'start': sample['start'], 'end': sample['end'], 'intervals': [sample]}
-            else:
-                time_diff = sample['start'] - current_session['end']
-                if time_diff <= timedelta(hours=2) and time_diff >= timedelta(minutes=-30):
-                    current_session['end'] = max(current_session['end'], sample['end'])
-                    current_session['intervals'].append(sample)
-                else:
-                    sessions.append(current_session)
-                    current_session = {'start': sample['start'], 'end': sample['end'], 'intervals': [sample]}
+        time_min = (summary['aggregated_start'] - timedelta(minutes=5)).isoformat()
+        time_max = (summary['aggregated_end'] + timedelta(minutes=5)).isoformat()
+        existing_events = self._execute(self.service.events().list(
+            calendarId=self.calendar_id,
+            timeMin=time_min,
+            timeMax=time_max,
+            singleEvents=True
+        ))
+        
+        aggregated_exists = any(
+            is_aggregated_event(existing.get('summary', ''))
+            for existing in existing_events.get('items', []))
         
-        if current_session:
-            sessions.append(current_session)
+        if not aggregated_exists:
+            try:
+                self._execute(self.service.events().insert(calendarId=self.calendar_id, body=event))
+                count += 1
+            except HttpError as e:
+                complete = False
+                print(f"Error inserting aggregated event: {e}", file=sys.stderr)
         
-        return sessions
+        for interval, stage_emoji, stage_event in stage_events:
+            stage = interval['value']
+            stage_time_min = (interval['start'] - timedelta(minutes=1)).isoformat()
+            stage_time_max = (interval['end'] + timedelta(minutes=1)).isoformat()
+            existing_stage_events = self._execute(self.service.events().list(
+                calendarId=self.calendar_id,
+                timeMin=stage_time_min,
+                timeMax=stage_time_max,
+                singleEvents=True
+            ))
+            
+            stage_exists = False
+            for existing in existing_stage_events.get('items', []):
+                if existing.get('summary', '').startswith(stage_emoji) and stage in existing.get('summary', ''):
+                    stage_exists = True
+                    break
+            
+            if not stage_exists:
+                try:
+                    self._execute(self.service.events().insert(calendarId=self.calendar_id, body=stage_event))
+                    count += 1
+                except HttpError as e:
+                    complete = False
+                    print(f"Error inserting stage event ({stage}): {e}", file=sys.stderr)
+        
+        return count, complete
     
-    def sync_from_data(self, data, user_email=None, days=30):
+    def sync_from_data(self, data, user_email=None, days=30, deadline=None, before=None):
         """
         Sync sleep data from dict/list directly (not from file).
         
@@ -195,195 +636,403 @@ class SleepCalendar:
             data: Dict with 'samples' key or list of samples
             user_email: User email for calendar identification
             days: Number of days to look back for cutoff
+            deadline: time.monotonic() value to stop by (see sync_sessions)
+            before: Resume bound from an earlier partial sync (see sync_sessions)
             
         Returns:
             int: Number of events synced
         """
+        # Deferred: api.pipeline imports this module
+        from api.pipeline import CalendarSink, body_source, run_pipeline
         user_email = user_email or self.user_email
         self.user_email = user_email
         
-        # Handle different formats
-        if isinstance(data, dict) and 'samples' in data:
-            samples_raw = data['samples']
-        elif isinstance(data, list):
-            samples_raw = data
-        else:
-            samples_raw = []
-        
-        # If samples is a string (newline-delimited JSON), parse it
-        if isinstance(samples_raw, str):
-            samples = [json.loads(line) for line in samples_raw.strip().split('\n') if line.strip()]
-        elif isinstance(samples_raw, list):
-            samples = samples_raw
-        else:
-            samples = []
-        
         # Get/create calendar for this user
         self.calendar_id = self.get_or_create_calendar(user_email=user_email)
         
-        cutoff = datetime.now(timezone.utc) - timedelta(days=days)
-        la_tz = pytz.timezone('America/Los_Angeles')
+        known_hashes = None
+        if self.session_cache is not None and user_email:
+            known_hashes = self.session_cache.known_hashes(user_email)
         
-        sessions = self.group_sleep_sessions(samples, la_tz)
-        count = 0
+        archive = archived = None
+        if self.sample_archive is not None and user_email:
+            archive = partial(self.sample_archive.append_intervals, user_email)
+            archived = self.sample_archive.span(user_email)
         
-        for session in sessions:
-            try:
-                valid_stages = {'Core', 'Deep', 'REM'}
-                asleep_intervals = []
-                awake_intervals = []
-                
-                for i in session['intervals']:
-                    value = str(i.get('value', '')).strip()
-                    if value in valid_stages:
-                        asleep_intervals.append(i)
-                    elif value.lower() == 'awake':
-                        awake_intervals.append(i)
-                
-                if not asleep_intervals:
-                    continue
-                
-                total_asleep_min = sum(
-                    (i['end'] - i['start']).total_seconds() / 60
-                    for i in asleep_intervals
-                )
-                total_asleep_hours = total_asleep_min / 60
-                
-                stage_durations = {}
-                for i in asleep_intervals:
-                    stage = i['value']
-                    dur_min = (i['end'] - i['start']).total_seconds() / 60
-                    stage_durations[stage] = stage_durations.get(stage, 0) + dur_min
-                
-                aggregated_start = min(i['start'] for i in asleep_intervals)
-                aggregated_end = max(i['end'] for i in asleep_intervals)
-                
-                session_start = min(i['start'] for i in session['intervals'])
-                session_end = max(i['end'] for i in session['intervals'])
-                
-                session_start_utc = session_start.astimezone(timezone.utc)
-                if session_start_utc < cutoff:
-                    continue
-                
-                score, emoji = self.calculate_score(total_asleep_hours)
-                
-                if score >= 70:
-                    score_desc = 'Good (ideal 7-8 hours)'
-                elif score >= 50:
-                    score_desc = 'Fair (6-7 hours)'
-                else:
-                    score_desc = 'Poor (<6 hours or >10 hours)'
-                
-                stage_breakdown_lines = []
-                for stage_name in ['Core', 'Deep', 'REM']:
-                    if stage_name in stage_durations:
-                        mins = stage_durations[stage_name]
-                        stage_breakdown_lines.append(f'{stage_name}: {int(mins)} min ({mins/60:.1f} hr)')
-                
-                awake_total_min = sum((i['end'] - i['start']).total_seconds() / 60 for i in awake_intervals) if awake_intervals else 0
-                if awake_total_min > 0:
-                    stage_breakdown_lines.append(f'Awake: {int(awake_total_min)} min ({awake_total_min/60:.1f} hr)')
-                
-                all_sources = [i.get('source', 'Apple Health') for i in session['intervals']]
-                source = max(set(all_sources), key=all_sources.count) if all_sources else 'Apple Health'
-                
-                description_lines = [
-                    f'Sleep Score: {score}/100 ({score_desc})',
-                    f'',
-                    f'Time Asleep: {total_asleep_hours:.1f} hours ({int(total_asleep_min)} min)',
-                    f'Source: {source}',
-                    f'',
-                    f'Stage Breakdown:'
-                ]
-                description_lines.extend(stage_breakdown_lines)
-                description_lines.extend([
-                    f'',
-                    f'Score Breakdown:',
-                    f'🟢 70-100: Good sleep (7-8 hours ideal)',
-                    f'😴 50-69: Fair sleep (6-7 hours)',
-                    f'🔴 0-49: Poor sleep (<6 hours or >10 hours)'
-                ])
-                
-                event = {
-                    'summary': f'{emoji} Sleep ({total_asleep_hours:.1f}h)',
-                    'description': '\n'.join(description_lines),
-                    'start': {'dateTime': aggregated_start.isoformat(), 'timeZone': 'America/Los_Angeles'},
-                    'end': {'dateTime': aggregated_end.isoformat(), 'timeZone': 'America/Los_Angeles'},
-                }
-                
-                time_min = (aggregated_start - timedelta(minutes=5)).isoformat()
-                time_max = (aggregated_end + timedelta(minutes=5)).isoformat()
-                existing_events = self.service.events().list(
-                    calendarId=self.calendar_id,
-                    timeMin=time_min,
-                    timeMax=time_max,
-                    singleEvents=True
-                ).execute()
-                
-                aggregated_exists = False
-                for existing in existing_events.get('items', []):
-                    summary = existing.get('summary', '')
-                    if ('Sleep' in summary and ('🟢' in summary or '😴' in summary or '🔴' in summary)) and 'h)' in summary:
-                        aggregated_exists = True
-                        break
-                
-                if not aggregated_exists:
-                    try:
-                        self.service.events().insert(calendarId=self.calendar_id, body=event).execute()
-                        count += 1
-                    except HttpError as e:
-                        print(f"Error inserting aggregated event: {e}", file=sys.stderr)
-                
-                stage_emojis = {
-                    'Core': '💙',
-                    'Deep': '💜',
-                    'REM': '💤',
-                    'Awake': '🔴'
-                }
-                
-                for interval in session['intervals']:
-                    stage = interval['value']
-                    if not stage:
-                        continue
-                    
-                    interval_start = interval['start']
-                    interval_end = interval['end']
-                    duration_min = (interval_end - interval_start).total_seconds() / 60
-                    duration_hours = duration_min / 60
-                    
-                    stage_emoji = stage_emojis.get(stage, '⏱')
-                    
-                    stage_event = {
-                        'summary': f'{stage_emoji} {stage} ({duration_hours:.1f}h)',
-                        'description': f'Stage: {stage}\nDuration: {duration_min:.0f} min ({duration_hours:.1f} hours)\nSource: {interval.get("source", "Apple Health")}',
-                        'start': {'dateTime': interval_start.isoformat(), 'timeZone': 'America/Los_Angeles'},
-                        'end': {'dateTime': interval_end.isoformat(), 'timeZone': 'America/Los_Angeles'},
-                    }
-                    
-                    stage_time_min = (interval_start - timedelta(minutes=1)).isoformat()
-                    stage_time_max = (interval_end + timedelta(minutes=1)).isoformat()
-                    existing_stage_events = self.service.events().list(
-                        calendarId=self.calendar_id,
-                        timeMin=stage_time_min,
-                        timeMax=stage_time_max,
-                        singleEvents=True
-                    ).execute()
-                    
-                    stage_exists = False
-                    for existing in existing_stage_events.get('items', []):
-                        if existing.get('summary', '').startswith(stage_emoji) and stage in existing.get('summary', ''):
-                            stage_exists = True
-                            break
-                    
-                    if not stage_exists:
-                        try:
-                            self.service.events().insert(calendarId=self.calendar_id, body=stage_event).execute()
-                            count += 1
-                        except HttpError as e:
-                            print(f"Error inserting stage event ({stage}): {e}", file=sys.stderr)
-                
-            except Exception as e:
-                print(f"Skip session: {e}", file=sys.stderr)
+        return run_pipeline(body_source(data), CalendarSink(self, deadline=deadline, before=before),
+                            days=days, known_hashes=known_hashes, archive=archive, archived=archived,
+                            before=before)
+    
+    def sync_summaries(self, summaries, user_email=None, deadline=None, before=None):
+        """
+        Sync precomputed session summaries (e.g. from a worker process).
+        
+        Args:
+            summaries: List of session summaries from build_session_summaries
+            user_email: User email for calendar identification
+            deadline: time.monotonic() value to stop by (see sync_sessions)
+            before: Resume bound from an earlier partial sync (see sync_sessions)
+            
+        Returns:
+            int: Number of events synced
+        """
+        from api.pipeline import CalendarSink
+        user_email = user_email or self.user_email
+        self.user_email = user_email
+        self.calendar_id = self.get_or_create_calendar(user_email=user_email)
+        return CalendarSink(self, deadline=deadline, before=before).write(summaries)
+
+
+# Pipeline stages below are module-level (and free of API clients) so they can
+# run in worker processes, e.g. from batch_sync.py; api.pipeline chains them
+# between sources and sinks.
+
+STAGE_EMOJIS = {
+    'Core': '💙',
+    'Deep': '💜',
+    'REM': '💤',
+    'Awake': '🔴'
+}
+
+
+# Private extended property of aggregated events holding the unrounded minutes asleep
+ASLEEP_PROPERTY = 'asleepMinutes'
+
+
+def is_aggregated_event(summary_text):
+    """Whether an event title is a session's aggregated sleep event."""
+    return 'Sleep' in summary_text and any(emoji in summary_text for emoji in EMOJIS) and 'h)' in summary_text
+
+
+def load_samples(data):
+    """
+    Extract the sample list from an export/request payload.
+    
+    Args:
+        data: Dict with 'samples' key, list of samples, or either with
+            samples as a newline-delimited JSON string
+    """
+    # Handle different formats
+    if isinstance(data, dict) and 'samples' in data:
+        samples_raw = data['samples']
+    elif isinstance(data, list):
+        samples_raw = data
+    else:
+        samples_raw = []
+    
+    # If samples is a string (newline-delimited JSON), parse it
+    if isinstance(samples_raw, str):
+        return [json.loads(line) for line in samples_raw.strip().split('\n') if line.strip()]
+    elif isinstance(samples_raw, list):
+        return samples_raw
+    return []
+
+
+# Raw samples starting up to this long before the window are still parsed:
+# it covers the UTC offset of raw local times and nights that straddle the
+# cutoff, so only samples from nights clearly outside the window are dropped
+INGEST_MARGIN = timedelta(days=2)
+
+MONTHS = {name: number for number, name in enumerate(
+    ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'), 1)}
+
+
+def sample_day(raw):
+    """
+    'YYYY-MM-DD' of a raw start time read lexically, without full parsing.
+    
+    Recognises ISO 8601 ("2026-01-17T02:22:00", any offset) and the Shortcuts
+    export format ("Jan 17, 2026 at 02:22"); returns None for anything else.
+    """
+    if raw[4:5] == '-' and raw[7:8] == '-' and raw[:4].isdigit() and raw[5:7].isdigit() and raw[8:10].isdigit():
+        return raw[:10]
+    parts = raw.split(' ', 3)
+    if len(parts) >= 3 and parts[0][:3] in MONTHS:
+        day = parts[1].rstrip(',')
+        if day.isdigit() and parts[2][:4].isdigit():
+            return f'{parts[2][:4]}-{MONTHS[parts[0][:3]]:02d}-{int(day):02d}'
+    return None
+
+
+def skip_days(samples, *ranges):
+    """
+    Lazily drop raw samples whose start day (see sample_day) falls in any of
+    the [first, last) ranges of 'YYYY-MM-DD' strings (None: unbounded).
+    Samples whose day cannot be read cheaply are kept for full parsing.
+    """
+    for sample in samples:
+        try:
+            day = sample_day(sample.get('startDate') or sample.get('start'))
+        except Exception:
+            day = None
+        if day is not None and any((first is None or day >= first) and (last is None or day < last)
+                                   for first, last in ranges):
+            continue
+        yield sample
+
+
+def _day(moment):
+    """'YYYY-MM-DD' of a datetime, as compared against sample_day."""
+    return moment.date().isoformat()
+
+
+def parse_intervals(samples, la_tz):
+    """Yield samples as {'start', 'end', 'value', 'source'} in local time, skipping bad rows."""
+    for sample in samples:
+        try:
+            start_raw = sample.get('startDate') or sample.get('start')
+            end_raw = sample.get('endDate') or sample.get('end')
+            if not start_raw or not end_raw:
                 continue
+            
+            start = date_parser.parse(start_raw)
+            end = date_parser.parse(end_raw)
+            
+            if start.tzinfo is None:
+                start = la_tz.localize(start)
+            else:
+                start = start.astimezone(la_tz)
+            if end.tzinfo is None:
+                end = la_tz.localize(end)
+            else:
+                end = end.astimezone(la_tz)
+            
+            yield {
+                'start': start,
+                'end': end,
+                'value': str(sample.get('value', 'Unknown')).strip(),
+                'source': sample.get('sourceName', sample.get('source', '')).strip() or 'Apple Health'
+            }
+        except Exception:
+            continue
+
+
+def group_intervals(intervals):
+    """Yield sessions (one per night) from intervals sorted by start."""
+    current_session = None
+    
+    for sample in intervals:
+        if current_session is None:
+            current_session = {'start': sample['start'], 'end': sample['end'], 'intervals': [sample]}
+        else:
+            # Negative gaps are overlaps (another source reporting the same
+            # night) and always belong to the current session
+            time_diff = sample['start'] - current_session['end']
+            if time_diff <= timedelta(hours=2):
+                current_session['end'] = max(current_session['end'], sample['end'])
+                current_session['intervals'].append(sample)
+            else:
+                yield current_session
+                current_session = {'start': sample['start'], 'end': sample['end'], 'intervals': [sample]}
+    
+    if current_session:
+        yield current_session
+
+
+def sort_intervals(intervals):
+    """List of intervals sorted by start; input already in order (as exports are) is not re-sorted."""
+    intervals = list(intervals)
+    if any(later['start'] < earlier['start'] for earlier, later in zip(intervals, islice(intervals, 1, None))):
+        intervals.sort(key=lambda x: x['start'])
+    return intervals
+
+
+def group_sleep_sessions(samples, la_tz):
+    """Group sleep samples into sleep sessions (one per night)."""
+    return list(group_intervals(sort_intervals(parse_intervals(samples, la_tz))))
+
+
+def summarize_session(session):
+    """
+    Compute the totals needed to render a session's events.
+    
+    Returns:
+        dict, or None if the session has no asleep (Core/Deep/REM) time
+    """
+    valid_stages = {'Core', 'Deep', 'REM'}
+    asleep_intervals = []
+    awake_intervals = []
+    
+    for i in session['intervals']:
+        value = str(i.get('value', '')).strip()
+        if value in valid_stages:
+            asleep_intervals.append(i)
+        elif value.lower() == 'awake':
+            awake_intervals.append(i)
+    
+    if not asleep_intervals:
+        return None
+    
+    total_asleep_min = sum(
+        (i['end'] - i['start']).total_seconds() / 60
+        for i in asleep_intervals
+    )
+    
+    stage_durations = {}
+    for i in asleep_intervals:
+        stage = i['value']
+        dur_min = (i['end'] - i['start']).total_seconds() / 60
+        stage_durations[stage] = stage_durations.get(stage, 0) + dur_min
+    
+    all_sources = [i.get('source', 'Apple Health') for i in session['intervals']]
+    source = max(set(all_sources), key=all_sources.count) if all_sources else 'Apple Health'
+    
+    return {
+        'start': min(i['start'] for i in session['intervals']),
+        'end': max(i['end'] for i in session['intervals']),
+        'aggregated_start': min(i['start'] for i in asleep_intervals),
+        'aggregated_end': max(i['end'] for i in asleep_intervals),
+        'total_asleep_min': total_asleep_min,
+        'stage_durations': stage_durations,
+        'awake_total_min': sum((i['end'] - i['start']).total_seconds() / 60 for i in awake_intervals),
+        'source': source,
+        'intervals': session['intervals'],
+    }
+
+
+def iter_session_summaries(samples, days=30, now=None, known_hashes=None, archive=None, archived=None,
+                           before=None):
+    """
+    Parse, group and summarize samples, yielding sessions inside the window.
+    
+    The window is pushed down to ingestion: samples from nights clearly
+    outside it are dropped on a lexical check of their raw start time,
+    before any full date parsing, so a long export costs about as much as
+    the window it is synced with.
+    
+    Args:
+        samples: Iterable of raw sample dicts
+        days: Number of days to look back for cutoff
+        now: Reference time (defaults to current UTC time)
+        known_hashes: Session hashes already synced; matching nights are
+            skipped before summarizing (see api.session_cache)
+        archive: Called with every parsed interval, sorted by start, before
+            the cutoff applies, e.g. to keep raw history (see api.sample_archive)
+        archived: (first, last) start datetimes the archive already holds
+            (see SampleArchive.span); with an archive, older samples are
+            only skipped inside that span, otherwise all are parsed
+        before: Only sessions starting before this datetime, e.g. to resume
+            a partial sync (optional)
+    """
+    la_tz = pytz.timezone('America/Los_Angeles')
+    now = now or datetime.now(timezone.utc)
+    since = _day(now - timedelta(days=days) - INGEST_MARGIN)
+    if archive is None:
+        ranges = [(None, since)]
+        if before is not None:
+            ranges.append((_day(before + INGEST_MARGIN), None))
+        samples = skip_days(samples, *ranges)
+    elif archived is not None:
+        # History the archive already covers is not re-read
+        first, last = archived
+        samples = skip_days(samples, (_day(first + INGEST_MARGIN), min(since, _day(last - INGEST_MARGIN))))
+    intervals = sort_intervals(parse_intervals(samples, la_tz))
+    if archive is not None:
+        archive(intervals)
+    return summarize_intervals(intervals, days=days, now=now, known_hashes=known_hashes, before=before)
+
+
+def summarize_intervals(intervals, days=30, now=None, known_hashes=None, before=None):
+    """
+    Group and summarize parsed intervals (sorted by start), yielding sessions
+    inside the window; see iter_session_summaries.
+    """
+    cutoff = (now or datetime.now(timezone.utc)) - timedelta(days=days)
+    
+    for session in group_intervals(intervals):
+        if session['start'].astimezone(timezone.utc) < cutoff:
+            continue
+        if before is not None and session['start'] >= before:
+            continue
+        digest = None
+        if known_hashes is not None:
+            digest = session_hash(session)
+            if digest in known_hashes:
+                continue
+        try:
+            # Watch, phone and app samples overlap: keep one timeline per night
+            summary = summarize_session(dict(session, intervals=merge_intervals(session['intervals'])))
+        except Exception as e:
+            print(f"Skip session: {e}", file=sys.stderr)
+            continue
+        if summary is None:
+            continue
+        summary['hash'] = digest
+        yield summary
+
+
+def build_session_summaries(samples, days=30, now=None, known_hashes=None, archive=None, archived=None,
+                            before=None):
+    """List form of iter_session_summaries, e.g. to return from a worker process."""
+    return list(iter_session_summaries(samples, days=days, now=now, known_hashes=known_hashes, archive=archive,
+                                       archived=archived, before=before))
+
+
+def render_session_events(summary):
+    """
+    Render Calendar event bodies for a session summary.
+    
+    Returns:
+        (aggregated_event, [(interval, stage_emoji, stage_event), ...])
+    """
+    total_asleep_min = summary['total_asleep_min']
+    total_asleep_hours = total_asleep_min / 60
+    stage_durations = summary['stage_durations']
+    
+    score, emoji = calculate_score(total_asleep_hours)
+    score_desc = SCORE_DESCRIPTIONS[default_curve.emoji_code(score)]
+    
+    stage_breakdown_lines = []
+    for stage_name in ['Core', 'Deep', 'REM']:
+        if stage_name in stage_durations:
+            mins = stage_durations[stage_name]
+            stage_breakdown_lines.append(f'{stage_name}: {int(mins)} min ({mins/60:.1f} hr)')
+    
+    awake_total_min = summary['awake_total_min']
+    if awake_total_min > 0:
+        stage_breakdown_lines.append(f'Awake: {int(awake_total_min)} min ({awake_total_min/60:.1f} hr)')
+    
+    description_lines = [
+        f'Sleep Score: {score}/100 ({score_desc})',
+        f'',
+        f'Time Asleep: {total_asleep_hours:.1f} hours ({int(total_asleep_min)} min)',
+        f'Source: {summary["source"]}',
+        f'',
+        f'Stage Breakdown:'
+    ]
+    description_lines.extend(stage_breakdown_lines)
+    description_lines.extend([
+        f'',
+        f'Score Breakdown:',
+        f'🟢 70-100: Good sleep (7-8 hours ideal)',
+        f'😴 50-69: Fair sleep (6-7 hours)',
+        f'🔴 0-49: Poor sleep (<6 hours or >10 hours)'
+    ])
+    
+    event = {
+        'summary': f'{emoji} Sleep ({total_asleep_hours:.1f}h)',
+        'description': '\n'.join(description_lines),
+        'start': {'dateTime': summary['aggregated_start'].isoformat(), 'timeZone': 'America/Los_Angeles'},
+        'end': {'dateTime': summary['aggregated_end'].isoformat(), 'timeZone': 'America/Los_Angeles'},
+        # Exact duration that was scored, so rescore.py need not parse the rounded text
+        'extendedProperties': {'private': {ASLEEP_PROPERTY: repr(total_asleep_min)}},
+    }
+    
+    stage_events = []
+    for interval in summary['intervals']:
+        stage = interval['value']
+        if not stage:
+            continue
         
-        return count
+        duration_min = (interval['end'] - interval['start']).total_seconds() / 60
+        duration_hours = duration_min / 60
+        stage_emoji = STAGE_EMOJIS.get(stage, '⏱')
+        
+        stage_events.append((interval, stage_emoji, {
+            'summary': f'{stage_emoji} {stage} ({duration_hours:.1f}h)',
+            'description': f'Stage: {stage}\nDuration: {duration_min:.0f} min ({duration_hours:.1f} hours)\nSource: {interval.get("source", "Apple Health")}',
+            'start': {'dateTime': interval['start'].isoformat(), 'timeZone': 'America/Los_Angeles'},
+            'end': {'dateTime': interval['end'].isoformat(), 'timeZone': 'America/Los_Angeles'},
+        }))
+    
+    return event, stage_events
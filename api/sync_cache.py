@@ -0,0 +1,106 @@
+"""Content-addressed cache of recent sync results."""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from api import codec
+from api.db import per_worker
+
+
+class PayloadCache:
+    """
+    LRU cache with TTL, keyed by (email, fingerprint of the samples).
+
+    Shortcut automations and iOS retries re-send identical payloads; a hit
+    returns the previous result without parsing or touching the Calendar API.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 6 * 3600):
+        """
+        Initialize payload cache.
+
+        Args:
+            max_entries: Entries kept before least-recently-used eviction
+            ttl_seconds: Age after which an entry is treated as a miss
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def fingerprint(samples) -> str:
+        """
+        Hash samples independent of key order, sample order and whitespace.
+
+        Args:
+            samples: List of sample dicts or codec.Sample objects, or a
+                newline-delimited JSON string
+        """
+        if isinstance(samples, str):
+            samples = codec.decode_ndjson(samples)
+        digest = hashlib.sha256()
+        for line in sorted(codec.canonical(sample) for sample in samples):
+            digest.update(line)
+            digest.update(b'\n')
+        return digest.hexdigest()
+
+    @staticmethod
+    def _key(email: str, fingerprint: str) -> Tuple[str, str]:
+        return (email.strip().lower(), fingerprint)
+
+    def get(self, email: str, fingerprint: str) -> Optional[Any]:
+        """Return the cached result, or None on a miss or expired entry."""
+        key = self._key(email, fingerprint)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or now - entry[0] > self.ttl_seconds:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, email: str, fingerprint: str, value: Any):
+        """Store a result, evicting the least recently used entries if full."""
+        key = self._key(email, fingerprint)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop all entries and reset counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for the metrics endpoint."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+# Global payload cache instance; in process memory, so its size is split between workers
+payload_cache = PayloadCache(
+    max_entries=per_worker(os.getenv('SYNC_CACHE_SIZE', '1024')),
+    ttl_seconds=float(os.getenv('SYNC_CACHE_TTL', str(6 * 3600)))
+)
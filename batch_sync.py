@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""Batch sync many users' sleep exports to their per-user calendars."""
+
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from api.calendar_directory import calendar_directory
+from api.credential_pool import CredentialPool
+from api.pipeline import BatchSink
+from api.quota import QuotaPacer
+from api.sleep_calendar import SleepCalendar, build_session_summaries, load_samples
+
+
+def load_jobs(source):
+    """
+    Resolve (email, export_path) jobs from a directory or manifest.
+
+    A directory holds one ``<email>.json`` export per user. A manifest is a
+    JSON object mapping email to export path, or a list of
+    ``{"email": ..., "file": ...}`` entries; relative paths resolve against
+    the manifest's directory.
+    """
+    if os.path.isdir(source):
+        return [
+            (name[:-len('.json')], os.path.join(source, name))
+            for name in sorted(os.listdir(source))
+            if name.endswith('.json') and '@' in name
+        ]
+
+    with open(source, 'r') as f:
+        manifest = json.load(f)
+    base = os.path.dirname(os.path.abspath(source))
+    if isinstance(manifest, dict):
+        entries = sorted(manifest.items())
+    else:
+        entries = [(entry['email'], entry['file']) for entry in manifest]
+    return [(email, os.path.join(base, path)) for email, path in entries]
+
+
+def load_checkpoint(path):
+    """Return emails already synced successfully according to the checkpoint."""
+    done = set()
+    if path and os.path.exists(path):
+        with open(path, 'r') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if record.get('status') == 'ok':
+                    done.add(record['email'])
+    return done
+
+
+def parse_export(export_path, days):
+    """Parse and group one export (runs in a worker process)."""
+    with open(export_path, 'r') as f:
+        data = json.load(f)
+    return build_session_summaries(load_samples(data), days=days)
+
+
+def write_sessions(email, summaries, credential_pool, pacer, directory=None):
+    """
+    Write one user's sessions to their calendar (runs in an I/O thread).
+
+    Missing events are inserted and nights already on the calendar are
+    patched where the rendered title, description or asleep minutes changed
+    (e.g. after a fixed export or a new scoring curve), both in batches.
+    """
+    cal = SleepCalendar(user_email=email, credential_pool=credential_pool, pacer=pacer,
+                        calendar_directory=directory)
+    cal.calendar_id = cal.get_or_create_calendar(user_email=email)
+    return cal.calendar_id, BatchSink(cal, update=True).write(summaries)
+
+
+class BatchSync:
+    """Run the parse/group stage in processes and Calendar I/O in threads."""
+
+    def __init__(self, jobs, days=30, workers=None, io_workers=8, checkpoint=None,
+                 credential_pool=None, pacer=None, calendar_directory=None):
+        """
+        Initialize batch sync.
+
+        Args:
+            jobs: List of (email, export_path)
+            days: Number of days to look back for cutoff
+            workers: Parse processes (default: CPU count)
+            io_workers: Concurrent Calendar writers
+            checkpoint: Path of JSON-lines progress file used to resume;
+                None syncs every job
+            credential_pool: CredentialPool for per-user accounts (optional)
+            pacer: QuotaPacer shared by all writers (optional)
+            calendar_directory: CalendarDirectory pinning users to the account
+                that holds their calendar (optional)
+        """
+        self.jobs = jobs
+        self.days = days
+        self.workers = workers or os.cpu_count() or 1
+        self.io_workers = io_workers
+        self.checkpoint = checkpoint
+        self.credential_pool = credential_pool
+        self.pacer = pacer or QuotaPacer()
+        self.calendar_directory = calendar_directory
+
+    def _record(self, record):
+        """Append a per-user result to the checkpoint file."""
+        if self.checkpoint:
+            with open(self.checkpoint, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+
+    def run(self):
+        """Sync all pending jobs and return a summary report."""
+        started = time.monotonic()
+        done = load_checkpoint(self.checkpoint)
+        pending = [(email, path) for email, path in self.jobs if email not in done]
+        report = {
+            'users_total': len(self.jobs),
+            'users_skipped': len(self.jobs) - len(pending),
+            'users_synced': 0,
+            'users_failed': 0,
+            'events_synced': 0,
+            'failures': [],
+        }
+
+        with ProcessPoolExecutor(max_workers=self.workers) as parse_pool, \
+                ThreadPoolExecutor(max_workers=self.io_workers) as io_pool:
+            parse_futures = {
+                parse_pool.submit(parse_export, path, self.days): email
+                for email, path in pending
+            }
+            io_futures = {}
+            for future in as_completed(parse_futures):
+                email = parse_futures[future]
+                try:
+                    summaries = future.result()
+                except Exception as e:
+                    self._fail(report, email, 'parse', e)
+                    continue
+                io_futures[io_pool.submit(
+                    write_sessions, email, summaries, self.credential_pool, self.pacer,
+                    self.calendar_directory)] = email
+
+            for future in as_completed(io_futures):
+                email = io_futures[future]
+                try:
+                    calendar_id, events_synced = future.result()
+                except Exception as e:
+                    self._fail(report, email, 'sync', e)
+                    continue
+                report['users_synced'] += 1
+                report['events_synced'] += events_synced
+                self._record({'email': email, 'status': 'ok', 'calendar_id': calendar_id,
+                              'events_synced': events_synced})
+
+        report['elapsed_seconds'] = round(time.monotonic() - started, 3)
+        return report
+
+    def _fail(self, report, email, stage, error):
+        """Record a failed user; failures are retried on the next run."""
+        print(f"Error syncing {email} ({stage}): {error}", file=sys.stderr)
+        report['users_failed'] += 1
+        report['failures'].append({'email': email, 'stage': stage, 'error': str(error)})
+        self._record({'email': email, 'status': 'error', 'stage': stage, 'error': str(error)})
+
+
+def main():
+    """Main entry point."""
+    import argparse
+    parser = argparse.ArgumentParser(description="Batch sync sleep exports for many users")
+    parser.add_argument("source", help="Directory of <email>.json exports, or a JSON manifest")
+    parser.add_argument("--days", type=int, default=30, help="Days to look back per user")
+    parser.add_argument("--workers", type=int, default=None, help="Parse processes (default: CPU count)")
+    parser.add_argument("--io-workers", type=int, default=8, help="Concurrent Calendar writers")
+    parser.add_argument("--qps-per-account", type=float, default=5.0, help="Calendar calls/second per service account")
+    parser.add_argument("--checkpoint", default=None,
+                        help="Progress file: users it records as synced are skipped, new results are appended "
+                             "(default: none, sync everyone)")
+    parser.add_argument("--report", default=None, help="Write the summary report to this JSON file")
+    args = parser.parse_args()
+
+    runner = BatchSync(
+        load_jobs(args.source),
+        days=args.days,
+        workers=args.workers,
+        io_workers=args.io_workers,
+        checkpoint=args.checkpoint,
+        credential_pool=CredentialPool.from_env(),
+        pacer=QuotaPacer(requests_per_second=args.qps_per_account),
+        calendar_directory=calendar_directory,
+    )
+    report = runner.run()
+
+    print(json.dumps(report, indent=2))
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+    print(f"✅ Synced {report['events_synced']} events for {report['users_synced']} users "
+          f"({report['users_skipped']} already done, {report['users_failed']} failed)")
+    return 1 if report['users_failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Benchmark reprocessing history from the sample archive vs. raw JSON.
+
+Builds an archive of --users users with --nights nights each, then times
+re-grouping and re-summarizing every user from the memory-mapped columns,
+optionally across worker processes, against re-parsing one user's raw JSON.
+
+    python -m benchmarks.archive_reprocess --users 1000 --nights 730 --workers 8
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from api import sample_archive
+from api.sleep_calendar import build_session_summaries, parse_intervals, pytz
+from benchmarks.datasets import generate_samples
+
+
+def reprocess(root, emails):
+    """Summarize users from the archive (runs in a worker process)."""
+    archive = sample_archive.SampleArchive(root)
+    return sum(len(archive.summaries(email)) for email in emails)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sample archive reprocessing")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--nights", type=int, default=730)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--output", default=None, help="Write results JSON here")
+    args = parser.parse_args()
+
+    samples = generate_samples(args.nights)
+    raw = json.dumps({'samples': samples})
+    with tempfile.TemporaryDirectory() as root:
+        archive = sample_archive.SampleArchive(root)
+        intervals = list(parse_intervals(samples, pytz.timezone('America/Los_Angeles')))
+        emails = [f'user{i}@example.com' for i in range(args.users)]
+        for email in emails:
+            archive.append_intervals(email, intervals)
+        size = sum(os.path.getsize(os.path.join(path, name))
+                   for path, _, names in os.walk(root) for name in names)
+
+        started = time.perf_counter()
+        build_session_summaries(json.loads(raw)['samples'], days=args.nights + 1)
+        raw_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        if args.workers > 1:
+            chunks = [emails[i::args.workers] for i in range(args.workers)]
+            with ProcessPoolExecutor(max_workers=args.workers) as pool:
+                nights = sum(pool.map(reprocess, [root] * len(chunks), chunks))
+        else:
+            nights = reprocess(root, emails)
+        archive_seconds = time.perf_counter() - started
+
+    results = {
+        'users': args.users,
+        'nights_per_user': args.nights,
+        'samples_per_user': len(samples),
+        'workers': args.workers,
+        'numpy': sample_archive.np is not None,
+        'archive_bytes': size,
+        'raw_json_bytes_per_user': len(raw),
+        'nights_summarized': nights,
+        'raw_json_seconds_per_user': round(raw_seconds, 4),
+        'archive_seconds_total': round(archive_seconds, 3),
+        'archive_seconds_per_user': round(archive_seconds / args.users, 4),
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Track cold-start cost against a budget.
+
+Measures, each in a fresh interpreter:
+- import time of ``api.server``
+- startup (lifespan warm-up) time
+- latency of the first and second /sync against the local fake Calendar API
+
+Exits non-zero when a median exceeds its budget, so it can gate CI:
+
+    python -m benchmarks.cold_start --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.fake_calendar import FakeCalendarServer
+from benchmarks.run import git_revision
+
+# Milliseconds; medians above these fail the run
+DEFAULT_BUDGETS = {
+    'import_ms': 750,
+    'startup_ms': 300,
+    'first_request_ms': 400,
+}
+
+PROBE = r'''
+import json, sys, time
+started = time.perf_counter()
+import api.server
+import_ms = (time.perf_counter() - started) * 1000
+
+from functools import partial
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from google.auth.credentials import AnonymousCredentials
+from api.sleep_calendar import SleepCalendar
+from benchmarks.datasets import generate_samples
+
+endpoint = sys.argv[1]
+body = {"email": "cold@example.com", "samples": generate_samples(1)}
+with patch("api.server.SleepCalendar", partial(SleepCalendar, credentials=AnonymousCredentials(), api_endpoint=endpoint)):
+    started = time.perf_counter()
+    with TestClient(api.server.app) as client:
+        startup_ms = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        client.post("/sync", json=body).raise_for_status()
+        first_request_ms = (time.perf_counter() - started) * 1000
+        body["email"] = "warm@example.com"
+        started = time.perf_counter()
+        client.post("/sync", json=body).raise_for_status()
+        second_request_ms = (time.perf_counter() - started) * 1000
+
+print(json.dumps({"import_ms": import_ms, "startup_ms": startup_ms,
+                  "first_request_ms": first_request_ms, "second_request_ms": second_request_ms}))
+'''
+
+
+def probe(endpoint):
+    """Run one cold start in a fresh interpreter and return its timings."""
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ, SLEEP_CALENDAR_DB=os.path.join(workdir, 'cold.db'), PYTHONWARNINGS='ignore')
+        env.pop('GOOGLE_CALENDAR_CREDENTIALS', None)
+        output = subprocess.check_output([sys.executable, '-c', PROBE, endpoint], env=env, text=True)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Measure import time and first-request latency against budgets")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to measure")
+    for name, budget in DEFAULT_BUDGETS.items():
+        parser.add_argument(f"--{name.replace('_', '-')}-budget", dest=name, type=float, default=budget,
+                            help=f"Budget for median {name} (default {budget})")
+    parser.add_argument("--output", default=None, help="Results JSON path")
+    args = parser.parse_args()
+
+    with FakeCalendarServer() as fake:
+        runs = []
+        for _ in range(args.runs):
+            fake.state.reset()
+            runs.append(probe(fake.url))
+
+    medians = {metric: round(statistics.median(r[metric] for r in runs), 1) for metric in runs[0]}
+    over_budget = {name: medians[name] for name in DEFAULT_BUDGETS if medians[name] > getattr(args, name)}
+    for metric, value in medians.items():
+        budget = getattr(args, metric, None)
+        status = '' if budget is None else (' OVER BUDGET' if metric in over_budget else f' (budget {budget:.0f})')
+        print(f"{metric}: {value} ms{status}")
+
+    revision = git_revision()
+    output = args.output or os.path.join('benchmarks', 'results', f'cold_start_{revision}.json')
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({'revision': revision, 'medians_ms': medians, 'budgets_ms': {n: getattr(args, n) for n in DEFAULT_BUDGETS},
+                   'over_budget': over_budget, 'runs': runs}, f, indent=2)
+    print(f"Results written to {output}")
+    return 1 if over_budget else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,51 @@
+"""Synthetic HealthKit sleep sample generators for benchmarks."""
+import random
+from datetime import datetime, timedelta
+
+STAGES = ['Core', 'Deep', 'REM', 'Core', 'Awake']
+
+
+def night_samples(night_start, rng, sources=('Apple Watch',)):
+    """One night of consecutive stage samples (~7.5 hours)."""
+    samples = []
+    current = night_start
+    end_of_night = night_start + timedelta(hours=7, minutes=rng.randint(0, 60))
+    while current < end_of_night:
+        duration = timedelta(minutes=rng.randint(5, 40))
+        stage = rng.choice(STAGES)
+        for source in sources:
+            samples.append({
+                'startDate': current.strftime('%Y-%m-%dT%H:%M:%S'),
+                'endDate': (current + duration).strftime('%Y-%m-%dT%H:%M:%S'),
+                'value': stage,
+                'sourceName': source,
+            })
+        current += duration
+    return samples
+
+
+def generate_samples(nights, end=None, seed=0, sources=('Apple Watch',)):
+    """
+    Generate `nights` nights of samples ending at `end` (default: now).
+
+    Args:
+        nights: Number of nights
+        end: Morning of the last night (naive local time)
+        seed: Random seed, so runs are reproducible
+        sources: Source names; each stage is reported once per source
+    """
+    rng = random.Random(seed)
+    end = end or datetime.now().replace(hour=8, minute=0, second=0, microsecond=0)
+    samples = []
+    for night in range(nights, 0, -1):
+        start = end - timedelta(days=night - 1, hours=9) + timedelta(minutes=rng.randint(-60, 60))
+        samples.extend(night_samples(start, rng, sources))
+    return samples
+
+
+def generate_users(users, nights, seed=0):
+    """Generate {email: samples} for many users."""
+    return {
+        f'user{i}@example.com': generate_samples(nights, seed=seed + i)
+        for i in range(users)
+    }
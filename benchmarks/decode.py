@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark /sync request decoding: pydantic + json vs. the fast codec.
+
+For each payload size, times decoding a JSON-list body and an NDJSON body
+and records the tracemalloc peak, for the previous path (json.loads and
+SyncRequest validation into dicts) and api.codec.decode_sync_body.
+
+    python -m benchmarks.decode --sizes 1000,50000,500000
+"""
+import argparse
+import gc
+import json
+import sys
+import time
+import tracemalloc
+
+from api import codec
+from api.models import SyncRequest
+from benchmarks.datasets import generate_samples
+
+
+def baseline(body):
+    """The previous /sync decode: stdlib json, then pydantic into dicts."""
+    return SyncRequest.model_validate(json.loads(body)).samples
+
+
+def fast(body):
+    return codec.decode_sync_body(body)['samples']
+
+
+def measure(decode, body, repeat):
+    """Best wall time over `repeat` runs, and peak traced allocation of one run."""
+    best = float('inf')
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        decode(body)
+        best = min(best, time.perf_counter() - started)
+    gc.collect()
+    tracemalloc.start()
+    decode(body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'seconds': round(best, 4), 'peak_mb': round(peak / 2**20, 2)}
+
+
+def payloads(size):
+    """JSON-list and NDJSON bodies with `size` samples."""
+    samples = []
+    nights = 1
+    while len(samples) < size:
+        nights *= 2
+        samples = generate_samples(nights)
+    samples = samples[:size]
+    ndjson = '\n'.join(json.dumps(sample) for sample in samples)
+    return {
+        'list': json.dumps({'email': 'user@example.com', 'samples': samples}).encode('utf-8'),
+        'ndjson': json.dumps({'email': 'user@example.com', 'samples': ndjson}).encode('utf-8'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /sync body decoding")
+    parser.add_argument("--sizes", default="1000,50000,500000", help="Comma-separated sample counts")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default=None, help="Write results JSON here")
+    args = parser.parse_args()
+
+    results = {'backend': codec.BACKEND, 'runs': []}
+    for size in [int(size) for size in args.sizes.split(',')]:
+        for shape, body in payloads(size).items():
+            run = {'samples': size, 'shape': shape, 'bytes': len(body)}
+            run['pydantic'] = measure(baseline, body, args.repeat)
+            run['codec'] = measure(fast, body, args.repeat)
+            run['speedup'] = round(run['pydantic']['seconds'] / max(run['codec']['seconds'], 1e-9), 1)
+            results['runs'].append(run)
+            print(json.dumps(run))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,389 @@
+"""
+Local fake of the Google Calendar v3 REST API for offline benchmarks.
+
+Implements the calendarList, calendars, acl and events endpoints used by
+this project plus the multipart batch endpoint, with configurable latency
+and error injection. Point a client at it with
+``SleepCalendar(credentials=AnonymousCredentials(), api_endpoint=server.url)``.
+"""
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime
+from email.parser import Parser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+
+def _parse_time(value):
+    """Parse an RFC 3339 timestamp (as sent by the client)."""
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+class FakeCalendarState:
+    """In-memory calendars, events and ACLs plus call accounting."""
+
+    def __init__(self, owner='fake-service-account@example.iam.gserviceaccount.com'):
+        self.owner = owner
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Drop all data and counters."""
+        with self.lock:
+            self.calendars = {}
+            self.calls = {}
+            self.http_requests = 0
+            self.bytes_in = 0
+            self.bytes_out = 0
+            self.errors_injected = 0
+
+    def reset_counters(self):
+        """Reset call and byte counters but keep the data."""
+        with self.lock:
+            self.calls = {}
+            self.http_requests = 0
+            self.bytes_in = 0
+            self.bytes_out = 0
+            self.errors_injected = 0
+
+    def count(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def stats(self):
+        """Counters for benchmark reports."""
+        with self.lock:
+            return {
+                'api_calls': sum(n for name, n in self.calls.items() if name != 'batch'),
+                'http_requests': self.http_requests,
+                'calls_by_endpoint': dict(sorted(self.calls.items())),
+                'bytes_in': self.bytes_in,
+                'bytes_out': self.bytes_out,
+                'errors_injected': self.errors_injected,
+                'calendars': len(self.calendars),
+                'events': sum(len(c['events']) for c in self.calendars.values()),
+            }
+
+
+ROUTES = [
+    ('GET', re.compile(r'^/users/me/calendarList$'), 'calendarList.list'),
+    ('POST', re.compile(r'^/calendars$'), 'calendars.insert'),
+    ('GET', re.compile(r'^/calendars/([^/]+)$'), 'calendars.get'),
+    ('PATCH', re.compile(r'^/calendars/([^/]+)$'), 'calendars.patch'),
+    ('PUT', re.compile(r'^/calendars/([^/]+)$'), 'calendars.patch'),
+    ('DELETE', re.compile(r'^/calendars/([^/]+)$'), 'calendars.delete'),
+    ('GET', re.compile(r'^/calendars/([^/]+)/acl$'), 'acl.list'),
+    ('POST', re.compile(r'^/calendars/([^/]+)/acl$'), 'acl.insert'),
+    ('GET', re.compile(r'^/calendars/([^/]+)/events$'), 'events.list'),
+    ('POST', re.compile(r'^/calendars/([^/]+)/events$'), 'events.insert'),
+    ('POST', re.compile(r'^/calendars/([^/]+)/events/([^/]+)/move$'), 'events.move'),
+    ('PATCH', re.compile(r'^/calendars/([^/]+)/events/([^/]+)$'), 'events.patch'),
+    ('PUT', re.compile(r'^/calendars/([^/]+)/events/([^/]+)$'), 'events.patch'),
+    ('DELETE', re.compile(r'^/calendars/([^/]+)/events/([^/]+)$'), 'events.delete'),
+]
+
+
+class FakeCalendarAPI:
+    """Request dispatcher shared by plain and batched calls."""
+
+    def __init__(self, state, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503, seed=0):
+        """
+        Initialize the fake API.
+
+        Args:
+            state: FakeCalendarState
+            latency: Seconds added to every HTTP round trip
+            jitter: Extra uniform random latency (seconds)
+            error_rate: Fraction of calls answered with error_status
+            error_status: HTTP status used for injected errors (e.g. 429, 503)
+            seed: Random seed for jitter and error injection
+        """
+        self.state = state
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def delay(self):
+        """Sleep for the configured latency."""
+        with self._rng_lock:
+            extra = self._rng.uniform(0, self.jitter) if self.jitter else 0.0
+        if self.latency or extra:
+            time.sleep(self.latency + extra)
+
+    def _inject_error(self):
+        if not self.error_rate:
+            return False
+        with self._rng_lock:
+            return self._rng.random() < self.error_rate
+
+    def dispatch(self, method, path, query, body):
+        """Handle one API call and return (status, response dict)."""
+        for route_method, pattern, name in ROUTES:
+            match = pattern.match(path) if route_method == method else None
+            if match:
+                break
+        else:
+            return 404, {'error': {'code': 404, 'message': f'No route for {method} {path}'}}
+
+        args = [unquote(group) for group in match.groups()]
+        with self.state.lock:
+            self.state.count(name)
+            if self._inject_error():
+                self.state.errors_injected += 1
+                return self.error_status, {'error': {'code': self.error_status, 'message': 'Injected error'}}
+            handler = getattr(self, '_' + name.replace('.', '_'))
+            return handler(query, body, *args)
+
+    # Handlers run with state.lock held
+
+    def _calendar(self, calendar_id):
+        return self.state.calendars.get(calendar_id)
+
+    def _not_found(self):
+        return 404, {'error': {'code': 404, 'message': 'Not Found'}}
+
+    @staticmethod
+    def _page(items, query, default_size):
+        """Apply maxResults/pageToken paging to a list."""
+        size = int(query.get('maxResults', [default_size])[0])
+        offset = int(query.get('pageToken', ['0'])[0])
+        page = {'items': items[offset:offset + size]}
+        if offset + size < len(items):
+            page['nextPageToken'] = str(offset + size)
+        return page
+
+    def _calendarList_list(self, query, body):
+        items = [
+            {'id': cal_id, 'summary': cal['summary'], 'accessRole': 'owner', 'timeZone': cal['timeZone']}
+            for cal_id, cal in self.state.calendars.items()
+        ]
+        return 200, self._page(items, query, 100)
+
+    def _calendars_insert(self, query, body):
+        cal_id = f'{uuid.uuid4().hex}@group.calendar.google.com'
+        self.state.calendars[cal_id] = {
+            'summary': body.get('summary', ''),
+            'timeZone': body.get('timeZone', 'UTC'),
+            'events': {},
+            'acl': [{'scope': {'type': 'user', 'value': self.state.owner}, 'role': 'owner'}],
+        }
+        return 200, {'id': cal_id, 'summary': body.get('summary', ''), 'timeZone': body.get('timeZone', 'UTC')}
+
+    def _calendars_get(self, query, body, calendar_id):
+        cal = self._calendar(calendar_id)
+        if cal is None:
+            return self._not_found()
+        return 200, {'id': calendar_id, 'summary': cal['summary'], 'timeZone': cal['timeZone']}
+
+    def _calendars_patch(self, query, body, calendar_id):
+        cal = self._calendar(calendar_id)
+        if cal is None:
+            return self._not_found()
+        for key in ('summary', 'timeZone', 'description'):
+            if key in body:
+                cal[key] = body[key]
+        return 200, {'id': calendar_id, 'summary': cal['summary'], 'timeZone': cal['timeZone']}
+
+    def _calendars_delete(self, query, body, calendar_id):
+        if self.state.calendars.pop(calendar_id, None) is None:
+            return self._not_found()
+        return 204, None
+
+    def _acl_list(self, query, body, calendar_id):
+        cal = self._calendar(calendar_id)
+        if cal is None:
+            return self._not_found()
+        return 200, {'items': list(cal['acl'])}
+
+    def _acl_insert(self, query, body, calendar_id):
+        cal = self._calendar(calendar_id)
+        if cal is None:
+            return self._not_found()
+        rule = dict(body, id=f"{body['scope']['type']}:{body['scope'].get('value', '')}")
+        cal['acl'].append(rule)
+        return 200, rule
+
+    def _events_list(self, query, body, calendar_id):
+        cal = self._calendar(calendar_id)
+        if cal is None:
+            return self._not_found()
+        events = sorted(cal['events'].values(), key=lambda e: e['start']['dateTime'])
+        if 'timeMin' in query:
+            time_min = _parse_time(query['timeMin'][0])
+            events = [e for e in events if _parse_time(e['end']['dateTime']) > time_min]
+        if 'timeMax' in query:
+            time_max = _parse_time(query['timeMax'][0])
+            events = [e for e in events if _parse_time(e['start']['dateTime']) < time_max]
+        return 200, self._page(events, query, 250)
+
+    def _events_insert(self, query, body, calendar_id):
+        cal = self._calendar(calendar_id)
+        if cal is None:
+            return self._not_found()
+        event = dict(body, id=uuid.uuid4().hex, status='confirmed')
+        cal['events'][event['id']] = event
+        return 200, event
+
+    def _events_patch(self, query, body, calendar_id, event_id):
+        cal = self._calendar(calendar_id)
+        if cal is None or event_id not in cal['events']:
+            return self._not_found()
+        cal['events'][event_id].update(body)
+        return 200, cal['events'][event_id]
+
+    def _events_delete(self, query, body, calendar_id, event_id):
+        cal = self._calendar(calendar_id)
+        if cal is None or cal['events'].pop(event_id, None) is None:
+            return self._not_found()
+        return 204, None
+
+    def _events_move(self, query, body, calendar_id, event_id):
+        cal = self._calendar(calendar_id)
+        destination = self._calendar(query.get('destination', [''])[0])
+        if cal is None or destination is None or event_id not in cal['events']:
+            return self._not_found()
+        event = cal['events'].pop(event_id)
+        destination['events'][event_id] = event
+        return 200, event
+
+
+def _split_http_message(raw):
+    """Split 'METHOD path HTTP/1.1\\r\\nheaders\\r\\n\\r\\nbody' into parts."""
+    # The email parser may have normalized CRLF to LF
+    head, _, body = raw.replace('\r\n', '\n').partition('\n\n')
+    request_line = head.split('\n', 1)[0]
+    method, target, _ = request_line.split(' ', 2)
+    return method, target, body
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are separate writes; avoid Nagle/delayed-ACK stalls
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self):
+        api = self.server.api
+        length = int(self.headers.get('Content-Length') or 0)
+        raw_body = self.rfile.read(length) if length else b''
+        with api.state.lock:
+            api.state.http_requests += 1
+            api.state.bytes_in += length
+        api.delay()
+
+        url = urlparse(self.path)
+        if self.command == 'POST' and url.path == '/batch/calendar/v3':
+            status, content_type, payload = self._batch(raw_body)
+        else:
+            body = json.loads(raw_body) if raw_body else {}
+            status, result = api.dispatch(self.command, url.path, parse_qs(url.query), body)
+            content_type = 'application/json; charset=UTF-8'
+            payload = json.dumps(result).encode('utf-8') if result is not None else b''
+
+        with api.state.lock:
+            api.state.bytes_out += len(payload)
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _batch(self, raw_body):
+        """Execute a multipart/mixed batch and build the multipart response."""
+        api = self.server.api
+        with api.state.lock:
+            api.state.count('batch')
+        message = Parser().parsestr(
+            f"Content-Type: {self.headers['Content-Type']}\r\n\r\n" + raw_body.decode('utf-8'))
+        boundary = f'batch_{uuid.uuid4().hex}'
+        parts = []
+        for part in message.get_payload():
+            method, target, body = _split_http_message(part.get_payload())
+            url = urlparse(target)
+            status, result = api.dispatch(method, url.path, parse_qs(url.query),
+                                          json.loads(body) if body.strip() else {})
+            content = json.dumps(result) if result is not None else ''
+            # Long IDs arrive folded over several lines; unfold them
+            content_id = ''.join(part['Content-ID'].splitlines()).strip('<>')
+            parts.append(
+                f'--{boundary}\r\n'
+                f'Content-Type: application/http\r\n'
+                f'Content-ID: <response-{content_id}>\r\n\r\n'
+                f'HTTP/1.1 {status} {"OK" if status < 300 else "Error"}\r\n'
+                f'Content-Type: application/json; charset=UTF-8\r\n\r\n'
+                f'{content}\r\n')
+        payload = (''.join(parts) + f'--{boundary}--\r\n').encode('utf-8')
+        return 200, f'multipart/mixed; boundary={boundary}', payload
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _handle
+
+
+class FakeCalendarServer:
+    """Fake Calendar API served from a background thread on localhost."""
+
+    def __init__(self, host='127.0.0.1', port=0, **api_options):
+        """
+        Initialize the server (call start() to serve).
+
+        Args:
+            host: Bind address
+            port: Bind port (0 picks a free port)
+            **api_options: latency, jitter, error_rate, error_status, seed
+        """
+        self.state = FakeCalendarState()
+        self.api = FakeCalendarAPI(self.state, **api_options)
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.api = self.api
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}/'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    """Run a standalone fake server (for manual testing or external load)."""
+    import argparse
+    parser = argparse.ArgumentParser(description="Run a local fake Google Calendar API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds per call")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of calls that fail")
+    parser.add_argument("--error-status", type=int, default=503)
+    args = parser.parse_args()
+
+    server = FakeCalendarServer(port=args.port, latency=args.latency,
+                                error_rate=args.error_rate, error_status=args.error_status)
+    print(f"Fake Calendar API listening on {server.url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
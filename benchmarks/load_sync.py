@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Load-test /sync with a "4am herd" of Shortcut automations.
+
+Replays a realistic payload mix (mostly 1-night daily syncs, some weekly and
+monthly payloads, rare backfills) against ``api.server:app`` backed by the
+local fake Calendar API, at several concurrency levels. Reports throughput,
+p50/p95/p99 latency, 429s from the rate limiter and thread-pool saturation.
+
+    python -m benchmarks.load_sync --requests 500 --concurrency 8,32,128
+    python -m benchmarks.load_sync --mode uvicorn --concurrency 80 --shared-ip
+    python -m benchmarks.load_sync --mode uvicorn --workers 1,2,4 --concurrency 32
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.datasets import generate_samples
+from benchmarks.fake_calendar import FakeCalendarServer
+from benchmarks.offload_latency import percentile
+from benchmarks.run import git_revision
+
+# Nights per payload and share of requests
+DEFAULT_MIX = {'daily': (1, 0.80), 'week': (7, 0.15), 'month': (30, 0.04), 'backfill': (365, 0.01)}
+
+
+def parse_mix(value):
+    """Parse 'daily=0.8,week=0.2' into the DEFAULT_MIX shape."""
+    if not value:
+        return DEFAULT_MIX
+    mix = {}
+    for item in value.split(','):
+        name, weight = item.split('=')
+        mix[name] = (DEFAULT_MIX[name][0], float(weight))
+    return mix
+
+
+def build_requests(count, mix, shared_ip=False, seed=0):
+    """Pre-render request bodies so encoding is not part of the measurement."""
+    rng = random.Random(seed)
+    names = list(mix)
+    weights = [mix[name][1] for name in names]
+    templates = {name: generate_samples(mix[name][0], seed=seed) for name in names}
+    requests = []
+    for i in range(count):
+        kind = rng.choices(names, weights)[0]
+        body = json.dumps({'email': f'user{i}@example.com', 'samples': templates[kind]}).encode('utf-8')
+        ip = '10.0.0.1' if shared_ip else f'10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}'
+        requests.append((kind, body, ip))
+    return requests
+
+
+async def poll_threadpool(client, samples, stop):
+    """Sample /metrics thread-pool usage until stopped."""
+    while not stop.is_set():
+        try:
+            response = await client.get('/metrics')
+            samples.append(response.json()['threadpool'])
+        except Exception:
+            pass
+        await asyncio.sleep(0.05)
+
+
+async def run_level(client, requests, concurrency):
+    """Send all requests with `concurrency` in flight; return a report row."""
+    queue = asyncio.Queue()
+    for request in requests:
+        queue.put_nowait(request)
+    latencies = []
+    by_kind = {}
+    statuses = {}
+    pool_samples = []
+
+    async def worker():
+        while True:
+            try:
+                kind, body, ip = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.perf_counter()
+            try:
+                response = await client.post('/sync', content=body, headers={
+                    'Content-Type': 'application/json', 'X-Forwarded-For': ip})
+                status = response.status_code
+            except httpx.HTTPError:
+                status = 'transport_error'
+            elapsed = time.perf_counter() - started
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == 200:
+                latencies.append(elapsed)
+                by_kind.setdefault(kind, []).append(elapsed)
+
+    stop = asyncio.Event()
+    poller = asyncio.create_task(poll_threadpool(client, pool_samples, stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+    stop.set()
+    await poller
+
+    def ms(value):
+        return round(value * 1000, 1) if value is not None else None
+
+    total = len(requests)
+    return {
+        'concurrency': concurrency,
+        'requests': total,
+        'wall_seconds': round(wall, 3),
+        'throughput_rps': round(total / wall, 2),
+        'p50_ms': ms(percentile(latencies, 50)),
+        'p95_ms': ms(percentile(latencies, 95)),
+        'p99_ms': ms(percentile(latencies, 99)),
+        'p99_ms_by_kind': {kind: ms(percentile(values, 99)) for kind, values in sorted(by_kind.items())},
+        'status_counts': {str(k): v for k, v in sorted(statuses.items(), key=str)},
+        'rate_limited_pct': round(statuses.get(429, 0) / total * 100, 2),
+        'threadpool_max_busy': max((s['busy'] for s in pool_samples), default=None),
+        'threadpool_size': pool_samples[0]['size'] if pool_samples else None,
+        'threadpool_saturated_pct': round(
+            sum(1 for s in pool_samples if s['busy'] >= s['size']) / len(pool_samples) * 100, 1
+        ) if pool_samples else None,
+    }
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def create_app():
+    """api.server.app with SleepCalendar bound to the fake Calendar API at FAKE_CALENDAR_URL."""
+    from functools import partial
+    from google.auth.credentials import AnonymousCredentials
+    import api.server
+    from api.sleep_calendar import SleepCalendar
+    api.server.SleepCalendar = partial(SleepCalendar, credentials=AnonymousCredentials(),
+                                       api_endpoint=os.environ['FAKE_CALENDAR_URL'])
+    return api.server.app
+
+
+def serve(fake_url, port, workers=1):
+    """Run uvicorn (with `workers` processes) against the fake Calendar API."""
+    import uvicorn
+    os.environ['FAKE_CALENDAR_URL'] = fake_url
+    # As api.serve does: several workers switch to shared SQLite state
+    os.environ['WEB_CONCURRENCY'] = str(workers)
+    uvicorn.run('benchmarks.load_sync:create_app', factory=True, host='127.0.0.1', port=port,
+                workers=workers, log_level='warning')
+
+
+async def run_levels(client_factory, requests_by_level, reset, workers=1):
+    """Run each concurrency level with fresh server-side state."""
+    rows = []
+    for concurrency, requests in requests_by_level:
+        reset()
+        async with client_factory() as client:
+            row = await run_level(client, requests, concurrency)
+        row['workers'] = workers
+        rows.append(row)
+        print(f"workers={workers} c={concurrency}: {row['throughput_rps']} req/s, p50 {row['p50_ms']} ms, "
+              f"p95 {row['p95_ms']} ms, p99 {row['p99_ms']} ms, 429s {row['rate_limited_pct']}%, "
+              f"threadpool max {row['threadpool_max_busy']}/{row['threadpool_size']}")
+    return rows
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Load-test /sync against a fake Calendar API")
+    parser.add_argument("--mode", choices=['asgi', 'uvicorn'], default='asgi',
+                        help="In-process ASGI, or a uvicorn subprocess over HTTP")
+    parser.add_argument("--requests", type=int, default=300, help="Requests per concurrency level")
+    parser.add_argument("--concurrency", default="8,32,80", help="Comma-separated concurrency levels")
+    parser.add_argument("--mix", default=None, help="Payload mix, e.g. daily=0.8,week=0.15,month=0.04,backfill=0.01")
+    parser.add_argument("--shared-ip", action="store_true", help="Send every request from one IP (NAT)")
+    parser.add_argument("--latency", type=float, default=0.02, help="Fake Calendar API latency per call (seconds)")
+    parser.add_argument("--workers", default="1", help="Comma-separated uvicorn worker counts (uvicorn mode)")
+    parser.add_argument("--output", default=None, help="Results JSON path")
+    args = parser.parse_args()
+
+    levels = [int(c) for c in args.concurrency.split(',')]
+    worker_counts = [int(w) for w in args.workers.split(',')]
+    if args.mode == 'asgi' and worker_counts != [1]:
+        parser.error("--workers needs --mode uvicorn")
+    mix = parse_mix(args.mix)
+    requests_by_level = [(c, build_requests(args.requests, mix, args.shared_ip, seed=c)) for c in levels]
+
+    workdir = tempfile.mkdtemp(prefix='sleep-load-')
+    os.environ['SLEEP_CALENDAR_DB'] = os.path.join(workdir, 'load.db')
+
+    with FakeCalendarServer(latency=args.latency) as fake:
+        if args.mode == 'asgi':
+            from functools import partial
+            from unittest.mock import patch
+            from google.auth.credentials import AnonymousCredentials
+            import api.server
+            from api.rate_limit import rate_limiter
+            from api.sleep_calendar import SleepCalendar
+
+            def reset():
+                fake.state.reset()
+                rate_limiter.clear()
+                api.server.payload_cache.clear()
+
+            def client_factory():
+                return httpx.AsyncClient(transport=httpx.ASGITransport(app=api.server.app),
+                                         base_url='http://load', timeout=None)
+
+            with patch('api.server.SleepCalendar', partial(
+                    SleepCalendar, credentials=AnonymousCredentials(), api_endpoint=fake.url)):
+                rows = asyncio.run(run_levels(client_factory, requests_by_level, reset))
+        else:
+            port = _free_port()
+            server = None
+            workers = 1
+
+            def reset():
+                # Restart the server so rate-limit and cache state start empty
+                nonlocal server
+                if server is not None:
+                    server.terminate()
+                    server.wait()
+                fake.state.reset()
+                if os.path.exists(os.environ['SLEEP_CALENDAR_DB']):
+                    os.remove(os.environ['SLEEP_CALENDAR_DB'])
+                server = subprocess.Popen([sys.executable, '-m', 'benchmarks.load_sync', '--serve',
+                                           fake.url, str(port), str(workers)])
+                for _ in range(100):
+                    try:
+                        httpx.get(f'http://127.0.0.1:{port}/health')
+                        return
+                    except httpx.HTTPError:
+                        time.sleep(0.1)
+                raise RuntimeError('uvicorn did not start')
+
+            def client_factory():
+                return httpx.AsyncClient(base_url=f'http://127.0.0.1:{port}', timeout=None,
+                                         limits=httpx.Limits(max_connections=max(levels) + 1))
+
+            rows = []
+            try:
+                for workers in worker_counts:
+                    rows += asyncio.run(run_levels(client_factory, requests_by_level, reset, workers))
+            finally:
+                if server is not None:
+                    server.terminate()
+                    server.wait()
+
+    revision = git_revision()
+    output = args.output or os.path.join('benchmarks', 'results', f'load_{revision}.json')
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({'revision': revision, 'params': vars(args), 'cpu_count': os.cpu_count(),
+                   'levels': rows}, f, indent=2)
+    print(f"Results written to {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 5 and sys.argv[1] == '--serve':
+        serve(sys.argv[2], int(sys.argv[3]), int(sys.argv[4]))
+    else:
+        sys.exit(main())
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Benchmark /sync latency under mixed small and large payloads.
+
+Runs the app in-process (ASGI) with Calendar I/O stubbed out, once with the
+process pool disabled and once enabled, and reports p50/p99 latency for the
+small requests that share the server with large backfills.
+
+    python -m benchmarks.offload_latency --small 200 --large 8 --large-nights 730
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from unittest.mock import patch
+
+import httpx
+
+from api import offload
+from api.rate_limit import rate_limiter
+from api.sleep_calendar import build_session_summaries, load_samples
+from benchmarks.datasets import generate_samples
+
+
+class NullCalendar:
+    """SleepCalendar stand-in that runs the CPU stages but skips Calendar I/O."""
+
+    def __init__(self, user_email=None, **kwargs):
+        self.user_email = user_email
+        self.calendar_id = 'benchmark-calendar'
+
+    def sync_from_data(self, data, user_email=None, days=30):
+        return len(build_session_summaries(load_samples(data), days=days))
+
+    def sync_summaries(self, summaries, user_email=None):
+        return len(summaries)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+async def run_mix(small, large, large_nights, concurrency):
+    """Fire the small and large requests interleaved; return latencies by kind."""
+    from api.server import app
+
+    small_body = json.dumps({'email': 'small@example.com', 'samples': generate_samples(1)})
+    large_body = json.dumps({'email': 'large@example.com', 'samples': generate_samples(large_nights)})
+    kinds = ['large' if large and i % max(1, (small + large) // large) == 0 else 'small'
+             for i in range(small + large)]
+
+    latencies = {'small': [], 'large': []}
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        async def one(kind):
+            body = large_body if kind == 'large' else small_body
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post('/sync', content=body,
+                                             headers={'Content-Type': 'application/json'})
+                latencies[kind].append(time.perf_counter() - started)
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(kind) for kind in kinds))
+        elapsed = time.perf_counter() - started
+
+    return latencies, elapsed
+
+
+def summarize_latencies(latencies, elapsed):
+    """Convert raw latencies to a report row (milliseconds)."""
+    row = {'wall_seconds': round(elapsed, 3)}
+    for kind, values in latencies.items():
+        if values:
+            row[kind] = {
+                'count': len(values),
+                'p50_ms': round(statistics.median(values) * 1000, 1),
+                'p99_ms': round(percentile(values, 99) * 1000, 1),
+                'max_ms': round(max(values) * 1000, 1),
+            }
+    return row
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark /sync latency with and without the process pool")
+    parser.add_argument("--small", type=int, default=200, help="Number of 1-night requests")
+    parser.add_argument("--large", type=int, default=8, help="Number of backfill requests")
+    parser.add_argument("--large-nights", type=int, default=730, help="Nights per backfill request")
+    parser.add_argument("--concurrency", type=int, default=32, help="In-flight requests")
+    parser.add_argument("--output", default="benchmarks/results/offload_latency.json", help="Results JSON path")
+    args = parser.parse_args()
+
+    results = {}
+    with patch('api.server.SleepCalendar', NullCalendar), \
+            patch.object(rate_limiter, 'requests_per_minute', 10 ** 9), \
+            patch.object(rate_limiter, 'requests_per_hour', 10 ** 9):
+        for mode, setting in [('in_process', '0'), ('process_pool', 'auto')]:
+            os.environ['SYNC_PROCESS_POOL'] = setting
+            if setting != '0':
+                # Warm the pool so worker start-up is not counted
+                offload.summarize([], days=30)
+            latencies, elapsed = asyncio.run(run_mix(args.small, args.large, args.large_nights, args.concurrency))
+            results[mode] = summarize_latencies(latencies, elapsed)
+            offload.shutdown()
+            print(f"{mode}: {json.dumps(results[mode])}")
+
+    report = {'params': vars(args), 'cpu_count': os.cpu_count(), 'results': results}
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite against the local fake Calendar API.
+
+Each scenario runs in a fresh process (so peak RSS is per scenario) against
+a FakeCalendarServer and reports wall time, API call counts, bytes on the
+wire and peak RSS. Results are written as JSON, tagged with the git commit,
+so runs can be compared between commits:
+
+    python -m benchmarks.run                          # default scenarios
+    python -m benchmarks.run --scenario api_sync_1k_users --users 200
+    python -m benchmarks.run --compare benchmarks/results/abc1234.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.datasets import generate_samples, generate_users
+from benchmarks.fake_calendar import FakeCalendarServer
+
+
+def _calendar_factory(endpoint):
+    """SleepCalendar constructor bound to the fake server."""
+    from functools import partial
+    from google.auth.credentials import AnonymousCredentials
+    from api.sleep_calendar import SleepCalendar
+    return partial(SleepCalendar, credentials=AnonymousCredentials(), api_endpoint=endpoint)
+
+
+def scenario_sync_from_data(endpoint, workdir, nights, days, sources=('Apple Watch',)):
+    """SleepCalendar.sync_from_data for one user."""
+    samples = generate_samples(nights, sources=sources)
+    cal = _calendar_factory(endpoint)(user_email='bench@example.com')
+    started = time.perf_counter()
+    events = cal.sync_from_data({'samples': samples}, days=days)
+    return time.perf_counter() - started, {'samples': len(samples), 'events_synced': events}
+
+
+def scenario_cli_sync(endpoint, workdir, nights, days):
+    """The sleep_data.py CLI sync path from an export file."""
+    import contextlib
+    import io
+    from google.auth.credentials import AnonymousCredentials
+    from sleep_data import SleepCalendar
+
+    export_file = os.path.join(workdir, 'export.json')
+    samples = generate_samples(nights)
+    with open(export_file, 'w') as f:
+        json.dump({'samples': samples}, f)
+
+    cal = SleepCalendar(credentials=AnonymousCredentials(), api_endpoint=endpoint, share_emails=[])
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        events = cal.sync(export_file, days=days)
+    return time.perf_counter() - started, {'samples': len(samples), 'events_synced': events}
+
+
+def scenario_api_sync(endpoint, workdir, users, nights):
+    """POST /sync in-process, one request per user."""
+    from unittest.mock import patch
+    from fastapi.testclient import TestClient
+    import api.server
+
+    payloads = generate_users(users, nights)
+    client = TestClient(api.server.app)
+    events = 0
+    with patch('api.server.SleepCalendar', _calendar_factory(endpoint)):
+        started = time.perf_counter()
+        for i, (email, samples) in enumerate(payloads.items()):
+            response = client.post('/sync', json={'email': email, 'samples': samples},
+                                   headers={'X-Forwarded-For': f'10.0.{i // 256}.{i % 256}'})
+            response.raise_for_status()
+            events += response.json()['events_synced']
+        elapsed = time.perf_counter() - started
+    return elapsed, {'users': users, 'samples': sum(len(s) for s in payloads.values()), 'events_synced': events}
+
+
+def scenario_onboarding(endpoint, workdir, users, pool_size):
+    """get_or_create_calendar for first-time users, then again as returning users."""
+    import statistics
+    from api.calendar_pool import CalendarPool
+
+    pool = CalendarPool(size=pool_size)
+    factory = _calendar_factory(endpoint)
+    if pool_size:
+        pool.refill(factory(), wait=True)
+    first, returning = [], []
+    for i in range(users):
+        cal = factory(user_email=f'user{i}@example.com', calendar_pool=pool)
+        started = time.perf_counter()
+        cal.get_or_create_calendar()
+        first.append(time.perf_counter() - started)
+        # Let the background refill finish so it does not overlap the next user
+        while pool._refilling:
+            time.sleep(0.001)
+        started = time.perf_counter()
+        factory(user_email=f'user{i}@example.com').get_or_create_calendar()
+        returning.append(time.perf_counter() - started)
+    return sum(first), {
+        'users': users,
+        'first_sync_median_ms': round(statistics.median(first) * 1000, 1),
+        'returning_median_ms': round(statistics.median(returning) * 1000, 1),
+        'pool': pool.stats(),
+    }
+
+
+SCENARIOS = {
+    'sync_1_night': (scenario_sync_from_data, {'nights': 1, 'days': 30}),
+    'sync_30_nights': (scenario_sync_from_data, {'nights': 30, 'days': 30}),
+    'sync_2_years': (scenario_sync_from_data, {'nights': 730, 'days': 30}),
+    'sync_30_nights_3_sources': (scenario_sync_from_data,
+                                 {'nights': 30, 'days': 30, 'sources': ('Apple Watch', 'iPhone', 'AutoSleep')}),
+    'sync_2_years_backfill': (scenario_sync_from_data, {'nights': 730, 'days': 731}),
+    'cli_sync_30_nights': (scenario_cli_sync, {'nights': 30, 'days': 30}),
+    'api_sync_30_nights': (scenario_api_sync, {'users': 1, 'nights': 30}),
+    'api_sync_1k_users': (scenario_api_sync, {'users': 1000, 'nights': 1}),
+    'onboarding_created': (scenario_onboarding, {'users': 20, 'pool_size': 0}),
+    'onboarding_pooled': (scenario_onboarding, {'users': 20, 'pool_size': 2}),
+}
+
+DEFAULT_SCENARIOS = ['sync_1_night', 'sync_30_nights', 'sync_2_years', 'cli_sync_30_nights',
+                     'api_sync_30_nights', 'api_sync_1k_users']
+
+
+def _child(name, params, endpoint, workdir, queue):
+    """Run one scenario in a fresh process and report back."""
+    os.environ['SLEEP_CALENDAR_DB'] = os.path.join(workdir, 'bench.db')
+    func, defaults = SCENARIOS[name]
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    try:
+        wall, extra = func(endpoint, workdir, **dict(defaults, **params))
+        queue.put({'wall_seconds': round(wall, 4), 'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                   'rss_at_start_kb': rss_before, **extra})
+    except Exception as e:
+        queue.put({'error': repr(e)})
+
+
+def run_scenario(server, name, params):
+    """Run a scenario against a freshly reset fake server."""
+    server.state.reset()
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    with tempfile.TemporaryDirectory() as workdir:
+        process = ctx.Process(target=_child, args=(name, params, server.url, workdir, queue))
+        process.start()
+        result = queue.get()
+        process.join()
+    result.update(server.state.stats())
+    return result
+
+
+def git_revision():
+    """Short commit hash of the working tree, or 'unknown'."""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return 'unknown'
+
+
+def compare(current, baseline_path):
+    """Print per-scenario changes against an earlier results file."""
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)['scenarios']
+    print(f"\nCompared with {baseline_path}:")
+    for name, result in current.items():
+        before = baseline.get(name)
+        if not before or 'error' in result or 'error' in before:
+            continue
+        parts = []
+        for metric in ('wall_seconds', 'api_calls', 'bytes_out', 'peak_rss_kb'):
+            if before.get(metric):
+                change = (result[metric] - before[metric]) / before[metric] * 100
+                parts.append(f"{metric} {change:+.1f}%")
+        print(f"  {name}: {', '.join(parts)}")
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Run offline sync benchmarks against a fake Calendar API")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="Scenario to run (repeatable; default: standard set)")
+    parser.add_argument("--users", type=int, default=None, help="Override user count for API scenarios")
+    parser.add_argument("--latency", type=float, default=0.0, help="Fake API latency per call (seconds)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of fake API calls that fail")
+    parser.add_argument("--output", default=None, help="Results JSON path (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", default=None, help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    names = args.scenario or DEFAULT_SCENARIOS
+    results = {}
+    with FakeCalendarServer(latency=args.latency, error_rate=args.error_rate) as server:
+        for name in names:
+            params = {}
+            if args.users is not None and 'users' in SCENARIOS[name][1]:
+                params['users'] = args.users
+            results[name] = run_scenario(server, name, params)
+            result = results[name]
+            if 'error' in result:
+                print(f"{name}: ERROR {result['error']}")
+            else:
+                print(f"{name}: {result['wall_seconds']:.3f}s, {result['api_calls']} calls, "
+                      f"{result['bytes_in'] + result['bytes_out']} bytes, peak RSS {result['peak_rss_kb']} KB")
+
+    revision = git_revision()
+    output = args.output or os.path.join('benchmarks', 'results', f'{revision}.json')
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({'revision': revision, 'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                   'latency': args.latency, 'error_rate': args.error_rate, 'scenarios': results}, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+    return 1 if any('error' in r for r in results.values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -19,11 +19,18 @@ creds = service_account.Credentials.from_service_account_file(
     credentials_path, scopes=SCOPES)
 service = build('calendar', 'v3', credentials=creds)
 
-# List all calendars
-calendars = service.calendarList().list().execute()
+# List all calendars (every page; see inventory.py for counts, duplicates and orphans)
+items = []
+page_token = None
+while True:
+    calendars = service.calendarList().list(pageToken=page_token).execute()
+    items.extend(calendars.get('items', []))
+    page_token = calendars.get('nextPageToken')
+    if not page_token:
+        break
 
 print("\n📅 Available Calendars:\n")
-for cal in calendars.get('items', []):
+for cal in items:
     summary = cal.get('summary', 'Unnamed')
     cal_id = cal.get('id', 'Unknown')
     access_role = cal.get('accessRole', 'Unknown')
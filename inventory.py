@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""Inventory every calendar of the service accounts and collect duplicates and orphans."""
+
+import json
+import sys
+
+from api.calendar_directory import calendar_directory
+from api.calendar_pool import calendar_pool
+from api.credential_pool import CredentialPool
+from api.inventory import Fleet, collect, take_inventory, to_csv
+from api.quota import QuotaPacer
+
+
+def main():
+    """Main entry point."""
+    import argparse
+    parser = argparse.ArgumentParser(description="List every calendar with event counts, duplicates and orphans")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent Calendar API calls")
+    parser.add_argument("--qps-per-account", type=float, default=5.0, help="Calendar calls/second per service account")
+    parser.add_argument("--format", choices=("json", "csv"), default="json", help="Report format")
+    parser.add_argument("--output", help="Write the report here (default: stdout)")
+    parser.add_argument("--compare", help="Earlier JSON report, to add each calendar's events_delta")
+    parser.add_argument("--merge-duplicates", action="store_true",
+                        help="Move duplicates' missing events into the kept calendar and delete the duplicates")
+    parser.add_argument("--delete-orphans", action="store_true", help="Delete unclaimed pool calendars whose lease expired")
+    args = parser.parse_args()
+
+    previous = None
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            previous = json.load(f)
+    fleet = Fleet.from_pool(CredentialPool.from_env(), pacer=QuotaPacer(requests_per_second=args.qps_per_account))
+    # Run separately from the service: pool calendars count as held while their lease
+    # (CALENDAR_POOL_TTL, as the service reads it) lasts
+    report = take_inventory(fleet, workers=args.workers, directory=calendar_directory, previous=previous,
+                            pool_ttl=calendar_pool.ttl)
+    if args.merge_duplicates or args.delete_orphans:
+        collect(fleet, report, merge=args.merge_duplicates, delete_orphans=args.delete_orphans,
+                workers=args.workers, directory=calendar_directory)
+
+    text = to_csv(report) if args.format == 'csv' else json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+    actions = report.get('actions', {})
+    print(f"✅ {report['calendars']} calendars ({report['events']} events) across {report['accounts']} accounts: "
+          f"{report['duplicates']} duplicates, {report['orphans']} orphans, {report['empty']} empty"
+          + (f"; {actions['events_moved']} events moved, {actions['calendars_deleted']} calendars deleted"
+             if actions else ''), file=sys.stderr)
+    return 1 if report['failures'] or actions.get('failures') else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
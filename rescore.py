@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""Re-score existing sleep events after a change to the scoring curve."""
+
+import json
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from api.calendar_directory import calendar_directory, user_calendar_name
+from api.credential_pool import CredentialPool
+from api.quota import QuotaPacer
+from api.scoring import EMOJIS, SCORE_DESCRIPTIONS, ScoringCurve, default_curve
+from api.sleep_calendar import ASLEEP_PROPERTY, SleepCalendar, is_aggregated_event
+
+
+SCORE_LINE = re.compile(r'^Sleep Score: -?\d+/100 \(.*\)$', re.MULTILINE)
+ASLEEP_MINUTES = re.compile(r'^Time Asleep: [\d.]+ hours \((\d+) min\)$', re.MULTILINE)
+CALENDAR_PREFIX = 'Sleep Data'
+
+
+def list_sleep_events(cal):
+    """
+    Return (event_id, summary, description, asleep minutes, exact) for every
+    aggregated sleep event in cal.calendar_id.
+
+    Minutes come from the event's private asleepMinutes property, the exact
+    value it was scored with. Events written before that property existed
+    fall back to the whole minutes in the description (exact is False).
+    """
+    events = []
+    page_token = None
+    while True:
+        page = cal._execute(cal.service.events().list(
+            calendarId=cal.calendar_id, pageToken=page_token, maxResults=2500,
+            fields='items(id,summary,description,extendedProperties),nextPageToken'))
+        for event in page.get('items', []):
+            summary = event.get('summary', '')
+            if not is_aggregated_event(summary):
+                continue
+            exact = event.get('extendedProperties', {}).get('private', {}).get(ASLEEP_PROPERTY)
+            match = ASLEEP_MINUTES.search(event.get('description', ''))
+            if exact is not None and match:
+                events.append((event['id'], summary, event['description'], float(exact), True))
+            elif match:
+                events.append((event['id'], summary, event['description'], int(match.group(1)), False))
+        page_token = page.get('nextPageToken')
+        if not page_token:
+            return events
+
+
+def rescore_events(events, curve):
+    """
+    Score all events in one vectorized call.
+
+    Returns:
+        List of (event_id, patch body) for events whose title or score changed
+    """
+    if not events:
+        return []
+    scores, codes = curve.score_many([event[3] / 60 for event in events])
+    patches = []
+    for (event_id, summary, description, _, _), score, code in zip(events, scores, codes):
+        new_summary = EMOJIS[code] + summary[summary.index(' '):]
+        new_description = SCORE_LINE.sub(
+            f'Sleep Score: {int(score)}/100 ({SCORE_DESCRIPTIONS[code]})', description, count=1)
+        if new_summary != summary or new_description != description:
+            patches.append((event_id, {'summary': new_summary, 'description': new_description}))
+    return patches
+
+
+def find_targets(emails, credential_pool, pacer, directory=None):
+    """
+    Resolve the calendars to re-score as SleepCalendar clients.
+
+    With emails, each user's "Sleep Data - {email}" calendar, looked up like
+    sync does (so users pinned to another account are found); otherwise
+    every "Sleep Data" calendar owned by each service account.
+
+    Args:
+        emails: Users to re-score (empty for every calendar)
+        credential_pool: CredentialPool, or None for the default credentials
+        pacer: QuotaPacer shared by all calendars
+        directory: CalendarDirectory of known calendars (optional)
+    """
+    targets = []
+    if emails:
+        for email in emails:
+            cal = SleepCalendar(user_email=email, credential_pool=credential_pool, pacer=pacer,
+                                calendar_directory=directory)
+            if cal.lookup_calendar(user_calendar_name(email)):
+                targets.append((email, cal))
+            else:
+                print(f"No calendar for {email}", file=sys.stderr)
+        return targets
+
+    if credential_pool is not None:
+        accounts = [(credential_pool.account_ids[i], credential_pool.credentials_at(i))
+                    for i in range(len(credential_pool))]
+    else:
+        accounts = [(None, None)]
+    for account, credentials in accounts:
+        lister = SleepCalendar(credentials=credentials, pacer=pacer)
+        lister.account = account
+        page_token = None
+        while True:
+            page = lister._execute(lister.service.calendarList().list(pageToken=page_token))
+            for item in page.get('items', []):
+                if item.get('summary', '').startswith(CALENDAR_PREFIX):
+                    cal = SleepCalendar(credentials=lister.creds, pacer=pacer)
+                    cal.account = account
+                    cal.calendar_id = item['id']
+                    targets.append((item['summary'], cal))
+            page_token = page.get('nextPageToken')
+            if not page_token:
+                break
+    return targets
+
+
+def rescore(targets, curve=None, workers=8, dry_run=False):
+    """
+    List, re-score and patch aggregated events across calendars.
+
+    Listing and patching run in threads; scoring is a single vectorized
+    pass over every event of every calendar.
+
+    Returns:
+        Summary report dict
+    """
+    curve = curve or default_curve
+    started = time.monotonic()
+    report = {'calendars': len(targets), 'events_scored': 0, 'events_approximate': 0, 'events_changed': 0,
+              'events_patched': 0, 'failures': []}
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        listed = list(pool.map(lambda target: list_sleep_events(target[1]), targets))
+        events = [event for calendar_events in listed for event in calendar_events]
+        patches = dict(rescore_events(events, curve))
+        report['events_scored'] = len(events)
+        report['events_approximate'] = sum(not event[4] for event in events)
+        report['events_changed'] = len(patches)
+
+        def patch_target(target, calendar_events):
+            label, cal = target
+            todo = [(event[0], patches[event[0]]) for event in calendar_events if event[0] in patches]
+            if dry_run or not todo:
+                return label, 0, []
+            return (label,) + cal.patch_events(todo)
+
+        for label, patched, errors in pool.map(patch_target, targets, listed):
+            report['events_patched'] += patched
+            report['failures'].extend({'calendar': label, 'event_id': event_id, 'error': str(error)}
+                                      for event_id, error in errors)
+
+    report['elapsed_seconds'] = round(time.monotonic() - started, 3)
+    return report
+
+
+def main():
+    """Main entry point."""
+    import argparse
+    parser = argparse.ArgumentParser(description="Re-score existing sleep events with the current scoring curve")
+    parser.add_argument("emails", nargs="*", help="Users to re-score (default: every Sleep Data calendar)")
+    parser.add_argument("--curve", default=None,
+                        help='Segments "x0:s0-x1:s1,..." (default: SCORING_CURVE, the setting sync uses)')
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent calendars")
+    parser.add_argument("--qps-per-account", type=float, default=5.0, help="Calendar calls/second per service account")
+    parser.add_argument("--dry-run", action="store_true", help="Report changes without patching")
+    parser.add_argument("--store", action="store_true", help="Also re-score the local session store's aggregates")
+    args = parser.parse_args()
+
+    curve = ScoringCurve.parse(args.curve) if args.curve else default_curve
+    pacer = QuotaPacer(requests_per_second=args.qps_per_account)
+    targets = find_targets(args.emails, CredentialPool.from_env(), pacer, directory=calendar_directory)
+    report = rescore(targets, curve=curve, workers=args.workers, dry_run=args.dry_run)
+    if args.store and not args.dry_run:
+        from api.session_store import session_store
+        report['store_days_rescored'] = session_store.rescore(curve)
+
+    print(json.dumps(report, indent=2))
+    print(f"✅ {report['events_changed']} of {report['events_scored']} events changed score, "
+          f"{report['events_patched']} patched across {report['calendars']} calendars")
+    return 1 if report['failures'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -20,6 +20,12 @@ if [ -z "$GOOGLE_CALENDAR_CREDENTIALS" ]; then
     exit 1
 fi
 
+if [ -z "$ICS_TOKEN_SECRET" ]; then
+    echo "❌ Error: ICS_TOKEN_SECRET environment variable not set"
+    echo "   Every instance must sign feed tokens with the same key: export ICS_TOKEN_SECRET=\$(openssl rand -hex 32)"
+    exit 1
+fi
+
 echo "🚀 Building and deploying ${SERVICE_NAME} to Cloud Run"
 echo "   Project: ${PROJECT_ID}"
 echo "   Region: ${REGION}"
@@ -50,7 +56,7 @@ gcloud run deploy "${SERVICE_NAME}" \
     --timeout 300 \
     --min-instances 0 \
     --max-instances 10 \
-    --set-env-vars "GOOGLE_CALENDAR_CREDENTIALS=${GOOGLE_CALENDAR_CREDENTIALS}" \
+    --set-env-vars "GOOGLE_CALENDAR_CREDENTIALS=${GOOGLE_CALENDAR_CREDENTIALS},ICS_TOKEN_SECRET=${ICS_TOKEN_SECRET}" \
     --project "${PROJECT_ID}"
 
 # Get service URL
@@ -18,6 +18,11 @@ if [ -z "$GOOGLE_CALENDAR_CREDENTIALS" ]; then
     exit 1
 fi
 
+if [ -z "$ICS_TOKEN_SECRET" ]; then
+    echo "Error: ICS_TOKEN_SECRET environment variable not set"
+    exit 1
+fi
+
 echo "Building Docker image..."
 docker build -t "${IMAGE_NAME}:latest" .
 
@@ -35,7 +40,7 @@ gcloud run deploy "${SERVICE_NAME}" \
     --timeout 300 \
     --min-instances 0 \
     --max-instances 10 \
-    --set-env-vars "GOOGLE_CALENDAR_CREDENTIALS=${GOOGLE_CALENDAR_CREDENTIALS}" \
+    --set-env-vars "GOOGLE_CALENDAR_CREDENTIALS=${GOOGLE_CALENDAR_CREDENTIALS},ICS_TOKEN_SECRET=${ICS_TOKEN_SECRET}" \
     --project "${PROJECT_ID}"
 
 echo "✅ Deployment complete!"
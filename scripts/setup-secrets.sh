@@ -37,7 +37,24 @@ gcloud secrets add-iam-policy-binding "${SECRET_NAME}" \
     --role="roles/secretmanager.secretAccessor" \
     --project="${PROJECT_ID}"
 
+# Key for feed and continuation tokens, shared by every instance; kept if it exists,
+# since changing it changes every feed URL
+TOKEN_SECRET_NAME="sleep-calendar-ics-token"
+
+if ! gcloud secrets describe "${TOKEN_SECRET_NAME}" --project="${PROJECT_ID}" >/dev/null 2>&1; then
+    echo "Creating secret: ${TOKEN_SECRET_NAME}"
+    openssl rand -hex 32 | tr -d '\n' | gcloud secrets create "${TOKEN_SECRET_NAME}" \
+        --data-file=- \
+        --project="${PROJECT_ID}"
+fi
+
+gcloud secrets add-iam-policy-binding "${TOKEN_SECRET_NAME}" \
+    --member="serviceAccount:${PROJECT_NUMBER}-compute@developer.gserviceaccount.com" \
+    --role="roles/secretmanager.secretAccessor" \
+    --project="${PROJECT_ID}"
+
 echo "✅ Secret created: ${SECRET_NAME}"
+echo "✅ Token secret: ${TOKEN_SECRET_NAME} (.cloudbuild.yaml sets it as ICS_TOKEN_SECRET)"
 echo ""
 echo "To use in Cloud Run, update .cloudbuild.yaml to reference this secret:"
 echo "  --set-secrets=GOOGLE_CALENDAR_CREDENTIALS=${SECRET_NAME}:latest"
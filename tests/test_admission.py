@@ -0,0 +1,76 @@
+"""Unit tests for /sync admission control."""
+import unittest
+from unittest.mock import patch, MagicMock
+from fastapi.testclient import TestClient
+from api.admission import AdmissionController
+from api.server import app
+from api.sync_cache import payload_cache
+
+
+class TestAdmissionController(unittest.TestCase):
+    """Test watermarks and accounting."""
+
+    def test_inflight_watermark(self):
+        """Test requests beyond max_inflight are rejected until one is released."""
+        controller = AdmissionController(max_inflight=2)
+        first = controller.admit()
+        second = controller.admit()
+        self.assertIsNotNone(second)
+        self.assertIsNone(controller.admit())
+        controller.release(first)
+        self.assertIsNotNone(controller.admit())
+        self.assertEqual(controller.stats()['rejected']['inflight'], 1)
+
+    def test_bytes_and_samples_watermarks(self):
+        """Test byte and sample budgets, and that a lone request is always admitted."""
+        controller = AdmissionController(max_bytes=100, max_samples=10)
+        big = controller.admit(500)
+        self.assertIsNotNone(big)
+        self.assertTrue(controller.add_samples(big, 50))
+        self.assertIsNone(controller.admit(1))
+        controller.release(big)
+
+        small = controller.admit(60)
+        self.assertTrue(controller.add_samples(small, 8))
+        other = controller.admit(30)
+        self.assertFalse(controller.add_samples(other, 5))
+        controller.release(other)
+        controller.release(small)
+        stats = controller.stats()
+        self.assertEqual((stats['inflight'], stats['inflight_bytes'], stats['queued_samples']), (0, 0, 0))
+
+
+class TestAdmissionMiddleware(unittest.TestCase):
+    """Test /sync sheds load with 503 + Retry-After."""
+
+    def setUp(self):
+        """Set up test client."""
+        self.client = TestClient(app)
+        payload_cache.clear()
+
+    @patch('api.server.SleepCalendar')
+    def test_overloaded_sync_returns_503(self, mock_cal_class):
+        """Test a saturated instance rejects /sync but still serves /metrics."""
+        mock_cal = MagicMock()
+        mock_cal.calendar_id = "test-calendar-id"
+        mock_cal.sync_from_data.return_value = 1
+        mock_cal_class.return_value = mock_cal
+        controller = AdmissionController(max_inflight=1, retry_after=7)
+        request_data = {"email": "test@example.com", "samples": []}
+
+        with patch('api.server.admission', controller):
+            held = controller.admit()
+            response = self.client.post("/sync", json=request_data)
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response.headers["Retry-After"], "7")
+            self.assertEqual(response.json()["error_code"], "OVERLOADED")
+            self.assertEqual(self.client.get("/metrics").json()["admission"]["inflight"], 1)
+
+            controller.release(held)
+            response = self.client.post("/sync", json=request_data)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(controller.stats()['inflight'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,6 +3,7 @@ import unittest
 from unittest.mock import patch, MagicMock
 from fastapi.testclient import TestClient
 from api.server import app
+from api.sync_cache import payload_cache
 
 
 class TestAPI(unittest.TestCase):
@@ -11,6 +12,7 @@ class TestAPI(unittest.TestCase):
     def setUp(self):
         """Set up test client."""
         self.client = TestClient(app)
+        payload_cache.clear()
     
     def test_root_endpoint(self):
         """Test root endpoint."""
@@ -53,6 +55,33 @@ class TestAPI(unittest.TestCase):
         self.assertEqual(data["events_synced"], 5)
         self.assertEqual(data["calendar_id"], "test-calendar-id")
     
+    @patch('api.server.SleepCalendar')
+    def test_sync_endpoint_duplicate_payload_cached(self, mock_cal_class):
+        """Test an identical re-sent payload skips the calendar entirely."""
+        mock_cal = MagicMock()
+        mock_cal.calendar_id = "test-calendar-id"
+        mock_cal.sync_from_data.return_value = 5
+        mock_cal_class.return_value = mock_cal
+        
+        sample = {
+            "startDate": "2026-01-17T02:22:00",
+            "endDate": "2026-01-17T02:56:00",
+            "value": "Core",
+            "sourceName": "Test"
+        }
+        first = self.client.post("/sync", json={"email": "test@example.com", "samples": [sample]})
+        # Same samples sent as NDJSON with different key order
+        ndjson = '{"value": "Core", "sourceName": "Test", "endDate": "2026-01-17T02:56:00", "startDate": "2026-01-17T02:22:00"}'
+        second = self.client.post("/sync", json={"email": "Test@example.com", "samples": ndjson})
+        
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(mock_cal_class.call_count, 1)
+        
+        stats = self.client.get("/metrics").json()["sync_cache"]
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+    
     def test_sync_endpoint_invalid_email(self):
         """Test sync endpoint with invalid email."""
         request_data = {
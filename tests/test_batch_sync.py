@@ -0,0 +1,85 @@
+"""Unit tests for the batch sync runner."""
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+from api.quota import QuotaPacer
+from batch_sync import BatchSync, load_jobs, load_checkpoint
+
+
+SAMPLES = [
+    {'startDate': '2026-01-17T00:00:00', 'endDate': '2026-01-17T04:00:00', 'value': 'Core', 'sourceName': 'Test'},
+    {'startDate': '2026-01-17T04:00:00', 'endDate': '2026-01-17T07:00:00', 'value': 'Deep', 'sourceName': 'Test'},
+]
+
+
+class TestBatchSync(unittest.TestCase):
+    """Test job discovery, checkpointing and the batch pipeline."""
+    
+    def setUp(self):
+        """Create a directory of per-user exports."""
+        self.tmp = tempfile.TemporaryDirectory()
+        for email in ['a@example.com', 'b@example.com']:
+            with open(os.path.join(self.tmp.name, f'{email}.json'), 'w') as f:
+                json.dump({'samples': SAMPLES}, f)
+        self.checkpoint = os.path.join(self.tmp.name, 'progress.jsonl')
+    
+    def tearDown(self):
+        """Remove temporary files."""
+        self.tmp.cleanup()
+    
+    def test_load_jobs_directory(self):
+        """Test exports are discovered by email file name."""
+        jobs = load_jobs(self.tmp.name)
+        self.assertEqual([email for email, _ in jobs], ['a@example.com', 'b@example.com'])
+    
+    def test_load_jobs_manifest(self):
+        """Test manifest paths resolve relative to the manifest."""
+        manifest = os.path.join(self.tmp.name, 'manifest.json')
+        with open(manifest, 'w') as f:
+            json.dump({'a@example.com': 'a@example.com.json'}, f)
+        jobs = load_jobs(manifest)
+        self.assertEqual(jobs, [('a@example.com', os.path.join(self.tmp.name, 'a@example.com.json'))])
+    
+    @patch('batch_sync.BatchSink')
+    @patch('batch_sync.SleepCalendar')
+    def test_run_and_resume(self, mock_cal_class, mock_sink_class):
+        """Test a run syncs every user and a rerun skips completed users."""
+        mock_cal = MagicMock()
+        mock_cal.get_or_create_calendar.return_value = 'cal-id'
+        mock_cal.calendar_id = 'cal-id'
+        mock_cal_class.return_value = mock_cal
+        mock_sink_class.return_value.write.return_value = 3
+        
+        jobs = load_jobs(self.tmp.name)
+        report = BatchSync(jobs, days=100000, workers=1, checkpoint=self.checkpoint).run()
+        self.assertEqual(report['users_synced'], 2)
+        self.assertEqual(report['events_synced'], 6)
+        self.assertEqual(load_checkpoint(self.checkpoint), {'a@example.com', 'b@example.com'})
+        
+        report = BatchSync(jobs, days=100000, workers=1, checkpoint=self.checkpoint).run()
+        self.assertEqual(report['users_skipped'], 2)
+        self.assertEqual(report['users_synced'], 0)
+        mock_sink_class.assert_called_with(mock_cal, update=True)
+        
+        # Without a checkpoint every user is synced again
+        report = BatchSync(jobs, days=100000, workers=1).run()
+        self.assertEqual(report['users_synced'], 2)
+
+
+class TestQuotaPacer(unittest.TestCase):
+    """Test per-account token buckets."""
+    
+    def test_burst_then_wait(self):
+        """Test calls beyond the burst must wait."""
+        pacer = QuotaPacer(requests_per_second=10, burst=2)
+        self.assertEqual(pacer._reserve('sa'), 0.0)
+        self.assertEqual(pacer._reserve('sa'), 0.0)
+        self.assertGreater(pacer._reserve('sa'), 0.0)
+        # Other accounts have their own bucket
+        self.assertEqual(pacer._reserve('other'), 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
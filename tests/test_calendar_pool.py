@@ -0,0 +1,118 @@
+"""Unit tests for the pre-provisioned calendar pool."""
+import time
+import unittest
+from unittest.mock import patch
+from google.auth.credentials import AnonymousCredentials
+from api.calendar_pool import POOL_PREFIX, CalendarPool, pool_stamp, pool_summary
+from api.sleep_calendar import SleepCalendar
+from benchmarks.fake_calendar import FakeCalendarServer
+
+
+class TestCalendarPool(unittest.TestCase):
+    """Test provisioning, claiming and refilling against the fake Calendar API."""
+
+    def setUp(self):
+        """Start a fake Calendar API."""
+        self.server = FakeCalendarServer()
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        self.pool = CalendarPool(size=2)
+
+    def calendar(self, email='a@example.com'):
+        return SleepCalendar(credentials=AnonymousCredentials(), api_endpoint=self.server.url,
+                             user_email=email, calendar_pool=self.pool)
+
+    def wait_for_refill(self):
+        deadline = time.monotonic() + 5
+        while self.pool.stats()['ready'].get('default', 0) < self.pool.size or self.pool._refilling:
+            self.assertLess(time.monotonic(), deadline, 'pool was not refilled')
+            time.sleep(0.01)
+
+    def test_first_sync_claims_in_one_batch(self):
+        """Test a first sync renames and shares a pooled calendar instead of creating one."""
+        self.pool.refill(self.calendar(), wait=True)
+        calendars = self.server.state.calendars
+        self.assertEqual(len(calendars), 2)
+        for calendar in calendars.values():
+            self.assertTrue(calendar['summary'].startswith(POOL_PREFIX))
+            self.assertIn({'type': 'default'}, [rule['scope'] for rule in calendar['acl']])
+
+        self.server.state.reset_counters()
+        cal_id = self.calendar().get_or_create_calendar()
+        self.assertEqual(calendars[cal_id]['summary'], 'Sleep Data - a@example.com')
+        self.assertIn({'type': 'user', 'value': 'a@example.com'}, [rule['scope'] for rule in calendars[cal_id]['acl']])
+
+        self.wait_for_refill()
+        self.assertEqual(len(calendars), 3)
+        # calendarList.list and one batch; the rest is the background refill
+        stats = self.server.state.stats()
+        self.assertEqual(stats['calls_by_endpoint']['batch'], 1)
+        self.assertEqual(stats['calls_by_endpoint']['calendars.insert'], 1)
+        self.assertEqual(stats['http_requests'], 2 + 2)
+        # Returning users find their calendar as before
+        self.assertEqual(self.calendar().get_or_create_calendar(), cal_id)
+        self.assertEqual(self.pool.stats()['claimed'], 1)
+
+    def test_claim_comes_before_previous_owners(self):
+        """Test a ready calendar is claimed without looking under other accounts."""
+        self.pool.refill(self.calendar(), wait=True)
+        with patch.object(SleepCalendar, '_find_in_other_accounts', return_value=None) as previous:
+            cal_id = self.calendar().get_or_create_calendar()
+            self.assertTrue(cal_id)
+            previous.assert_not_called()
+            self.wait_for_refill()
+            # Nothing to claim: earlier owners are checked before creating
+            self.pool.size = 0
+            self.calendar('b@example.com').get_or_create_calendar()
+            previous.assert_called_once()
+
+    def test_empty_pool_falls_back_to_creating(self):
+        """Test a miss creates the calendar directly and starts a refill."""
+        cal_id = self.calendar().get_or_create_calendar()
+        self.assertEqual(self.server.state.calendars[cal_id]['summary'], 'Sleep Data - a@example.com')
+        self.assertEqual(self.pool.stats()['misses'], 1)
+        self.wait_for_refill()
+
+    def test_lost_pooled_calendar_falls_back_to_creating(self):
+        """Test a pooled calendar deleted behind the pool's back is skipped."""
+        self.pool.refill(self.calendar(), wait=True)
+        for cal_id in list(self.server.state.calendars):
+            del self.server.state.calendars[cal_id]
+        cal_id = self.calendar().get_or_create_calendar()
+        self.assertEqual(self.server.state.calendars[cal_id]['summary'], 'Sleep Data - a@example.com')
+
+    def test_refill_adopts_expired_calendars(self):
+        """Test a starting instance takes over unclaimed calendars whose lease ran out before creating any."""
+        calendars = self.server.state.calendars
+        for cal_id, summary in (('legacy', POOL_PREFIX + 'a1b2c3d4e5f6'),
+                                ('expired', pool_summary(time.time() - 2 * 86400)),
+                                ('leased', pool_summary())):
+            calendars[cal_id] = {'summary': summary, 'timeZone': 'UTC', 'events': {}, 'acl': []}
+        self.pool.refill(self.calendar(), wait=True)
+        self.assertEqual(self.pool.held(), {'legacy', 'expired'})
+        self.assertEqual(self.pool.stats()['adopted'], 2)
+        self.assertNotIn('calendars.insert', self.server.state.stats()['calls_by_endpoint'])
+        for cal_id in ('legacy', 'expired'):
+            self.assertGreater(pool_stamp(calendars[cal_id]['summary']), time.time() - 60)
+
+        # Another instance finds nothing left to adopt and provisions its own
+        other = CalendarPool(size=2)
+        other.refill(self.calendar(), wait=True)
+        self.assertEqual(other.stats()['adopted'], 0)
+        self.assertEqual(other.stats()['provisioned'], 2)
+
+    def test_expired_lease_is_not_handed_out(self):
+        """Test a calendar held past its lease is skipped and adopted again by the refill."""
+        self.pool.refill(self.calendar(), wait=True)
+        held = self.pool.held()
+        with patch('api.calendar_pool.time.time', return_value=time.time() + 86400):
+            cal_id = self.calendar().get_or_create_calendar()
+            self.assertNotIn(cal_id, held)
+            self.assertEqual(self.pool.stats()['expired'], 2)
+            self.wait_for_refill()
+        self.assertEqual(self.pool.held(), held)
+        self.assertEqual(self.pool.stats()['adopted'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,197 @@
+"""Unit tests for the Calendar circuit breakers, bulkhead and timeouts."""
+import socket
+import threading
+import unittest
+from unittest.mock import patch, MagicMock
+from fastapi.testclient import TestClient
+from api.circuit_breaker import (BreakerRegistry, Bulkhead, BulkheadFullError, CircuitBreaker,
+                                 CircuitOpenError, timeout_http)
+from api.server import app
+from api.sleep_calendar import SleepCalendar, build_session_summaries
+from api.sync_cache import payload_cache
+from googleapiclient.errors import HttpError
+
+
+def http_error(status):
+    """An HttpError with the given status."""
+    return HttpError(MagicMock(status=status), b'{}')
+
+
+def fail(error):
+    def call():
+        raise error
+    return call
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Test breaker state transitions with a fake clock."""
+
+    def setUp(self):
+        """Set up a breaker on a controllable clock."""
+        self.clock = [0.0]
+        patcher = patch('api.circuit_breaker.time.monotonic', side_effect=lambda: self.clock[0])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=30)
+
+    def test_opens_after_consecutive_failures(self):
+        """Test only server errors and timeouts count, and successes reset the count."""
+        for error in (http_error(503), socket.timeout('read timed out'), http_error(404)):
+            with self.assertRaises(Exception):
+                self.breaker.call(fail(error))
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(self.breaker.failures, 0)
+
+        for _ in range(3):
+            with self.assertRaises(HttpError):
+                self.breaker.call(fail(http_error(500)))
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError) as context:
+            self.breaker.call(lambda: 'not called')
+        self.assertEqual(context.exception.retry_after, 30)
+
+    def test_half_open_probe(self):
+        """Test one probe goes through after the recovery timeout and decides the state."""
+        for _ in range(3):
+            with self.assertRaises(HttpError):
+                self.breaker.call(fail(http_error(500)))
+
+        self.clock[0] = 31
+        with self.assertRaises(HttpError):
+            self.breaker.call(fail(http_error(500)))
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+        self.clock[0] = 62
+        probing = threading.Event()
+        release = threading.Event()
+
+        def slow_probe():
+            probing.set()
+            release.wait(5)
+            return 'ok'
+        thread = threading.Thread(target=self.breaker.call, args=(slow_probe,))
+        thread.start()
+        probing.wait(5)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.call(lambda: 'second probe')
+        release.set()
+        thread.join()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(self.breaker.stats()['times_opened'], 2)
+
+    def test_registry_is_per_account_and_endpoint(self):
+        """Test breakers are shared per key and reported in stats."""
+        registry = BreakerRegistry(failure_threshold=1)
+        insert = registry.get('sa-1', 'calendar.events.insert')
+        self.assertIs(registry.get('sa-1', 'calendar.events.insert'), insert)
+        self.assertIsNot(registry.get('sa-2', 'calendar.events.insert'), insert)
+        with self.assertRaises(HttpError):
+            insert.call(fail(http_error(502)))
+        stats = registry.stats()
+        self.assertEqual(stats['sa-1 calendar.events.insert']['state'], 'open')
+        self.assertEqual(stats['sa-2 calendar.events.insert']['state'], 'closed')
+
+
+class TestBulkhead(unittest.TestCase):
+    """Test the concurrency cap."""
+
+    def test_rejects_when_full(self):
+        """Test calls beyond the cap wait, then fail with BulkheadFullError."""
+        bulkhead = Bulkhead(max_concurrent=1, max_wait=0.05)
+        inside = threading.Event()
+        release = threading.Event()
+
+        def hold():
+            inside.set()
+            release.wait(5)
+        thread = threading.Thread(target=bulkhead.call, args=(hold,))
+        thread.start()
+        inside.wait(5)
+        self.assertEqual(bulkhead.stats()['in_flight'], 1)
+        with self.assertRaises(BulkheadFullError):
+            bulkhead.call(lambda: 'no slot')
+        release.set()
+        thread.join()
+        self.assertEqual(bulkhead.call(lambda: 'slot'), 'slot')
+        self.assertEqual(bulkhead.stats(), {'in_flight': 0, 'max_concurrent': 1, 'rejected': 1})
+
+    def test_rejection_is_not_a_breaker_outcome(self):
+        """Test a full bulkhead neither trips nor resets the breaker."""
+        breaker = CircuitBreaker(failure_threshold=2)
+        with self.assertRaises(HttpError):
+            breaker.call(fail(http_error(500)))
+        with self.assertRaises(BulkheadFullError):
+            breaker.call(fail(BulkheadFullError('full')))
+        self.assertEqual(breaker.failures, 1)
+
+
+class TestTimeouts(unittest.TestCase):
+    """Test connect and read timeouts are applied separately."""
+
+    def test_read_timeout_after_connect(self):
+        """Test the socket uses the read timeout once connected."""
+        server = socket.socket()
+        server.bind(('127.0.0.1', 0))
+        server.listen(1)
+        self.addCleanup(server.close)
+        http = timeout_http(connect_timeout=2, read_timeout=0.2)
+        self.assertEqual(http.timeout, 2)
+        with self.assertRaises((socket.timeout, TimeoutError)):
+            # The server accepts but never answers
+            http.request(f'http://127.0.0.1:{server.getsockname()[1]}/')
+
+
+class TestDeferredSync(unittest.TestCase):
+    """Test an unavailable Calendar API defers nights instead of failing them."""
+
+    @patch('api.sleep_calendar.service_account.Credentials')
+    @patch('api.sleep_calendar.build')
+    def test_sync_defers_when_circuit_opens(self, mock_build, mock_creds):
+        """Test nights after the circuit opens are left for a continuation."""
+        samples = [
+            {'startDate': f'2026-01-0{day}T00:00:00', 'endDate': f'2026-01-0{day}T07:00:00', 'value': 'Core', 'sourceName': 'Test'}
+            for day in range(1, 5)
+        ]
+        summaries = build_session_summaries(samples, days=100000)
+        cal = SleepCalendar(credentials_json={'type': 'service_account'}, user_email='a@example.com')
+        with patch.object(cal, '_sync_session', side_effect=[(1, True), CircuitOpenError('open', 30)]):
+            self.assertEqual(cal.sync_sessions(summaries), 1)
+        self.assertEqual(len(cal.remaining_sessions), 3)
+        self.assertEqual(cal.resume_before.day, 4)
+
+        with patch.object(cal, '_sync_session', side_effect=CircuitOpenError('open', 30)):
+            with self.assertRaises(CircuitOpenError):
+                cal.sync_sessions(summaries)
+
+
+class TestCircuitEndpoint(unittest.TestCase):
+    """Test /sync and /metrics surface the breaker."""
+
+    def setUp(self):
+        """Set up test client."""
+        self.client = TestClient(app)
+        payload_cache.clear()
+
+    @patch('api.server.SleepCalendar')
+    def test_sync_returns_503_when_calendar_unavailable(self, mock_cal_class):
+        """Test an open circuit is a retryable 503, not a 500."""
+        mock_cal = MagicMock()
+        mock_cal.sync_from_data.side_effect = CircuitOpenError('open', retry_after=12.5)
+        mock_cal_class.return_value = mock_cal
+        request_data = {
+            "email": "test@example.com",
+            "samples": [{"startDate": "2026-01-01T00:00:00", "endDate": "2026-01-01T07:00:00", "value": "Core"}]
+        }
+
+        response = self.client.post("/sync", json=request_data)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["retry-after"], "13")
+        self.assertEqual(response.json()["error_code"], "CALENDAR_UNAVAILABLE")
+
+        calendar = self.client.get("/metrics").json()["calendar"]
+        self.assertIn("breakers", calendar)
+        self.assertIn("in_flight", calendar["bulkhead"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+"""Unit tests for the fast JSON codec."""
+import importlib.util
+import json
+import pickle
+import sys
+import unittest
+from unittest.mock import patch, MagicMock
+from fastapi.testclient import TestClient
+from api import codec
+from api.server import app
+from api.sleep_calendar import build_session_summaries
+from api.sync_cache import PayloadCache, payload_cache
+from benchmarks.datasets import generate_samples
+
+
+def stdlib_codec():
+    """A fresh copy of api.codec loaded as if msgspec and orjson were not installed."""
+    spec = importlib.util.spec_from_file_location('codec_stdlib', codec.__file__)
+    module = importlib.util.module_from_spec(spec)
+    with patch.dict(sys.modules, {'msgspec': None, 'orjson': None}):
+        spec.loader.exec_module(module)
+    # Importable by name, so its samples can be pickled
+    sys.modules['codec_stdlib'] = module
+    return module
+
+
+SAMPLES = [
+    {'startDate': '2026-01-17T02:22:00', 'endDate': '2026-01-17T02:56:00', 'value': 'Core', 'sourceName': 'Watch'},
+    {'startDate': '2026-01-17T02:56:00', 'endDate': '2026-01-17T03:10:00', 'value': 'REM', 'source': None,
+     'extra': 1},
+]
+
+
+class TestCodec(unittest.TestCase):
+    """Test decoding with the installed backend and the stdlib fallback."""
+
+    def setUp(self):
+        patcher = patch.dict(sys.modules)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.codecs = [codec, stdlib_codec()]
+        self.assertEqual(self.codecs[1].BACKEND, 'json')
+
+    def test_decode_sync_body(self):
+        """Test list and NDJSON bodies decode to the same samples."""
+        ndjson = '\n'.join(json.dumps(sample) for sample in SAMPLES) + '\n\n'
+        for module in self.codecs:
+            with self.subTest(backend=module.BACKEND):
+                as_list = module.decode_sync_body(json.dumps({'email': 'a@example.com', 'samples': SAMPLES}))
+                as_ndjson = module.decode_sync_body(json.dumps({'email': 'a@example.com', 'samples': ndjson}))
+                self.assertEqual(as_list['samples'], as_ndjson['samples'])
+                self.assertEqual(as_list['mode'], 'calendar')
+                self.assertIsInstance(as_list['samples'][0], module.Sample)
+                self.assertIsNone(module.decode_sync_body(b'{"email": "a@example.com"}')['samples'])
+
+    def test_backends_agree_on_optional_fields(self):
+        """Test null and missing optional fields decode the same with every backend."""
+        bodies = [
+            {'email': 'a@example.com', 'samples': SAMPLES, 'mode': None, 'continuation_token': None},
+            {'email': 'a@example.com', 'samples': SAMPLES},
+            {'email': 'a@example.com', 'samples': SAMPLES, 'mode': 'ics'},
+        ]
+        for body in bodies:
+            with self.subTest(body=body):
+                decoded = [module.decode_sync_body(json.dumps(body)) for module in self.codecs]
+                self.assertEqual([data['mode'] for data in decoded], [body.get('mode') or 'calendar'] * 2)
+                self.assertEqual([[s.to_dict() for s in data['samples']] for data in decoded],
+                                 [[s.to_dict() for s in decoded[0]['samples']]] * 2)
+                self.assertEqual([data['continuation_token'] for data in decoded], [None, None])
+
+    def test_sample_keeps_dict_semantics(self):
+        """Test get() distinguishes missing keys from nulls, like the dicts it replaces."""
+        for module in self.codecs:
+            with self.subTest(backend=module.BACKEND):
+                sample = module.decode_samples(SAMPLES)[1]
+                self.assertEqual(sample.get('value', 'Unknown'), 'REM')
+                self.assertIsNone(sample.get('source', 'x'))
+                self.assertEqual(sample.get('sourceName', 'x'), 'x')
+                self.assertEqual(sample.get('extra', 'x'), 'x')
+                self.assertNotIn('sourceName', sample)
+                self.assertEqual(sample.to_dict(), {key: SAMPLES[1][key] for key in SAMPLES[1] if key != 'extra'})
+                self.assertEqual(pickle.loads(pickle.dumps(sample)), sample)
+
+    def test_invalid_input_raises_value_error(self):
+        """Test malformed bodies and non-object samples raise ValueError."""
+        for module in self.codecs:
+            for body in (b'not json', b'[1]', b'{"samples": [1]}', b'{"samples": "{\\"a\\": 1}\\n{"}'):
+                with self.subTest(backend=module.BACKEND, body=body):
+                    with self.assertRaises(ValueError):
+                        module.decode_sync_body(body)
+
+    def test_summaries_match_dicts(self):
+        """Test summaries built from decoded samples equal those built from dicts."""
+        samples = generate_samples(10)
+        expected = build_session_summaries(samples, days=100000)
+        for module in self.codecs:
+            with self.subTest(backend=module.BACKEND):
+                decoded = module.decode_samples(module.dumps(samples).decode('utf-8').replace('},{', '}\n{')[1:-1])
+                self.assertEqual(build_session_summaries(decoded, days=100000), expected)
+
+    def test_fingerprint_matches_dicts(self):
+        """Test decoded samples fingerprint like the equivalent dicts."""
+        dicts = [{key: value for key, value in sample.items() if key != 'extra'} for sample in SAMPLES]
+        self.assertEqual(PayloadCache.fingerprint(codec.decode_samples(SAMPLES)), PayloadCache.fingerprint(dicts))
+
+
+class TestSyncDecoding(unittest.TestCase):
+    """Test /sync request decoding end to end."""
+
+    def setUp(self):
+        self.client = TestClient(app)
+        payload_cache.clear()
+
+    @patch('api.server.SleepCalendar')
+    def test_sync_passes_samples(self, mock_cal_class):
+        """Test /sync hands decoded samples to the pipeline."""
+        mock_cal = MagicMock()
+        mock_cal.calendar_id = 'cal'
+        mock_cal.sync_from_data.return_value = 1
+        mock_cal.remaining_sessions = []
+        mock_cal_class.return_value = mock_cal
+
+        response = self.client.post('/sync', json={'email': 'a@example.com', 'samples': SAMPLES})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['events_synced'], 1)
+        samples = mock_cal.sync_from_data.call_args[0][0]['samples']
+        self.assertEqual([sample.get('value') for sample in samples], ['Core', 'REM'])
+
+    def test_invalid_bodies_are_422(self):
+        """Test malformed JSON and invalid fields are validation errors."""
+        for body in (b'{', b'{"email": "a@example.com", "samples": [1]}',
+                     b'{"email": "a@example.com", "samples": [], "mode": "other"}'):
+            with self.subTest(body=body):
+                response = self.client.post('/sync', content=body, headers={'content-type': 'application/json'})
+                self.assertEqual(response.status_code, 422)
+
+    def test_openapi_documents_body(self):
+        """Test the request schema is still published."""
+        schema = self.client.get('/openapi.json').json()
+        body = schema['paths']['/sync']['post']['requestBody']['content']['application/json']['schema']
+        self.assertIn('samples', body['properties'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+"""Unit tests for CredentialPool sharding."""
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from google.auth.credentials import AnonymousCredentials
+from api.calendar_directory import CalendarDirectory
+from api.credential_pool import CredentialPool, load_credentials_info
+from api.sleep_calendar import SleepCalendar
+
+
+def make_accounts(count):
+    """Build fake service account infos."""
+    return [{'type': 'service_account', 'client_email': f'sa-{i}@example.iam.gserviceaccount.com'}
+            for i in range(count)]
+
+
+class TestCredentialPool(unittest.TestCase):
+    """Test consistent-hash routing of users to service accounts."""
+    
+    def setUp(self):
+        """Set up sample emails."""
+        self.emails = [f'user{i}@example.com' for i in range(2000)]
+    
+    def test_shard_is_deterministic(self):
+        """Test the same email always maps to the same account."""
+        pool = CredentialPool(make_accounts(4))
+        other = CredentialPool(list(reversed(make_accounts(4))))
+        for email in self.emails[:100]:
+            self.assertEqual(pool.account_for(email), other.account_for(email))
+            self.assertEqual(pool.account_for(email), pool.account_for(email.upper()))
+    
+    def test_distribution_is_balanced(self):
+        """Test users are spread across all accounts."""
+        pool = CredentialPool(make_accounts(4))
+        counts = [0] * 4
+        for email in self.emails:
+            counts[pool.shard_for(email)] += 1
+        for count in counts:
+            self.assertGreater(count, len(self.emails) / 4 * 0.6)
+    
+    def test_adding_account_moves_few_users(self):
+        """Test adding an account only reassigns roughly 1/N of users."""
+        before = CredentialPool(make_accounts(4))
+        after = CredentialPool(make_accounts(5))
+        moved = sum(1 for e in self.emails if before.account_for(e) != after.account_for(e))
+        self.assertLess(moved, len(self.emails) * 0.35)
+    
+    def test_from_directory(self):
+        """Test loading accounts from a directory of JSON keys."""
+        with tempfile.TemporaryDirectory() as tmp:
+            for i, info in enumerate(make_accounts(3)):
+                with open(os.path.join(tmp, f'sa-{i}.json'), 'w') as f:
+                    json.dump(info, f)
+            pool = CredentialPool.from_directory(tmp)
+        self.assertEqual(len(pool), 3)
+    
+    def test_load_credentials_info_base64(self):
+        """Test base64-encoded JSON credentials are decoded."""
+        import base64
+        encoded = base64.b64encode(json.dumps({'client_email': 'a@b.c'}).encode()).decode()
+        self.assertEqual(load_credentials_info(encoded), {'client_email': 'a@b.c'})
+    
+    @patch('api.credential_pool.service_account.Credentials')
+    def test_credentials_cached_per_shard(self, mock_creds):
+        """Test credentials are built once per shard."""
+        pool = CredentialPool(make_accounts(2))
+        pool.credentials_for('user@example.com')
+        pool.credentials_for('user@example.com')
+        self.assertEqual(mock_creds.from_service_account_info.call_count, 1)
+    
+    def test_directory_pins_existing_users(self):
+        """Test users with a recorded calendar keep their account when one is added."""
+        before = CredentialPool(make_accounts(4))
+        after = CredentialPool(make_accounts(5))
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = CalendarDirectory(os.path.join(tmp, 'directory.db'))
+            for email in self.emails[:500]:
+                directory.put(before.account_for(email), f'Sleep Data - {email}', f'cal-{email}')
+            for email in self.emails[:500]:
+                self.assertEqual(after.account_for(email, directory), before.account_for(email))
+            moved = sum(1 for e in self.emails[500:] if after.account_for(e, directory) != before.account_for(e))
+            self.assertGreater(moved, 0)
+    
+    def test_previous_owners_only_after_the_ring_changed(self):
+        """Test only users an added account moved have a previous owner."""
+        before = CredentialPool(make_accounts(4))
+        after = CredentialPool(make_accounts(5))
+        self.assertEqual(after.previous_owners(self.emails[0], []), [])
+        rings = [before.account_ids]
+        for email in self.emails[:500]:
+            owners = after.previous_owners(email, rings)
+            if after.account_for(email) == before.account_for(email):
+                self.assertEqual(owners, [])
+            else:
+                self.assertEqual(owners, [before.shard_for(email)])
+    
+    @patch('api.credential_pool.service_account.Credentials')
+    def test_calendar_found_under_previous_account(self, mock_creds):
+        """Test a user moved on the ring keeps the calendar their previous account owns."""
+        mock_creds.from_service_account_info.return_value = AnonymousCredentials()
+        before = CredentialPool(make_accounts(2))
+        pool = CredentialPool(make_accounts(3))
+        email = next(e for e in self.emails if pool.account_for(e) != before.account_for(e))
+        owner = before.account_for(email)
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = CalendarDirectory(os.path.join(tmp, 'directory.db'))
+            directory.rings(before.account_ids)
+            with patch.object(SleepCalendar, 'find_calendar', autospec=True,
+                              side_effect=lambda cal, name: 'cal-1' if cal.account == owner else None):
+                cal = SleepCalendar(user_email=email, credential_pool=pool, calendar_directory=directory)
+                self.assertEqual(cal.get_or_create_calendar(), 'cal-1')
+            self.assertEqual(cal.account, owner)
+            self.assertEqual(directory.accounts(f'Sleep Data - {email}'), [owner])
+            # Later syncs start on the owning account
+            self.assertEqual(SleepCalendar(user_email=email, credential_pool=pool,
+                                           calendar_directory=directory).account, owner)
+    
+    @patch('api.credential_pool.service_account.Credentials')
+    def test_other_accounts_not_scanned_for_new_users(self, mock_creds):
+        """Test a first sync only lists its own account's calendars, and misses are remembered."""
+        mock_creds.from_service_account_info.return_value = AnonymousCredentials()
+        pool = CredentialPool(make_accounts(3))
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = CalendarDirectory(os.path.join(tmp, 'directory.db'))
+            with patch.object(SleepCalendar, 'find_calendar', autospec=True, return_value=None) as find:
+                cal = SleepCalendar(user_email=self.emails[0], credential_pool=pool, calendar_directory=directory)
+                self.assertIsNone(cal._find_in_other_accounts(f'Sleep Data - {self.emails[0]}'))
+                self.assertEqual(find.call_count, 0)
+                # The pool grew: one look under the previous owner, once
+                bigger = CredentialPool(make_accounts(4))
+                email = next(e for e in self.emails if bigger.account_for(e) != pool.account_for(e))
+                for _ in range(2):
+                    cal = SleepCalendar(user_email=email, credential_pool=bigger, calendar_directory=directory)
+                    self.assertIsNone(cal._find_in_other_accounts(f'Sleep Data - {email}'))
+                self.assertEqual([call.args[0].account for call in find.call_args_list], [pool.account_for(email)])
+
+if __name__ == '__main__':
+    unittest.main()
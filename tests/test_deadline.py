@@ -0,0 +1,130 @@
+"""Unit tests for deadline-aware syncs and continuation tokens."""
+import os
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import patch, MagicMock
+from fastapi.testclient import TestClient
+from api.deadline import decode_continuation, encode_continuation, parse_deadline
+from api.server import app
+from api.session_store import token_secret
+from api.sleep_calendar import SleepCalendar, build_session_summaries
+from api.sync_cache import payload_cache
+
+
+def nights(count):
+    """Samples for `count` consecutive January 2026 nights."""
+    return [
+        {'startDate': f'2026-01-{day:02d}T00:00:00', 'endDate': f'2026-01-{day:02d}T07:00:00', 'value': 'Core', 'sourceName': 'Test'}
+        for day in range(1, count + 1)
+    ]
+
+
+class TestDeadline(unittest.TestCase):
+    """Test budgets, tokens and stopping early."""
+
+    @patch('api.deadline.MARGIN', 1.0)
+    @patch('api.deadline.time.monotonic', return_value=100.0)
+    def test_parse_deadline(self, mock_monotonic):
+        """Test relative, millisecond, absolute and default budgets."""
+        self.assertEqual(parse_deadline('25'), 124.0)
+        self.assertEqual(parse_deadline('25s'), 124.0)
+        self.assertEqual(parse_deadline('1500ms'), 100.5)
+        with patch('api.deadline.time.time', return_value=1_800_000_000.0):
+            self.assertEqual(parse_deadline('1800000030'), 129.0)
+        self.assertIsNone(parse_deadline(None, default=''))
+        self.assertEqual(parse_deadline('', default='60'), 159.0)
+        with self.assertRaises(ValueError):
+            parse_deadline('soon')
+
+    def test_continuation_token(self):
+        """Test tokens only resume the same user and payload, and resist tampering."""
+        before = datetime(2026, 1, 10, 8, tzinfo=timezone.utc)
+        token = encode_continuation('A@example.com', 'fp', before)
+        self.assertEqual(decode_continuation(token, 'a@example.com', 'fp'), before)
+        self.assertIsNone(decode_continuation(token, 'b@example.com', 'fp'))
+        self.assertIsNone(decode_continuation(token, 'a@example.com', 'other'))
+        self.assertIsNone(decode_continuation('x' + token, 'a@example.com', 'fp'))
+        self.assertIsNone(decode_continuation('garbage', 'a@example.com', 'fp'))
+
+    def test_token_secret_never_empty(self):
+        """Test an unset ICS_TOKEN_SECRET falls back to one random key per database."""
+        with tempfile.TemporaryDirectory() as workdir, patch.dict(os.environ, {}, clear=True):
+            first, second = (os.path.join(workdir, name) for name in ('first.db', 'second.db'))
+            secret = token_secret(first)
+            self.assertEqual(len(secret), 64)
+            self.assertEqual(token_secret(first), secret)
+            self.assertNotEqual(token_secret(second), secret)
+            with patch.dict('api.session_store._generated_secrets', clear=True):
+                # Another worker process on the same database
+                self.assertEqual(token_secret(first), secret)
+            with patch.dict(os.environ, {'ICS_TOKEN_SECRET': 'configured'}):
+                self.assertEqual(token_secret(first), b'configured')
+
+    @patch('api.sleep_calendar.service_account.Credentials')
+    @patch('api.sleep_calendar.build')
+    def test_sync_stops_before_deadline_newest_first(self, mock_build, mock_creds):
+        """Test nights run newest first and the sync stops when the next would overrun."""
+        clock = [0.0]
+        written = []
+
+        def sync_session(summary):
+            clock[0] += 1.0
+            written.append(summary['start'].day)
+            return 1, True
+
+        cal = SleepCalendar(credentials_json={'type': 'service_account'}, user_email='a@example.com')
+        summaries = build_session_summaries(nights(5), days=100000)
+        with patch.object(cal, '_sync_session', side_effect=sync_session), \
+                patch('api.sleep_calendar.time.monotonic', side_effect=lambda: clock[0]):
+            self.assertEqual(cal.sync_sessions(summaries, deadline=3.5), 3)
+        self.assertEqual(written, [5, 4, 3])
+        self.assertEqual([s['start'].day for s in cal.remaining_sessions], [2, 1])
+        self.assertEqual(cal.resume_before.day, 3)
+
+        written.clear()
+        with patch.object(cal, '_sync_session', side_effect=sync_session):
+            cal.sync_sessions(summaries, before=cal.resume_before)
+        self.assertEqual(written, [2, 1])
+        self.assertEqual(cal.remaining_sessions, [])
+
+
+class TestDeadlineEndpoint(unittest.TestCase):
+    """Test /sync returns and honours continuation tokens."""
+
+    def setUp(self):
+        """Set up test client."""
+        self.client = TestClient(app)
+        payload_cache.clear()
+
+    @patch('api.server.SleepCalendar')
+    def test_partial_sync_returns_continuation(self, mock_cal_class):
+        """Test a partial sync is not cached and its token resumes the same payload."""
+        resume_before = datetime(2026, 1, 3, 8, tzinfo=timezone.utc)
+        mock_cal = MagicMock()
+        mock_cal.calendar_id = "test-calendar-id"
+        mock_cal.sync_from_data.return_value = 3
+        mock_cal.remaining_sessions = [{}, {}]
+        mock_cal.resume_before = resume_before
+        mock_cal_class.return_value = mock_cal
+        request_data = {"email": "test@example.com", "samples": nights(5)}
+
+        response = self.client.post("/sync", json=request_data, headers={"X-Request-Deadline": "30"})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["remaining_nights"], 2)
+        self.assertIsNotNone(mock_cal.sync_from_data.call_args.kwargs["deadline"])
+
+        mock_cal.remaining_sessions = []
+        request_data["continuation_token"] = data["continuation_token"]
+        response = self.client.post("/sync", json=request_data)
+        self.assertEqual(response.json()["remaining_nights"], 0)
+        self.assertEqual(mock_cal.sync_from_data.call_count, 2)
+        self.assertEqual(mock_cal.sync_from_data.call_args.kwargs["before"], resume_before)
+        self.assertIsNone(mock_cal.sync_from_data.call_args.kwargs["deadline"])
+
+        self.assertEqual(self.client.post("/sync?deadline=later", json=request_data).status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
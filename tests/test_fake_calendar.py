@@ -0,0 +1,75 @@
+"""Offline end-to-end tests against the fake Calendar API used by benchmarks."""
+import unittest
+from google.auth.credentials import AnonymousCredentials
+from api.sleep_calendar import SleepCalendar
+from benchmarks.datasets import generate_samples
+from benchmarks.fake_calendar import FakeCalendarServer
+
+
+class TestFakeCalendar(unittest.TestCase):
+    """Drive SleepCalendar against a local fake Calendar v3 server."""
+    
+    @classmethod
+    def setUpClass(cls):
+        """Start the fake server."""
+        cls.server = FakeCalendarServer().start()
+    
+    @classmethod
+    def tearDownClass(cls):
+        """Stop the fake server."""
+        cls.server.stop()
+    
+    def setUp(self):
+        """Reset server state and build a client."""
+        self.server.state.reset()
+        self.cal = SleepCalendar(credentials=AnonymousCredentials(), api_endpoint=self.server.url,
+                                 user_email='bench@example.com')
+    
+    def test_sync_is_idempotent(self):
+        """Test a second sync of the same data inserts nothing."""
+        samples = generate_samples(3)
+        first = self.cal.sync_from_data({'samples': samples})
+        self.assertGreater(first, 0)
+        self.assertEqual(self.server.state.stats()['events'], first)
+        self.assertEqual(self.cal.sync_from_data({'samples': samples}), 0)
+        self.assertEqual(self.server.state.stats()['calendars'], 1)
+    
+    def test_finds_calendar_beyond_first_page(self):
+        """Test an existing calendar on a later calendarList page is reused."""
+        for i in range(150):
+            self.cal.service.calendars().insert(body={'summary': f'Other {i}'}).execute()
+        cal_id = self.cal.get_or_create_calendar()
+        self.assertEqual(SleepCalendar(credentials=AnonymousCredentials(), api_endpoint=self.server.url,
+                                       user_email='bench@example.com').get_or_create_calendar(), cal_id)
+        self.assertEqual(self.server.state.stats()['calendars'], 151)
+    
+    def test_batch_requests(self):
+        """Test multipart batch calls are executed individually."""
+        cal_id = self.cal.get_or_create_calendar()
+        results = []
+        batch = self.cal.new_batch(callback=lambda request_id, response, error: results.append(error))
+        for i in range(3):
+            batch.add(self.cal.service.events().insert(calendarId=cal_id, body={
+                'summary': f'Event {i}',
+                'start': {'dateTime': '2026-01-01T00:00:00+00:00'},
+                'end': {'dateTime': '2026-01-01T01:00:00+00:00'},
+            }))
+        batch.execute()
+        self.assertEqual(results, [None, None, None])
+        stats = self.server.state.stats()
+        self.assertEqual(stats['events'], 3)
+        self.assertEqual(stats['calls_by_endpoint']['batch'], 1)
+    
+    def test_error_injection(self):
+        """Test injected errors surface as HttpError."""
+        from googleapiclient.errors import HttpError
+        self.server.api.error_rate = 1.0
+        try:
+            with self.assertRaises(HttpError):
+                self.cal.get_or_create_calendar()
+        finally:
+            self.server.api.error_rate = 0.0
+
+
+if __name__ == '__main__':
+    unittest.main()
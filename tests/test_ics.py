@@ -0,0 +1,130 @@
+"""Unit tests for the session store and ICS feed."""
+import os
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from api.ics import FeedCache, render_feed
+from api.server import app
+from api.session_store import SessionStore, feeds_durable
+from api.sleep_calendar import build_session_summaries
+from api.sync_cache import payload_cache
+
+
+NOW = datetime(2026, 1, 20, tzinfo=timezone.utc)
+
+
+def night(day, value='Core'):
+    """Samples for one night on the given day of January 2026."""
+    return [
+        {'startDate': f'2026-01-{day:02d}T00:00:00', 'endDate': f'2026-01-{day:02d}T04:00:00', 'value': value, 'sourceName': 'Test'},
+        {'startDate': f'2026-01-{day:02d}T04:00:00', 'endDate': f'2026-01-{day:02d}T07:00:00', 'value': 'Deep', 'sourceName': 'Test'},
+    ]
+
+
+class TestSessionStore(unittest.TestCase):
+    """Test storing summaries and rendering them."""
+
+    def setUp(self):
+        """Create a store in a temporary database."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = SessionStore(path=os.path.join(self.tmp.name, 'test.db'))
+
+    def tearDown(self):
+        """Remove the temporary database."""
+        self.tmp.cleanup()
+
+    def test_save_round_trip_and_change_detection(self):
+        """Test summaries round-trip and unchanged nights are not rewritten."""
+        summaries = build_session_summaries(night(10) + night(11), now=NOW)
+        self.assertEqual(self.store.save('A@example.com', summaries), 2)
+        self.assertEqual(self.store.save('a@example.com', summaries), 0)
+        stored = self.store.sessions('a@example.com')
+        self.assertEqual([s['start'] for s in stored], [s['start'] for s in summaries])
+        self.assertEqual(stored[0]['intervals'][1]['value'], 'Deep')
+
+        # An earlier sample moves the night's start; the stale row is replaced
+        earlier = [{'startDate': '2026-01-09T23:30:00', 'endDate': '2026-01-10T00:00:00', 'value': 'Core', 'sourceName': 'Test'}]
+        self.store.save('a@example.com', build_session_summaries(earlier + night(10), now=NOW))
+        self.assertEqual(self.store.version('a@example.com')[0], 2)
+
+    def test_render_feed(self):
+        """Test the feed has one event per night and stage, with folded lines."""
+        summaries = build_session_summaries(night(10), now=NOW)
+        body = b''.join(render_feed('a@example.com', summaries, 1700000000))
+        self.assertTrue(body.startswith(b'BEGIN:VCALENDAR\r\n'))
+        self.assertTrue(body.endswith(b'END:VCALENDAR\r\n'))
+        self.assertEqual(body.count(b'BEGIN:VEVENT'), 3)
+        self.assertIn(b'DTSTART:20260110T080000Z', body)
+        self.assertTrue(all(len(line) <= 75 for line in body.split(b'\r\n')))
+        body.decode('utf-8')
+
+
+class TestICSEndpoint(unittest.TestCase):
+    """Test ICS-only sync and conditional feed requests."""
+
+    def setUp(self):
+        """Point the server at a temporary store."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = SessionStore(path=os.path.join(self.tmp.name, 'test.db'))
+        self.cache = FeedCache()
+        self.patches = [patch('api.server.session_store', self.store), patch('api.server.feed_cache', self.cache),
+                        patch('api.server.feed_cutoff', return_value=datetime(2026, 1, 1, tzinfo=timezone.utc)),
+                        patch('api.server.feeds_durable', return_value=True)]
+        for p in self.patches:
+            p.start()
+        self.client = TestClient(app)
+        payload_cache.clear()
+
+    def tearDown(self):
+        """Undo patches and remove the temporary database."""
+        for p in self.patches:
+            p.stop()
+        self.tmp.cleanup()
+
+    @patch('api.server.SleepCalendar')
+    def test_ics_only_sync_and_conditional_get(self, mock_cal_class):
+        """Test ICS mode makes no Calendar calls and the feed honours validators."""
+        with patch('api.server.build_session_summaries', side_effect=lambda s, **kwargs: build_session_summaries(s, now=NOW, **kwargs)):
+            response = self.client.post('/sync', json={'email': 'a@example.com', 'samples': night(10), 'mode': 'ics'})
+        self.assertEqual(response.status_code, 200)
+        mock_cal_class.assert_not_called()
+        path = response.json()['ics_url'].split('testserver')[1]
+
+        feed = self.client.get(path)
+        self.assertEqual(feed.status_code, 200)
+        self.assertTrue(feed.headers['content-type'].startswith('text/calendar'))
+        self.assertEqual(feed.text.count('BEGIN:VEVENT'), 3)
+        etag = feed.headers['etag']
+
+        cached = self.client.get(path)
+        self.assertEqual(cached.content, feed.content)
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertEqual(self.client.get(path, headers={'If-None-Match': etag}).status_code, 304)
+        self.assertEqual(self.client.get(path, headers={'If-Modified-Since': feed.headers['last-modified']}).status_code, 304)
+
+        with patch('api.server.build_session_summaries', side_effect=lambda s, **kwargs: build_session_summaries(s, now=NOW, **kwargs)):
+            self.client.post('/sync', json={'email': 'a@example.com', 'samples': night(11), 'mode': 'ics'})
+        updated = self.client.get(path, headers={'If-None-Match': etag})
+        self.assertEqual(updated.status_code, 200)
+        self.assertEqual(updated.text.count('BEGIN:VEVENT'), 6)
+        self.assertEqual(self.client.get('/ics/unknown.ics').status_code, 404)
+
+    @patch('api.server.SleepCalendar')
+    def test_ics_only_sync_needs_durable_feeds(self, mock_cal_class):
+        """Test feed-only syncs are refused while feeds live in instance-local storage."""
+        with patch('api.server.feeds_durable', return_value=False):
+            response = self.client.post('/sync', json={'email': 'a@example.com', 'samples': night(10), 'mode': 'ics'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.store.sessions('a@example.com'), [])
+        mock_cal_class.assert_not_called()
+
+        with patch.dict(os.environ, {'ICS_TOKEN_SECRET': 'secret', 'SLEEP_CALENDAR_DB': ''}):
+            self.assertFalse(feeds_durable())
+        with patch.dict(os.environ, {'ICS_TOKEN_SECRET': 'secret', 'SLEEP_CALENDAR_DB': '/mnt/state/sleep.db'}):
+            self.assertTrue(feeds_durable())
+
+
+if __name__ == '__main__':
+    unittest.main()
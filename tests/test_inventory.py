@@ -0,0 +1,145 @@
+"""Unit tests for the calendar fleet inventory and garbage collector."""
+import csv
+import io
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from google.auth.credentials import AnonymousCredentials
+from api import profiler as profiler_module
+from api.calendar_directory import CalendarDirectory
+from api.calendar_pool import POOL_PREFIX, pool_summary
+from api.inventory import Fleet, collect, take_inventory, to_csv
+from api.server import app
+from benchmarks.fake_calendar import FakeCalendarServer
+
+
+class TestInventory(unittest.TestCase):
+    """Test inventory and clean-up against the fake Calendar API."""
+
+    def setUp(self):
+        """Start a fake Calendar API with a directory of known calendars."""
+        self.server = FakeCalendarServer()
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.directory = CalendarDirectory(os.path.join(self.tmpdir.name, 'directory.db'))
+        self.fleet = Fleet([('default', AnonymousCredentials())], api_endpoint=self.server.url)
+
+    def add_calendar(self, cal_id, summary, events=(), server=None):
+        (server or self.server).state.calendars[cal_id] = {
+            'summary': summary, 'timeZone': 'UTC', 'acl': [],
+            'events': {f'{cal_id}-{i}': {'id': f'{cal_id}-{i}', 'summary': title,
+                                         'start': {'dateTime': start}, 'end': {'dateTime': start}}
+                       for i, (title, start) in enumerate(events)},
+        }
+
+    def seed(self):
+        nights = [('😴 Sleep', f'2026-01-{day:02d}T23:00:00Z') for day in range(1, 4)]
+        self.add_calendar('kept', 'Sleep Data - a@example.com', nights[:2])
+        self.add_calendar('dup', 'Sleep Data - a@example.com', nights[1:])
+        self.add_calendar('empty', 'Sleep Data - b@example.com')
+        self.add_calendar('pool-old', POOL_PREFIX + 'aaaa')
+        self.add_calendar('pool-live', POOL_PREFIX + 'bbbb')
+        # Leased by another instance, which this one cannot see
+        self.add_calendar('pool-leased', pool_summary())
+        for i in range(260):
+            self.add_calendar(f'other-{i}', f'Work {i}', [('Meeting', '2026-01-01T09:00:00Z')])
+        self.directory.put('default', 'Sleep Data - a@example.com', 'kept')
+        self.directory.put('default', 'Sleep Data - gone@example.com', 'deleted-by-hand')
+
+    def test_inventory_report(self):
+        """Test every page is listed and duplicates, orphans and stale entries are found."""
+        self.seed()
+        report = take_inventory(self.fleet, workers=4, directory=self.directory, live_pool={'pool-live'})
+        self.assertEqual(report['calendars'], 266)
+        self.assertEqual(report['events'], 2 + 2 + 260)
+        self.assertEqual(report['by_kind'], {'user': 3, 'pool': 3, 'other': 260})
+        self.assertEqual(self.server.state.stats()['calls_by_endpoint']['calendarList.list'], 2)
+        status = {row['calendar_id']: (row['status'], row['keeper']) for row in report['items']}
+        self.assertEqual(status['kept'], ('ok', None))
+        self.assertEqual(status['dup'], ('duplicate', 'kept'))
+        self.assertEqual(status['empty'], ('empty', None))
+        self.assertEqual(status['pool-old'], ('orphan', None))
+        self.assertEqual(status['pool-live'], ('ok', None))
+        self.assertEqual(status['pool-leased'], ('ok', None))
+        self.assertEqual([entry['calendar_id'] for entry in report['stale_directory']], ['deleted-by-hand'])
+
+        rows = list(csv.DictReader(io.StringIO(to_csv(report))))
+        self.assertEqual(len(rows), 266)
+        self.assertEqual(rows[0]['account'], 'default')
+
+        self.add_calendar('kept', 'Sleep Data - a@example.com', [('😴 Sleep', '2026-01-05T23:00:00Z')] * 5)
+        later = take_inventory(self.fleet, directory=self.directory, previous=report)
+        self.assertEqual({row['calendar_id']: row['events_delta'] for row in later['items']}['kept'], 3)
+
+    def test_collect_merges_and_deletes(self):
+        """Test duplicates are merged into the keeper and orphans deleted in batches."""
+        self.seed()
+        report = take_inventory(self.fleet, directory=self.directory, live_pool={'pool-live'})
+        self.server.state.reset_counters()
+        actions = collect(self.fleet, report, merge=True, delete_orphans=True, directory=self.directory)
+        self.assertEqual(actions['failures'], [])
+        self.assertEqual((actions['events_moved'], actions['calendars_deleted'], actions['directory_forgotten']),
+                         (1, 2, 1))
+        calendars = self.server.state.calendars
+        self.assertNotIn('dup', calendars)
+        self.assertNotIn('pool-old', calendars)
+        self.assertIn('pool-live', calendars)
+        self.assertIn('pool-leased', calendars)
+        self.assertIn('empty', calendars)
+        self.assertEqual(sorted(e['start']['dateTime'][:10] for e in calendars['kept']['events'].values()),
+                         ['2026-01-01', '2026-01-02', '2026-01-03'])
+        # One batch of moves, one of deletes, plus the two event listings
+        self.assertEqual(self.server.state.stats()['calls_by_endpoint']['batch'], 2)
+        self.assertEqual(self.directory.entries(), [('default', 'Sleep Data - a@example.com', 'kept')])
+
+    def test_collect_merges_across_accounts(self):
+        """Test a user's calendar under an earlier account is copied into the one the directory knows."""
+        old = FakeCalendarServer()
+        old.start()
+        self.addCleanup(old.stop)
+        nights = [('😴 Sleep', f'2026-01-{day:02d}T23:00:00Z') for day in range(1, 4)]
+        self.add_calendar('claimed', 'Sleep Data - a@example.com', nights[2:])
+        self.add_calendar('previous', 'Sleep Data - a@example.com', nights, server=old)
+        fleets = {'sa-new': Fleet([('sa-new', AnonymousCredentials())], api_endpoint=self.server.url),
+                  'sa-old': Fleet([('sa-old', AnonymousCredentials())], api_endpoint=old.url)}
+        fleet = Fleet([(account, AnonymousCredentials()) for account in fleets])
+        fleet.client = lambda account: fleets[account].client(account)
+        self.directory.put('sa-new', 'Sleep Data - a@example.com', 'claimed')
+
+        report = take_inventory(fleet, directory=self.directory)
+        status = {row['calendar_id']: (row['status'], row['keeper'], row['keeper_account']) for row in report['items']}
+        self.assertEqual(status['previous'], ('duplicate', 'claimed', 'sa-new'))
+        self.assertEqual(status['claimed'], ('ok', None, None))
+
+        actions = collect(fleet, report, merge=True, directory=self.directory)
+        self.assertEqual(actions['failures'], [])
+        self.assertEqual((actions['events_moved'], actions['calendars_deleted']), (2, 1))
+        self.assertNotIn('previous', old.state.calendars)
+        self.assertEqual(sorted(e['start']['dateTime'][:10]
+                                for e in self.server.state.calendars['claimed']['events'].values()),
+                         ['2026-01-01', '2026-01-02', '2026-01-03'])
+        self.assertEqual(self.directory.entries(), [('sa-new', 'Sleep Data - a@example.com', 'claimed')])
+
+    def test_admin_endpoint(self):
+        """Test the inventory endpoint is admin only and serves CSV."""
+        self.seed()
+        client = TestClient(app)
+        with patch.object(profiler_module.profiler, 'admin_token', 'secret'), \
+                patch('api.server.inventory_fleet', return_value=self.fleet), \
+                patch('api.server.calendar_directory', self.directory):
+            self.assertEqual(client.get('/admin/inventory').status_code, 403)
+            response = client.get('/admin/inventory?format=csv', headers={'X-Admin-Token': 'secret'})
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.text.startswith('account,calendar_id,summary'))
+            response = client.post('/admin/inventory/collect?delete_orphans=true', headers={'X-Admin-Token': 'secret'})
+            self.assertEqual(response.json()['actions']['calendars_deleted'], 2)
+        self.assertIn('dup', self.server.state.calendars)
+        self.assertIn('pool-leased', self.server.state.calendars)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+"""Unit tests for the process-pool offload stage."""
+import json
+import os
+import unittest
+from unittest.mock import patch
+from api import offload
+
+
+SAMPLES = [
+    {'startDate': '2026-01-17T00:00:00', 'endDate': '2026-01-17T04:00:00', 'value': 'Core', 'sourceName': 'Test'},
+    {'startDate': '2026-01-17T04:00:00', 'endDate': '2026-01-17T07:00:00', 'value': 'Deep', 'sourceName': 'Test'},
+]
+
+
+class TestOffload(unittest.TestCase):
+    """Test payload decoding and the offload switch."""
+    
+    def test_summarize_payload_formats(self):
+        """Test lists, JSON bytes and NDJSON strings give the same summaries."""
+        expected = offload.summarize_payload(SAMPLES, days=100000)
+        self.assertEqual(len(expected), 1)
+        self.assertEqual(expected[0]['total_asleep_min'], 420)
+        as_bytes = json.dumps(SAMPLES).encode('utf-8')
+        as_ndjson = '\n'.join(json.dumps(s) for s in SAMPLES)
+        for payload in (as_bytes, as_ndjson):
+            self.assertEqual(offload.summarize_payload(payload, days=100000), expected)
+    
+    def test_should_offload_disabled_by_default(self):
+        """Test nothing is offloaded unless SYNC_PROCESS_POOL is set."""
+        with patch.dict(os.environ, {'SYNC_PROCESS_POOL': '0'}):
+            self.assertFalse(offload.should_offload(SAMPLES * 5000))
+            self.assertIsNone(offload.get_executor())
+    
+    def test_should_offload_large_payloads_only(self):
+        """Test only payloads above the threshold are offloaded."""
+        with patch.dict(os.environ, {'SYNC_PROCESS_POOL': '2'}):
+            self.assertFalse(offload.should_offload(SAMPLES))
+            self.assertTrue(offload.should_offload(SAMPLES * offload.MIN_SAMPLES))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+"""Unit tests for merging overlapping multi-source intervals."""
+import random
+import unittest
+from datetime import datetime, timedelta
+from api.overlap import SourcePolicy, merge_intervals
+from api.sleep_calendar import build_session_summaries
+from benchmarks.datasets import generate_samples
+
+BASE = datetime(2026, 1, 16, 23, 0)
+
+
+def interval(start_min, end_min, value, source):
+    return {'start': BASE + timedelta(minutes=start_min), 'end': BASE + timedelta(minutes=end_min),
+            'value': value, 'source': source}
+
+
+def spans(intervals):
+    return [(int((i['start'] - BASE).total_seconds() // 60), int((i['end'] - BASE).total_seconds() // 60),
+             i['value'], i['source']) for i in intervals]
+
+
+class TestMergeIntervals(unittest.TestCase):
+    """Test the sweep-line resolver and its source policy."""
+
+    def test_non_overlapping_input_is_unchanged(self):
+        """Test clean single-source nights pass through as the same objects."""
+        intervals = [interval(0, 30, 'Core', 'Watch'), interval(30, 60, 'Core', 'Watch'),
+                     interval(90, 120, 'REM', 'Watch')]
+        merged = merge_intervals(intervals)
+        self.assertEqual([id(i) for i in merged], [id(i) for i in intervals])
+
+    def test_priority_source_owns_overlap(self):
+        """Test a Watch interval cuts into an overlapping iPhone interval."""
+        intervals = [interval(0, 480, 'Core', "Conner's iPhone"), interval(60, 120, 'Deep', "Conner's Apple Watch"),
+                     interval(100, 200, 'REM', 'AutoSleep')]
+        self.assertEqual(spans(merge_intervals(intervals)), [
+            (0, 60, 'Core', "Conner's iPhone"),
+            (60, 120, 'Deep', "Conner's Apple Watch"),
+            (120, 200, 'REM', 'AutoSleep'),
+            (200, 480, 'Core', "Conner's iPhone"),
+        ])
+        policy = SourcePolicy.parse('iPhone')
+        self.assertEqual(policy.priority, ('iPhone', '*'))
+        self.assertEqual(spans(merge_intervals(intervals, policy)), [(0, 480, 'Core', "Conner's iPhone")])
+
+    def test_ties_prefer_stages_then_earliest(self):
+        """Test stage values beat InBed from the same source, then the earlier interval wins."""
+        intervals = [interval(0, 100, 'InBed', 'Watch'), interval(10, 50, 'Core', 'Watch'),
+                     interval(40, 80, 'REM', 'Watch')]
+        self.assertEqual(spans(merge_intervals(intervals)), [
+            (0, 10, 'InBed', 'Watch'), (10, 50, 'Core', 'Watch'), (50, 80, 'REM', 'Watch'), (80, 100, 'InBed', 'Watch'),
+        ])
+
+    def test_matches_minute_by_minute_resolution(self):
+        """Test random overlaps against a brute-force per-minute winner."""
+        rng = random.Random(0)
+        policy = SourcePolicy()
+        sources = ['Apple Watch', 'iPhone', 'Oura']
+        for _ in range(50):
+            intervals = []
+            for _ in range(rng.randint(1, 12)):
+                start = rng.randint(0, 300)
+                intervals.append(interval(start, start + rng.randint(1, 90), rng.choice(['Core', 'REM', 'InBed']),
+                                          rng.choice(sources)))
+            intervals.sort(key=lambda i: i['start'])
+            expected = {}
+            for minute in range(400):
+                at = BASE + timedelta(minutes=minute)
+                covering = [(policy.rank(i), index) for index, i in enumerate(intervals) if i['start'] <= at < i['end']]
+                if covering:
+                    expected[minute] = intervals[min(covering)[1]]['value'], intervals[min(covering)[1]]['source']
+            merged = merge_intervals(intervals, policy)
+            actual = {}
+            for start, end, value, source in spans(merged):
+                for minute in range(start, end):
+                    self.assertNotIn(minute, actual)
+                    actual[minute] = value, source
+            self.assertEqual(actual, expected)
+
+    def test_multi_source_nights_are_not_double_counted(self):
+        """Test the same night reported by three sources summarizes like one source."""
+        end = datetime(2026, 1, 17, 8)
+        single = build_session_summaries(generate_samples(10, end=end), days=100000)
+        multi = build_session_summaries(
+            generate_samples(10, end=end, sources=('Apple Watch', 'iPhone', 'AutoSleep')), days=100000)
+        self.assertEqual(multi, single)
+
+
+if __name__ == '__main__':
+    unittest.main()
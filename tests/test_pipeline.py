@@ -0,0 +1,209 @@
+"""Unit tests for the shared sync pipeline, its sources and sinks."""
+import io
+import json
+import os
+import tempfile
+import random
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+from dateutil import parser as dateutil_parser
+from google.auth.credentials import AnonymousCredentials
+from api.pipeline import (BatchSink, CalendarSink, DryRunSink, IcsSink, body_source, file_source,
+                          ndjson_source, run_pipeline)
+from api.session_store import SessionStore
+from api.sleep_calendar import (SleepCalendar, build_session_summaries, parse_intervals, pytz, sample_day,
+                                summarize_intervals)
+from benchmarks.datasets import generate_samples
+from benchmarks.fake_calendar import FakeCalendarServer
+import sleep_data
+
+
+def event_bodies(server):
+    """(start, summary) of every event the fake server holds."""
+    return sorted((event['start']['dateTime'], event['summary'])
+                  for calendar in server.state.calendars.values() for event in calendar['events'].values())
+
+
+class TestSources(unittest.TestCase):
+    """Test every source yields the same samples."""
+
+    def test_sources_agree(self):
+        """Test body, NDJSON and file sources."""
+        samples = generate_samples(3)
+        ndjson = '\n'.join(json.dumps(sample) for sample in samples) + '\n'
+        self.assertEqual(list(body_source({'samples': samples})), samples)
+        self.assertEqual(list(body_source(samples)), samples)
+        self.assertEqual(list(body_source({'samples': ndjson})), samples)
+        self.assertEqual(list(body_source({})), [])
+        self.assertEqual(list(ndjson_source(io.StringIO(ndjson))), samples)
+
+        with tempfile.TemporaryDirectory() as workdir:
+            for name, content in (('export.json', json.dumps({'samples': samples})), ('export.ndjson', ndjson)):
+                path = os.path.join(workdir, name)
+                with open(path, 'w') as f:
+                    f.write(content)
+                self.assertEqual(list(file_source(path)), samples)
+
+
+class TestSinks(unittest.TestCase):
+    """Test sinks write the same events through the same stages."""
+
+    def setUp(self):
+        """Start a fake Calendar API."""
+        self.server = FakeCalendarServer()
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        self.samples = generate_samples(5)
+
+    def calendar(self):
+        cal = SleepCalendar(credentials=AnonymousCredentials(), api_endpoint=self.server.url)
+        cal.calendar_id = cal.get_or_create_calendar()
+        return cal
+
+    def test_batch_sink_matches_calendar_sink(self):
+        """Test batched writes produce the same events and stay idempotent."""
+        written = run_pipeline(self.samples, CalendarSink(self.calendar()), days=100000)
+        expected = event_bodies(self.server)
+        self.assertEqual(len(expected), written)
+
+        self.server.state.reset()
+        cal = self.calendar()
+        self.assertEqual(run_pipeline(self.samples, BatchSink(cal), days=100000), written)
+        self.assertEqual(event_bodies(self.server), expected)
+        calls = self.server.state.stats()['calls_by_endpoint']
+        self.assertEqual(calls['events.list'], 1)
+        self.assertEqual(calls['batch'], -(-written // 50))
+
+        self.assertEqual(run_pipeline(self.samples, BatchSink(cal), days=100000), 0)
+        self.assertEqual(cal.delete_all_events(), (written, []))
+        self.assertEqual(event_bodies(self.server), [])
+
+    def test_batch_sink_updates_changed_events(self):
+        """Test update patches only the events whose rendering changed."""
+        cal = self.calendar()
+        summaries = build_session_summaries(self.samples, days=100000)
+        written = BatchSink(cal).write(summaries)
+        self.server.state.reset_counters()
+        self.assertEqual(BatchSink(cal, update=True).write(summaries), 0)
+        self.assertNotIn('events.patch', self.server.state.stats()['calls_by_endpoint'])
+
+        summaries[0]['source'] = 'Fixed Export'
+        self.assertEqual(BatchSink(cal, update=True).write(summaries), 1)
+        self.assertEqual(len(event_bodies(self.server)), written)
+        descriptions = [event['description'] for calendar in self.server.state.calendars.values()
+                        for event in calendar['events'].values() if 'Fixed Export' in event.get('description', '')]
+        self.assertEqual(len(descriptions), 1)
+
+        # Nights written before the asleep minutes were recorded get them added
+        aggregated = [event for calendar in self.server.state.calendars.values()
+                      for event in calendar['events'].values() if 'extendedProperties' in event]
+        del aggregated[0]['extendedProperties']
+        self.assertEqual(BatchSink(cal, update=True).write(summaries), 1)
+        self.assertIn('extendedProperties', aggregated[0])
+
+    def test_dry_run_and_ics_sinks(self):
+        """Test sinks that never call the Calendar API."""
+        out = io.StringIO()
+        count = run_pipeline(self.samples, DryRunSink(out), days=100000)
+        self.assertEqual(len(out.getvalue().splitlines()), count)
+
+        with tempfile.TemporaryDirectory() as workdir:
+            store = SessionStore(os.path.join(workdir, 'store.db'))
+            self.assertEqual(run_pipeline(self.samples, IcsSink('a@example.com', store), days=100000), 0)
+            self.assertEqual(len(store.sessions('a@example.com')), 5)
+        self.assertEqual(self.server.state.stats()['http_requests'], 0)
+
+    def test_cli_uses_pipeline(self):
+        """Test the CLI syncs an export in batches and deletes everything again."""
+        cal = sleep_data.SleepCalendar(credentials=AnonymousCredentials(), api_endpoint=self.server.url,
+                                       share_emails=[])
+        cal.get_or_create_calendar()
+        # A new calendar costs one calendarList scan, not two
+        self.assertEqual(self.server.state.stats()['calls_by_endpoint']['calendarList.list'], 1)
+        with tempfile.TemporaryDirectory() as workdir:
+            path = os.path.join(workdir, 'export.json')
+            with open(path, 'w') as f:
+                json.dump({'samples': self.samples}, f)
+            with patch('sys.stdout', io.StringIO()):
+                count = cal.sync(path, days=100000, sink='batch')
+                self.assertEqual(cal.delete_all_events(), count)
+        self.assertGreater(count, 0)
+        self.assertGreater(self.server.state.stats()['calls_by_endpoint']['batch'], 0)
+
+
+def shortcuts_format(sample):
+    """The sample with times as the Shortcuts export writes them ("Jan 17, 2026 at 02:22")."""
+    def convert(value):
+        moment = datetime.fromisoformat(value)
+        return f"{moment:%b} {moment.day}, {moment.year} at {moment:%H:%M}"
+    return dict(sample, startDate=convert(sample['startDate']), endDate=convert(sample['endDate']))
+
+
+class TestCutoffPushdown(unittest.TestCase):
+    """Test the window applied at ingestion gives the same nights as a full parse."""
+
+    NOW = datetime(2026, 1, 17, 16, tzinfo=timezone.utc)
+
+    def full_parse(self, samples, **options):
+        la_tz = pytz.timezone('America/Los_Angeles')
+        intervals = sorted(parse_intervals(samples, la_tz), key=lambda x: x['start'])
+        return list(summarize_intervals(intervals, now=self.NOW, **options))
+
+    def test_sample_day(self):
+        """Test the lexical day of supported formats, and None for the rest."""
+        self.assertEqual(sample_day('2026-01-17T02:22:00-08:00'), '2026-01-17')
+        self.assertEqual(sample_day('2026-01-17 02:22:00 -0800'), '2026-01-17')
+        self.assertEqual(sample_day('Jan 7, 2026 at 02:22'), '2026-01-07')
+        self.assertIsNone(sample_day('17/01/2026 02:22'))
+        self.assertIsNone(sample_day('janvier 17, 2026'))
+
+    def test_matches_full_parse(self):
+        """Test ISO, offset, Shortcuts and unknown formats, shuffled, against parsing everything."""
+        samples = generate_samples(50, end=datetime(2026, 1, 17, 8))
+        rng = random.Random(0)
+        mixed = []
+        for sample in samples:
+            kind = rng.randrange(3)
+            if kind == 1:
+                sample = shortcuts_format(sample)
+            elif kind == 2:
+                sample = dict(sample, startDate=sample['startDate'] + '-08:00', endDate=sample['endDate'] + '-08:00')
+            mixed.append(sample)
+        shuffled = rng.sample(mixed, len(mixed))
+        before = datetime(2026, 1, 5, tzinfo=timezone.utc)
+        for data in (mixed, shuffled):
+            for days in (1, 20, 365):
+                with self.subTest(days=days, sorted=data is mixed):
+                    self.assertEqual(build_session_summaries(data, days=days, now=self.NOW),
+                                     self.full_parse(data, days=days))
+            self.assertEqual(build_session_summaries(data, days=30, now=self.NOW, before=before),
+                             [s for s in self.full_parse(data, days=30) if s['start'] < before])
+
+    def test_old_samples_are_not_parsed(self):
+        """Test samples well before the window never reach the date parser."""
+        samples = generate_samples(730, end=datetime(2026, 1, 17, 8))
+        with patch('api.sleep_calendar.date_parser.parse', wraps=dateutil_parser.parse) as parse:
+            summaries = build_session_summaries(samples, days=30, now=self.NOW)
+        self.assertEqual(len(summaries), 30)
+        # Two timestamps per sample, for the window plus the margin around it
+        self.assertLess(parse.call_count, 2 * len(samples) * 40 // 730)
+
+    def test_archive_only_skips_archived_span(self):
+        """Test an archive sees every sample it lacks, and none it already covers."""
+        samples = generate_samples(60, end=datetime(2026, 1, 17, 8))
+        seen = []
+        build_session_summaries(samples, days=7, now=self.NOW, archive=seen.extend)
+        self.assertEqual(len(seen), len(samples))
+
+        seen.clear()
+        archived = (datetime(2025, 12, 1, tzinfo=timezone.utc), datetime(2026, 1, 16, tzinfo=timezone.utc))
+        summaries = build_session_summaries(samples, days=7, now=self.NOW, archive=seen.extend, archived=archived)
+        self.assertEqual(summaries, self.full_parse(samples, days=7))
+        days = {interval['start'].date() for interval in seen}
+        self.assertIn(datetime(2025, 11, 20).date(), days)
+        self.assertNotIn(datetime(2025, 12, 20).date(), days)
+
+
+if __name__ == '__main__':
+    unittest.main()
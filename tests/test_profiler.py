@@ -0,0 +1,110 @@
+"""Unit tests for the request sampling profiler."""
+import tempfile
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+from fastapi.testclient import TestClient
+from api import profiler as profiler_module
+from api.profiler import Profiler
+from api.server import app
+from api.sleep_calendar import SleepCalendar
+from api.sync_cache import payload_cache
+
+
+def slow_calendar_write(*args, **kwargs):
+    time.sleep(0.1)
+    return 3
+
+
+class TestProfiler(unittest.TestCase):
+    """Test sampling, the Calendar timeline and storage."""
+
+    def setUp(self):
+        """Create a profiler writing to a temporary directory."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.profiler = Profiler(self.tmpdir.name, admin_token='secret', interval=0.002, max_profiles=2)
+
+    def test_should_profile(self):
+        """Test only the admin token or the sample rate selects a request."""
+        self.assertTrue(self.profiler.should_profile('secret'))
+        self.assertFalse(self.profiler.should_profile('wrong'))
+        self.assertFalse(self.profiler.should_profile(None))
+        self.assertFalse(Profiler(self.tmpdir.name).should_profile(''))
+        self.assertTrue(Profiler(self.tmpdir.name, sample_rate=1.0).should_profile())
+
+    @patch('api.sleep_calendar.service_account.Credentials')
+    @patch('api.sleep_calendar.build')
+    def test_profile_records_stacks_and_calendar_calls(self, mock_build, mock_creds):
+        """Test the profiled thread's stacks and its Calendar calls are saved."""
+        cal = SleepCalendar(credentials_json={'type': 'service_account'}, user_email='a@example.com')
+        self.assertIsNone(profiler_module.active())
+        with self.profiler.profile(label='test') as profile:
+            self.assertIs(profiler_module.active(), profile)
+            cal._guarded('events.insert', slow_calendar_write)
+        self.assertIsNone(profiler_module.active())
+
+        metadata, collapsed = self.profiler.load(profile.id)
+        self.assertGreater(metadata['samples'], 0)
+        self.assertIn('slow_calendar_write', collapsed)
+        [call] = metadata['calendar_calls']
+        self.assertEqual(call['endpoint'], 'events.insert')
+        self.assertGreaterEqual(call['duration_ms'], 100)
+
+    def test_prunes_and_rejects_bad_ids(self):
+        """Test old profiles are deleted and ids cannot escape the directory."""
+        ids = []
+        for _ in range(3):
+            with self.profiler.profile() as profile:
+                pass
+            ids.append(profile.id)
+            time.sleep(0.01)
+        self.assertIsNone(self.profiler.load(ids[0]))
+        self.assertIsNotNone(self.profiler.load(ids[2]))
+        self.assertIsNone(self.profiler.load('../../etc/passwd'))
+
+
+class TestProfileEndpoints(unittest.TestCase):
+    """Test profiling /sync and fetching the result."""
+
+    def setUp(self):
+        """Point the shared profiler at a temporary directory."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        for name, value in (('root', self.tmpdir.name), ('admin_token', 'secret'), ('interval', 0.002)):
+            patcher = patch.object(profiler_module.profiler, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = TestClient(app)
+        payload_cache.clear()
+
+    @patch('api.server.SleepCalendar')
+    def test_profiled_sync(self, mock_cal_class):
+        """Test the admin header profiles /sync and the profile is served to admins only."""
+        mock_cal = MagicMock()
+        mock_cal.calendar_id = 'cal'
+        mock_cal.remaining_sessions = []
+        mock_cal.sync_from_data.side_effect = slow_calendar_write
+        mock_cal_class.return_value = mock_cal
+        body = {'email': 'a@example.com', 'samples': [{'startDate': '2026-01-01T00:00:00'}]}
+
+        response = self.client.post('/sync', json=body)
+        self.assertNotIn('x-profile-id', response.headers)
+
+        payload_cache.clear()
+        response = self.client.post('/sync', json=body, headers={'X-Profile': 'secret'})
+        self.assertEqual(response.status_code, 200)
+        profile_id = response.headers['x-profile-id']
+
+        url = f'/debug/profiles/{profile_id}'
+        self.assertEqual(self.client.get(url).status_code, 403)
+        profile = self.client.get(url, headers={'X-Admin-Token': 'secret'}).json()
+        self.assertIn('slow_calendar_write', profile['collapsed'])
+        collapsed = self.client.get(url + '?format=collapsed', headers={'X-Admin-Token': 'secret'})
+        self.assertTrue(collapsed.text.startswith(profile['collapsed'].split('\n')[0]))
+        self.assertEqual(self.client.get('/debug/profiles/0000000000000000',
+                                         headers={'X-Admin-Token': 'secret'}).status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+"""Unit tests for the columnar sample archive."""
+import json
+import os
+import tempfile
+import time
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import patch
+from api.sample_archive import SampleArchive
+from api.sleep_calendar import build_session_summaries
+from benchmarks.datasets import generate_samples
+
+
+def without_hashes(summaries):
+    return [{key: value for key, value in summary.items() if key != 'hash'} for summary in summaries]
+
+
+class TestSampleArchive(unittest.TestCase):
+    """Test appending, de-duplication and reprocessing."""
+
+    def setUp(self):
+        """Create an archive in a temporary directory."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.archive = SampleArchive(self.tmpdir.name)
+        self.samples = generate_samples(20)
+
+    def test_append_deduplicates(self):
+        """Test overlapping uploads only add new rows."""
+        written = self.archive.append('A@example.com', self.samples[:200])
+        self.assertEqual(written, 200)
+        self.assertEqual(self.archive.append('a@example.com', self.samples), len(self.samples) - 200)
+        self.assertEqual(self.archive.append('a@example.com', self.samples), 0)
+        archived = self.archive.read('a@example.com')
+        self.assertEqual(len(archived), len(self.samples))
+        self.assertEqual(self.archive.emails(), ['a@example.com'])
+        self.assertEqual(len(self.archive.read('b@example.com')), 0)
+
+    def test_reprocess_matches_raw_samples(self):
+        """Test archived history summarizes exactly like the original samples."""
+        self.archive.append('a@example.com', list(reversed(self.samples)))
+        self.assertEqual(without_hashes(self.archive.summaries('a@example.com')),
+                         without_hashes(build_session_summaries(self.samples, days=100000)))
+
+    def test_torn_append_is_ignored(self):
+        """Test a partially written row is invisible and truncated on the next append."""
+        self.archive.append('a@example.com', self.samples[:10])
+        directory = self.archive._user_dir('a@example.com')
+        with open(os.path.join(directory, 'start.i64'), 'ab') as f:
+            f.write(b'\x01' * 12)
+        self.assertEqual(len(self.archive.read('a@example.com')), 10)
+        self.archive.append('a@example.com', self.samples[10:20])
+        archived = self.archive.read('a@example.com')
+        self.assertEqual(len(archived), 20)
+        self.assertEqual(os.path.getsize(os.path.join(directory, 'start.i64')), 20 * 8)
+
+    def test_fallback_without_numpy(self):
+        """Test memoryview columns give the same results when numpy is missing."""
+        self.archive.append('a@example.com', self.samples)
+        expected = without_hashes(self.archive.summaries('a@example.com'))
+        with patch('api.sample_archive.np', None):
+            self.assertEqual(self.archive.append('a@example.com', self.samples), 0)
+            self.assertEqual(without_hashes(self.archive.summaries('a@example.com')), expected)
+
+    def test_rows_stay_sorted(self):
+        """Test an older upload is merged in order, and lookups binary-search without numpy."""
+        self.archive.append('a@example.com', self.samples[200:])
+        self.archive.append('a@example.com', self.samples[:200])
+        archived = self.archive.read('a@example.com')
+        self.assertTrue(archived.in_order)
+        self.assertEqual(list(archived.start), sorted(archived.start))
+        expected = without_hashes(build_session_summaries(self.samples, days=100000))
+        self.assertEqual(without_hashes(self.archive.summaries('a@example.com')), expected)
+        with patch('api.sample_archive.np', None):
+            self.assertEqual(self.archive.append('a@example.com', self.samples), 0)
+            self.assertEqual(without_hashes(self.archive.summaries('a@example.com')), expected)
+            first, last = self.archive.span('a@example.com')
+            since = datetime.fromtimestamp((first.timestamp() + last.timestamp()) // 2, timezone.utc)
+            self.assertTrue(all(i['start'] >= since for i in self.archive.intervals('a@example.com', since=since)))
+        self.assertEqual(self.archive.emails(), ['a@example.com'])
+        self.assertEqual([name for name in os.listdir(self.tmpdir.name) if name.endswith(('.new', '.old'))], [])
+
+    def test_unsorted_archive_is_rewritten(self):
+        """Test an archive written before rows were kept sorted is read as before and sorted on append."""
+        self.archive.append('a@example.com', self.samples[:200])
+        directory = self.archive._user_dir('a@example.com')
+        with open(os.path.join(directory, 'names.json')) as f:
+            names = json.load(f)
+        del names['in_order']
+        with open(os.path.join(directory, 'names.json'), 'w') as f:
+            json.dump(names, f)
+        self.assertFalse(self.archive.read('a@example.com').in_order)
+        self.assertEqual(self.archive.append('a@example.com', self.samples), len(self.samples) - 200)
+        self.assertTrue(self.archive.read('a@example.com').in_order)
+        self.assertEqual(len(self.archive.read('a@example.com')), len(self.samples))
+
+    def test_caps(self):
+        """Test the size and retention caps trim the oldest rows once exceeded."""
+        capped = SampleArchive(self.tmpdir.name, max_rows=100)
+        capped.append('a@example.com', self.samples[:105])
+        self.assertEqual(len(capped.read('a@example.com')), 105)
+        capped.append('a@example.com', self.samples[105:])
+        archived = capped.read('a@example.com')
+        self.assertEqual(len(archived), 100)
+        uncapped = SampleArchive(os.path.join(self.tmpdir.name, 'all'))
+        uncapped.append('a@example.com', self.samples)
+        self.assertEqual(list(archived.start), list(uncapped.read('a@example.com').start)[-100:])
+
+        dated = SampleArchive(os.path.join(self.tmpdir.name, 'dated'), max_days=5)
+        dated.append('a@example.com', self.samples)
+        cutoff = time.time() - 5 * 86400
+        self.assertTrue(all(start >= cutoff for start in dated.read('a@example.com').start))
+
+    def test_archive_is_opt_in(self):
+        """Test nothing is archived unless SAMPLE_ARCHIVE_DIR is set."""
+        with patch.dict(os.environ, {}, clear=True):
+            self.assertIsNone(SampleArchive.from_env())
+        with patch.dict(os.environ, {'SAMPLE_ARCHIVE_DIR': 'off'}):
+            self.assertIsNone(SampleArchive.from_env())
+        with patch.dict(os.environ, {'SAMPLE_ARCHIVE_DIR': self.tmpdir.name, 'SAMPLE_ARCHIVE_MAX_ROWS': '0'},
+                        clear=True):
+            archive = SampleArchive.from_env()
+            self.assertEqual((archive.root, archive.max_days, archive.max_rows), (self.tmpdir.name, 730, None))
+
+    def test_sync_archives_parsed_samples(self):
+        """Test the sync pipeline archives everything it parsed, not just the window."""
+        with patch('api.sleep_calendar.build'), patch('api.sleep_calendar.service_account'):
+            from api.sleep_calendar import SleepCalendar
+            cal = SleepCalendar(credentials_json={'type': 'service_account'}, user_email='a@example.com',
+                                sample_archive=self.archive)
+            with patch.object(cal, 'get_or_create_calendar', return_value='cal'), \
+                    patch.object(cal, 'sync_sessions', return_value=0):
+                cal.sync_from_data({'samples': self.samples}, days=1)
+        self.assertEqual(len(self.archive.read('a@example.com')), len(self.samples))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+"""Unit tests for the scoring curve and bulk re-scoring."""
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from google.auth.credentials import AnonymousCredentials
+from api import scoring
+from api.calendar_directory import CalendarDirectory
+from api.credential_pool import CredentialPool
+from api.scoring import EMOJIS, ScoringCurve, calculate_score, curve_from_env, default_curve
+from api.sleep_calendar import SleepCalendar
+from benchmarks.datasets import generate_samples
+from benchmarks.fake_calendar import FakeCalendarServer
+import rescore
+
+
+def reference_score(duration_hours):
+    """The original branch-chain scoring the default curve must reproduce."""
+    if duration_hours < 6:
+        score = (duration_hours / 6) * 50
+    elif duration_hours > 10:
+        score = max(0, 100 - (duration_hours - 10) * 20)
+    elif duration_hours <= 8:
+        score = 50 + (duration_hours - 6) / 2 * 50
+    else:
+        score = 100 - (duration_hours - 8) / 2 * 10
+    emoji = '🟢' if score >= 70 else '😴' if score >= 50 else '🔴'
+    return int(score), emoji
+
+
+class TestScoringCurve(unittest.TestCase):
+    """Test scalar and vectorized scoring agree with the original curve."""
+
+    DURATIONS = [minutes / 60 for minutes in range(0, 20 * 60)] + [6, 8, 10, 10.01, 12.65, 15, 30]
+
+    def test_scalar_matches_reference(self):
+        """Test every minute from 0 to 20 hours, including the 10h jump."""
+        for hours in self.DURATIONS:
+            self.assertEqual(calculate_score(hours), reference_score(hours), hours)
+        self.assertEqual(calculate_score(10), (90, '🟢'))
+        self.assertEqual(calculate_score(10.01), (99, '🟢'))
+
+    @unittest.skipIf(scoring.np is None, "numpy not installed")
+    def test_vectorized_matches_scalar(self):
+        """Test score_many returns the same scores and emoji codes."""
+        scores, codes = default_curve.score_many(self.DURATIONS)
+        self.assertEqual([(int(s), EMOJIS[c]) for s, c in zip(scores, codes)],
+                         [calculate_score(h) for h in self.DURATIONS])
+
+    def test_fallback_without_numpy(self):
+        """Test score_many works on plain lists when numpy is missing."""
+        with patch('api.scoring.np', None):
+            scores, codes = default_curve.score_many([5, 7.5, 9])
+        self.assertEqual((list(scores), list(codes)), ([41, 87, 95], [0, 2, 2]))
+
+    def test_parse_and_validation(self):
+        """Test curves parse from text and reject unordered segments."""
+        curve = ScoringCurve.parse('0:0-7:70, 7:70-8:100, 8:100-12:0')
+        self.assertEqual(curve.score(3.5), (35, '🔴'))
+        self.assertEqual(curve.score(13), (0, '🔴'))
+        with self.assertRaises(ValueError):
+            ScoringCurve([((0, 0), (8, 100)), ((0, 0), (6, 50)), ((6, 50), (9, 0))])
+
+    def test_curve_setting(self):
+        """Test SCORING_CURVE takes segments inline or from a file."""
+        segments = '0:0-7:70,7:70-8:100,8:100-12:0'
+        with patch.dict(os.environ, {'SCORING_CURVE': segments}):
+            self.assertEqual(curve_from_env().score(3.5), (35, '🔴'))
+        with tempfile.NamedTemporaryFile('w', suffix='.txt') as f:
+            f.write(segments + '\n')
+            f.flush()
+            with patch.dict(os.environ, {'SCORING_CURVE': f.name}):
+                self.assertEqual(curve_from_env().segments, ScoringCurve.parse(segments).segments)
+        with patch.dict(os.environ, {'SCORING_CURVE': ''}):
+            self.assertEqual(curve_from_env().segments, ScoringCurve().segments)
+
+
+class TestRescore(unittest.TestCase):
+    """Test bulk re-scoring against the fake Calendar API."""
+
+    def test_rescore_patches_only_changed_events(self):
+        """Test a new curve patches affected events, and re-running changes nothing."""
+        with FakeCalendarServer() as server:
+            cal = SleepCalendar(credentials=AnonymousCredentials(), api_endpoint=server.url,
+                                user_email='a@example.com')
+            cal.sync_from_data({'samples': generate_samples(10)})
+            target = SleepCalendar(credentials=AnonymousCredentials(), api_endpoint=server.url)
+            target.calendar_id = cal.calendar_id
+            targets = [('a@example.com', target)]
+
+            self.assertEqual(rescore.rescore(targets)['events_changed'], 0)
+
+            strict = ScoringCurve.parse('0:0-9:50,9:50-10:100')
+            report = rescore.rescore(targets, curve=strict)
+            self.assertEqual(report['events_scored'], 10)
+            self.assertEqual(report['events_approximate'], 0)
+            self.assertGreater(report['events_patched'], 0)
+            self.assertEqual(report['events_patched'], report['events_changed'])
+            self.assertEqual(server.state.stats()['calls_by_endpoint']['batch'], 1)
+
+            self.assertEqual(rescore.rescore(targets, curve=strict)['events_changed'], 0)
+            events = rescore.list_sleep_events(target)
+            self.assertTrue(all(summary.startswith('🔴') for _, summary, _, _, _ in events))
+
+    def test_rescore_uses_exact_minutes(self):
+        """Test the stored duration is used, and old events fall back to the description."""
+        with FakeCalendarServer() as server:
+            cal = SleepCalendar(credentials=AnonymousCredentials(), api_endpoint=server.url,
+                                user_email='a@example.com')
+            # 5h59m59s asleep: the description says 359 min, the score used 359.98
+            cal.sync_from_data({'samples': [
+                {'startDate': '2026-01-17T00:00:00', 'endDate': '2026-01-17T05:59:59', 'value': 'Core',
+                 'sourceName': 'Test'}]}, days=100000)
+            target = SleepCalendar(credentials=AnonymousCredentials(), api_endpoint=server.url)
+            target.calendar_id = cal.calendar_id
+            (_, _, description, minutes, exact), = rescore.list_sleep_events(target)
+            self.assertIn('(359 min)', description)
+            self.assertEqual((minutes, exact), (359 + 59 / 60, True))
+
+            # A step between the truncated and the exact duration
+            report = rescore.rescore([('a@example.com', target)], curve=ScoringCurve.parse('0:0-5.99:40,5.99:60-6:60'))
+            self.assertEqual((report['events_patched'], report['events_approximate']), (1, 0))
+            (_, _, description, _, _), = rescore.list_sleep_events(target)
+            self.assertIn('Sleep Score: 60/100', description)
+
+            # Events written before the property existed
+            for event in server.state.calendars[cal.calendar_id]['events'].values():
+                event.pop('extendedProperties', None)
+            (_, _, _, minutes, exact), = rescore.list_sleep_events(target)
+            self.assertEqual((minutes, exact), (359, False))
+
+    @patch('api.credential_pool.service_account.Credentials')
+    def test_find_targets_follows_the_directory(self, mock_creds):
+        """Test a user pinned to another account is found there, and misses are reported."""
+        mock_creds.from_service_account_info.return_value = AnonymousCredentials()
+        pool = CredentialPool([{'client_email': f'sa-{i}@example.iam.gserviceaccount.com'} for i in range(3)])
+        owner = next(account for account in pool.account_ids if account != pool.account_for('a@example.com'))
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = CalendarDirectory(os.path.join(tmp, 'directory.db'))
+            directory.put(owner, 'Sleep Data - a@example.com', 'cal-a')
+            with patch.object(SleepCalendar, 'find_calendar', autospec=True, return_value=None) as find:
+                targets = rescore.find_targets(['a@example.com', 'b@example.com'], pool, None, directory=directory)
+            self.assertEqual([(email, cal.calendar_id, cal.account) for email, cal in targets],
+                             [('a@example.com', 'cal-a', owner)])
+            # Only the unknown user needed a calendarList scan
+            self.assertEqual(find.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+"""Unit tests for the per-night session cache."""
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch, MagicMock
+from api.session_cache import SessionCache
+from api.sleep_calendar import SleepCalendar
+
+
+def night(day, value='Core'):
+    """Samples for one night on the given day of January 2026."""
+    return [
+        {'startDate': f'2026-01-{day:02d}T00:00:00', 'endDate': f'2026-01-{day:02d}T04:00:00', 'value': value, 'sourceName': 'Test'},
+        {'startDate': f'2026-01-{day:02d}T04:00:00', 'endDate': f'2026-01-{day:02d}T07:00:00', 'value': 'Deep', 'sourceName': 'Test'},
+    ]
+
+
+class TestSessionCache(unittest.TestCase):
+    """Test the SQLite store and its use in sync_from_data."""
+    
+    def setUp(self):
+        """Create a cache in a temporary database."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = SessionCache(path=os.path.join(self.tmp.name, 'test.db'), retention_days=100000)
+    
+    def tearDown(self):
+        """Remove the temporary database."""
+        self.tmp.cleanup()
+    
+    def test_mark_and_evict(self):
+        """Test hashes are stored per user and old sessions evicted."""
+        now = datetime.now(timezone.utc)
+        self.cache.retention_days = 45
+        self.cache.mark_synced('A@example.com', [(now, 'recent'), (now - timedelta(days=90), 'old')])
+        self.assertEqual(self.cache.known_hashes('a@example.com'), {'recent'})
+        self.assertEqual(self.cache.known_hashes('b@example.com'), set())
+    
+    @patch('api.sleep_calendar.service_account.Credentials')
+    @patch('api.sleep_calendar.build')
+    def test_unchanged_nights_skip_calendar_calls(self, mock_build, mock_creds):
+        """Test a second sync only touches new or changed nights."""
+        service = MagicMock()
+        mock_build.return_value = service
+        service.calendarList().list().execute.return_value = {'items': [{'summary': 'Sleep Data - a@example.com', 'id': 'cal'}]}
+        service.events().list().execute.return_value = {'items': []}
+        cal = SleepCalendar(credentials_json={'type': 'service_account'}, user_email='a@example.com',
+                            session_cache=self.cache)
+        
+        first = cal.sync_from_data({'samples': night(10) + night(11)}, days=100000)
+        self.assertEqual(first, 6)
+        self.assertEqual(len(self.cache.known_hashes('a@example.com')), 2)
+        service.events().insert.reset_mock()
+        
+        # Night 11 unchanged, night 12 new, night 10 changed
+        count = cal.sync_from_data({'samples': night(10, 'REM') + night(11) + night(12)}, days=100000)
+        self.assertEqual(count, 6)
+        inserted = [c.kwargs['body']['start']['dateTime'][:10] for c in service.events().insert.call_args_list]
+        self.assertNotIn('2026-01-11', inserted)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+"""Unit tests for state shared across worker processes."""
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+from google.auth.credentials import AnonymousCredentials
+from api.calendar_directory import CalendarDirectory
+from api.db import per_worker, shared_state
+from api.rate_limit import SharedRateLimiter
+from api.serve import worker_count
+from api.singleflight import SingleFlight
+from api.sleep_calendar import SleepCalendar
+from benchmarks.fake_calendar import FakeCalendarServer
+
+
+def request_from(ip):
+    request = MagicMock()
+    request.headers = {'X-Forwarded-For': ip}
+    return request
+
+
+class TestSharedState(unittest.TestCase):
+    """Test each worker's view of rate limits, calendar IDs and sync locks."""
+
+    def setUp(self):
+        """Use a temporary database and lock directory."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.db_path = os.path.join(self.tmpdir.name, 'shared.db')
+
+    def test_shared_state_setting(self):
+        """Test several workers switch shared state on."""
+        for env, expected in (({}, False), ({'WEB_CONCURRENCY': '4'}, True),
+                              ({'WEB_CONCURRENCY': '4', 'SHARED_STATE': '0'}, False), ({'SHARED_STATE': '1'}, True)):
+            with self.subTest(env=env), patch.dict(os.environ, env, clear=True):
+                self.assertEqual(shared_state(), expected)
+        with patch.dict(os.environ, {'WEB_CONCURRENCY': '3'}):
+            self.assertEqual(worker_count(), 3)
+
+    def test_instance_limits_split_between_workers(self):
+        """Test per-process limits add up to the instance-wide setting, not a multiple of it."""
+        for env, expected in (({}, (32, 16)), ({'WEB_CONCURRENCY': '4'}, (8, 4)),
+                              ({'WEB_CONCURRENCY': '64'}, (1, 1)), ({'WEB_CONCURRENCY': 'auto'}, (32, 16))):
+            with self.subTest(env=env), patch.dict(os.environ, env, clear=True):
+                self.assertEqual((per_worker('32'), per_worker(16)), expected)
+
+    def test_rate_limit_spans_workers(self):
+        """Test two limiters on one database enforce a single budget per client."""
+        workers = [SharedRateLimiter(requests_per_minute=3, requests_per_hour=100, path=self.db_path)
+                   for _ in range(2)]
+        allowed = [workers[i % 2].check_rate_limit(request_from('10.0.0.1'))[0] for i in range(5)]
+        self.assertEqual(allowed, [True, True, True, False, False])
+        self.assertTrue(workers[1].check_rate_limit(request_from('10.0.0.2'))[0])
+
+        with patch('api.rate_limit.time.time', return_value=time.time() + 61):
+            self.assertTrue(workers[0].check_rate_limit(request_from('10.0.0.1'))[0])
+        workers[0].clear()
+        self.assertTrue(workers[1].check_rate_limit(request_from('10.0.0.1'))[0])
+
+    def test_calendar_directory_skips_calendar_list(self):
+        """Test a calendar found by one worker is reused by another without listing."""
+        with FakeCalendarServer() as server:
+            def calendar():
+                return SleepCalendar(credentials=AnonymousCredentials(), api_endpoint=server.url,
+                                     user_email='a@example.com', calendar_directory=CalendarDirectory(self.db_path))
+            cal_id = calendar().get_or_create_calendar()
+            server.state.reset_counters()
+            self.assertEqual(calendar().get_or_create_calendar(), cal_id)
+            self.assertEqual(server.state.stats()['http_requests'], 0)
+
+            CalendarDirectory(self.db_path).forget(cal_id)
+            self.assertEqual(calendar().get_or_create_calendar(), cal_id)
+            self.assertEqual(server.state.stats()['calls_by_endpoint'], {'calendarList.list': 1})
+
+    def test_single_flight_serializes_across_groups(self):
+        """Test flights for one key in different groups (workers) never overlap."""
+        lock_dir = os.path.join(self.tmpdir.name, 'locks')
+        groups = [SingleFlight(lock_dir=lock_dir) for _ in range(2)]
+        active = []
+        overlaps = []
+
+        def work(payloads):
+            active.append(1)
+            overlaps.append(len(active))
+            time.sleep(0.05)
+            active.pop()
+            return payloads
+
+        threads = [threading.Thread(target=groups[i].do, args=('a@example.com', i, i, work)) for i in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(overlaps, [1, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
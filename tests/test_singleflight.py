@@ -0,0 +1,73 @@
+"""Unit tests for per-user single-flight coalescing."""
+import threading
+import time
+import unittest
+from api.singleflight import SingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+    """Test joining and follow-up merging of concurrent calls."""
+    
+    def setUp(self):
+        """Set up a flight group whose work blocks until released."""
+        self.flights = SingleFlight()
+        self.release = threading.Event()
+        self.runs = []
+    
+    def work(self, payloads):
+        self.runs.append(list(payloads))
+        self.release.wait(5)
+        return len(self.runs)
+    
+    def start(self, token, payload, results):
+        thread = threading.Thread(target=lambda: results.append(
+            self.flights.do('a@example.com', token, payload, self.work)))
+        thread.start()
+        return thread
+    
+    def wait_for(self, predicate):
+        deadline = time.monotonic() + 5
+        while not predicate() and time.monotonic() < deadline:
+            time.sleep(0.01)
+    
+    def test_same_payload_joins_running_flight(self):
+        """Test a duplicate request shares the running flight's result."""
+        results = []
+        threads = [self.start('fp', 'samples', results)]
+        self.wait_for(lambda: self.runs)
+        threads += [self.start('fp', 'samples', results) for _ in range(3)]
+        self.wait_for(lambda: self.flights.stats()['coalesced'] == 3)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.runs, [['samples']])
+        self.assertEqual(results, [1, 1, 1, 1])
+    
+    def test_different_payloads_merge_into_one_follow_up(self):
+        """Test overlapping different payloads run once, together, after the first."""
+        results = []
+        threads = [self.start('first', 'a', results)]
+        self.wait_for(lambda: self.runs)
+        threads += [self.start('second', 'b', results), self.start('third', 'c', results),
+                    self.start('second', 'b', results)]
+        self.wait_for(lambda: self.flights.stats()['coalesced'] == 2)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.runs[0], ['a'])
+        self.assertEqual(sorted(self.runs[1]), ['b', 'c'])
+        self.assertEqual(len(self.runs), 2)
+        self.assertEqual(sorted(results), [1, 2, 2, 2])
+        self.assertEqual(self.flights.stats()['running'], 0)
+    
+    def test_errors_are_shared(self):
+        """Test a failed flight raises and does not wedge its key."""
+        def fail(payloads):
+            raise RuntimeError('boom')
+        with self.assertRaises(RuntimeError):
+            self.flights.do('a@example.com', 'fp', 'samples', fail)
+        self.assertEqual(self.flights.do('a@example.com', 'fp', 'samples', len), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
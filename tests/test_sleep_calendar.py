@@ -1,9 +1,12 @@
 """Unit tests for SleepCalendar class."""
+import json
+import subprocess
+import sys
 import unittest
 from unittest.mock import Mock, patch, MagicMock
 from datetime import datetime, timedelta
 import pytz
-from api.sleep_calendar import SleepCalendar
+from api.sleep_calendar import SleepCalendar, discovery_document
 
 
 class TestSleepCalendar(unittest.TestCase):
@@ -74,6 +77,20 @@ class TestSleepCalendar(unittest.TestCase):
         self.assertEqual(cal_id, 'test-calendar-id')
         mock_get_cal.assert_called_once()
 
+    
+    def test_discovery_document_trimmed(self):
+        """Test the cached discovery document keeps only the resources we call."""
+        document = json.loads(discovery_document())
+        self.assertEqual(set(document['resources']), {'acl', 'calendarList', 'calendars', 'events'})
+        self.assertIn('insert', document['resources']['events']['methods'])
+    
+    def test_import_defers_google_client(self):
+        """Test importing the server does not load the HTTP/discovery stack."""
+        code = ("import sys, api.server; "
+                "print(sorted(m for m in ('httplib2', 'google.auth.crypt', 'dateutil.tz') if m in sys.modules))")
+        output = subprocess.check_output([sys.executable, '-c', code], text=True)
+        self.assertEqual(output.strip(), '[]')
+
 
 if __name__ == '__main__':
     unittest.main()
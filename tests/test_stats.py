@@ -0,0 +1,78 @@
+"""Unit tests for session aggregates and the stats endpoint."""
+import os
+import tempfile
+import unittest
+from datetime import date, datetime, timezone
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from api.rate_limit import rate_limiter
+from api.server import app
+from api.session_store import SessionStore, feed_token
+from api.sleep_calendar import build_session_summaries
+
+
+NOW = datetime(2026, 3, 1, tzinfo=timezone.utc)
+
+
+def night(day, hours=7):
+    """One night ending on the given day of 2026: Core then one hour of Deep."""
+    return [
+        {'startDate': f'{day}T00:00:00', 'endDate': f'{day}T{hours - 1:02d}:00:00', 'value': 'Core', 'sourceName': 'Test'},
+        {'startDate': f'{day}T{hours - 1:02d}:00:00', 'endDate': f'{day}T{hours:02d}:00:00', 'value': 'Deep', 'sourceName': 'Test'},
+    ]
+
+
+class TestSessionStats(unittest.TestCase):
+    """Test aggregates stay consistent with the stored sessions."""
+    
+    def setUp(self):
+        """Create a store in a temporary database."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = SessionStore(path=os.path.join(self.tmp.name, 'test.db'))
+    
+    def tearDown(self):
+        """Remove the temporary database."""
+        self.tmp.cleanup()
+    
+    def save(self, samples):
+        self.store.save('a@example.com', build_session_summaries(samples, days=365, now=NOW))
+    
+    def test_aggregates_follow_updates(self):
+        """Test ragged and whole-week ranges, and that changed nights replace old totals."""
+        # Mon 2026-02-02 .. Sun 2026-02-15: two full weeks of 7h nights
+        for day in range(2, 16):
+            self.save(night(f'2026-02-{day:02d}'))
+        stats = self.store.stats('a@example.com', 14, today=date(2026, 2, 15))
+        self.assertEqual(stats['nights'], 14)
+        self.assertEqual(stats['avg_asleep_hours'], 7.0)
+        self.assertEqual(stats['stage_pct'], {'Core': 85.7, 'Deep': 14.3, 'REM': 0.0})
+        self.assertEqual([w['week'] for w in stats['weekly']], ['2026-02-02', '2026-02-09'])
+        
+        # Ragged window (Wed..Tue) reads partial weeks from the daily table
+        stats = self.store.stats('a@example.com', 7, today=date(2026, 2, 10))
+        self.assertEqual(stats['nights'], 7)
+        
+        # Re-syncing one night with 9 hours updates day and week in place
+        self.save(night('2026-02-10', hours=9))
+        stats = self.store.stats('a@example.com', 14, today=date(2026, 2, 15))
+        self.assertEqual(stats['nights'], 14)
+        self.assertAlmostEqual(stats['avg_asleep_hours'], (13 * 7 + 9) / 14, places=2)
+        self.assertEqual(stats['weekly'][1]['avg_asleep_hours'], round((6 * 7 + 9) / 7, 2))
+    
+    def test_stats_endpoint(self):
+        """Test the endpoint resolves the feed token, parses ranges and reads the store."""
+        self.save(night('2026-02-20'))
+        rate_limiter.clear()
+        client = TestClient(app)
+        with patch('api.server.session_store', self.store):
+            response = client.get(f"/stats/{feed_token('A@example.com')}?range=4w")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['range'], '4w')
+            self.assertNotIn('email', response.json())
+            self.assertEqual(client.get(f"/stats/{feed_token('a@example.com')}?range=lots").status_code, 422)
+            # An email is not a key: stats are only served for the user's token
+            self.assertEqual(client.get('/stats/a@example.com?range=4w').status_code, 404)
+            self.assertEqual(client.get(f"/stats/{feed_token('b@example.com')}").status_code, 404)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+"""Unit tests for the payload fingerprint cache."""
+import unittest
+from unittest.mock import patch
+from api.sync_cache import PayloadCache
+
+
+class TestPayloadCache(unittest.TestCase):
+    """Test fingerprinting, TTL and LRU eviction."""
+    
+    def test_fingerprint_ignores_order(self):
+        """Test sample order and key order do not change the fingerprint."""
+        a = {'startDate': '1', 'endDate': '2', 'value': 'Core'}
+        b = {'startDate': '3', 'endDate': '4', 'value': 'REM'}
+        self.assertEqual(PayloadCache.fingerprint([a, b]),
+                         PayloadCache.fingerprint([dict(reversed(list(b.items()))), a]))
+        self.assertNotEqual(PayloadCache.fingerprint([a]), PayloadCache.fingerprint([a, b]))
+    
+    def test_ttl_expiry(self):
+        """Test entries older than the TTL are misses."""
+        cache = PayloadCache(ttl_seconds=10)
+        with patch('api.sync_cache.time.monotonic', return_value=100.0):
+            cache.put('a@example.com', 'fp', 'result')
+        with patch('api.sync_cache.time.monotonic', return_value=105.0):
+            self.assertEqual(cache.get('a@example.com', 'fp'), 'result')
+        with patch('api.sync_cache.time.monotonic', return_value=111.0):
+            self.assertIsNone(cache.get('a@example.com', 'fp'))
+        self.assertEqual(cache.stats()['size'], 0)
+    
+    def test_lru_eviction(self):
+        """Test the least recently used entry is evicted first."""
+        cache = PayloadCache(max_entries=2)
+        cache.put('a@example.com', 'fp', 1)
+        cache.put('b@example.com', 'fp', 2)
+        cache.get('a@example.com', 'fp')
+        cache.put('c@example.com', 'fp', 3)
+        self.assertIsNone(cache.get('b@example.com', 'fp'))
+        self.assertEqual(cache.get('a@example.com', 'fp'), 1)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()